@@ -0,0 +1,161 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import tempfile
+from time import perf_counter, time
+import numpy as np
+from camera_requester import CameraRequester
+from camera_simulator import CameraSimulator, add_link_arguments, link_from_arguments, render_star_field
+from frame_writer import FrameWriter, available_formats, acquisition_metadata
+from welcome_view import qimage_from_buffer, save_to_unique_file_from_buffer, stretch_to_16b
+
+
+logger = logging.getLogger(__name__)
+
+
+default_output_path = "bench_output.json"
+
+
+def time_calls(callback, repeats):
+    durations = []
+    for _ in range(repeats):
+        start = perf_counter()
+        callback()
+        durations.append(perf_counter() - start)
+    return durations
+
+
+def summarize(durations, payload_bytes=None):
+    d = np.array(durations)
+    summary = {
+        "count": len(durations),
+        "mean_s": float(d.mean()),
+        "median_s": float(np.median(d)),
+        "p95_s": float(np.percentile(d, 95)),
+        "min_s": float(d.min()),
+        "max_s": float(d.max()),
+    }
+    if payload_bytes is not None:
+        summary["payload_bytes"] = payload_bytes
+        summary["throughput_mbps"] = float(payload_bytes * 8 / d.mean() / 1e6)
+    return summary
+
+
+def bench_request_latency(unit_names, repeats):
+    durations = []
+    failures = 0
+    for unit_name in unit_names:
+        requester = CameraRequester(unit_name, 0)
+
+        def get_status():
+            nonlocal failures
+            ok, _ = requester.get_status()
+            failures += 0 if ok else 1
+
+        durations += time_calls(get_status, repeats)
+    result = summarize(durations)
+    result["failures"] = failures
+    return result
+
+
+def bench_frame_fetch(unit_names, repeats, binning):
+    durations = []
+    payload_bytes = 0
+    for unit_name in unit_names:
+        requester = CameraRequester(unit_name, 0)
+        requester.set_binning(binning)
+        requester.set_format("RAW16")
+        for _ in range(repeats):
+            start = perf_counter()
+            response = requester.get_last_image(send_as_jpg=False)
+            durations.append(perf_counter() - start)
+            if response is not None:
+                payload_bytes = len(response.content)
+    return summarize(durations, payload_bytes)
+
+
+def bench_decode(frame, repeats):
+    h, w = frame.shape
+    content = frame.tobytes()
+    return summarize(time_calls(lambda: qimage_from_buffer(content, [w, h], "RAW16"), repeats), len(content))
+
+
+def bench_stretch(frame, repeats):
+    def stretch():
+        a = np.percentile(frame, 1)
+        b = np.percentile(frame, 99)
+        stretch_to_16b(frame, a, b)
+
+    return summarize(time_calls(stretch, repeats), frame.nbytes)
+
+
+def bench_tiff_save(frame, repeats):
+    h, w = frame.shape
+    content = frame.tobytes()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.chdir(tmp_dir)
+        try:
+            durations = time_calls(lambda: save_to_unique_file_from_buffer("bench", content, [w, h], "RAW16"), repeats)
+        finally:
+            os.chdir(cwd)
+    return summarize(durations, len(content))
+
+
+def bench_output_formats(frame, repeats, batch_size):
+    # compares FrameWriter formats with the plain tiff_save path, sizes are of a single written file
+    metadata = acquisition_metadata("bench", "simulated", 1000000, 120, -10, "x1", "17:00:00", "30:00:00")
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for output_format in available_formats():
+            writer = FrameWriter(output_format, tmp_dir)
+            paths = []
+            durations = time_calls(lambda: paths.append(writer.write("bench", frame, metadata)), repeats)
+            result = summarize(durations, frame.nbytes)
+            result["file_bytes"] = os.path.getsize(paths[-1])
+            result["size_ratio"] = result["file_bytes"] / frame.nbytes
+            batch = [("batch", frame, metadata)] * batch_size
+            result["batch_frames_per_s"] = batch_size / min(time_calls(lambda: writer.write_batch(batch), 1))
+            writer.shutdown()
+            results[output_format] = result
+    return results
+
+
+def run_benchmarks(args):
+    results = {}
+    with CameraSimulator(args.units, args.first_address, link=link_from_arguments(args)) as simulator:
+        logger.info(f"Benchmarking against simulated units {simulator.unit_names}")
+        results["request_latency"] = bench_request_latency(simulator.unit_names, args.repeats)
+        results["frame_fetch"] = bench_frame_fetch(simulator.unit_names, args.repeats, args.binning)
+
+    frame = render_star_field((4144 // args.binning, 2822 // args.binning), seed=0)
+    results["qimage_from_buffer"] = bench_decode(frame, args.repeats)
+    results["stretch"] = bench_stretch(frame, args.repeats)
+    results["tiff_save"] = bench_tiff_save(frame, args.repeats)
+    results["output_formats"] = bench_output_formats(frame, args.repeats, args.batch)
+    return results
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Benchmarks the client stack against the camera simulator")
+    add_link_arguments(parser)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--binning", type=int, default=1, choices=[1, 2, 4])
+    parser.add_argument("--batch", type=int, default=8, help="Frames per batch when benchmarking output formats")
+    parser.add_argument("--output", default=default_output_path, help="Where to write JSON results")
+    args = parser.parse_args()
+
+    report = {
+        "timestamp": time(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "parameters": vars(args),
+        "results": run_benchmarks(args),
+    }
+    with open(args.output, 'w') as outfile:
+        json.dump(report, outfile, indent=2)
+    print(json.dumps(report["results"], indent=2))
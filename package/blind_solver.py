@@ -1,9 +1,10 @@
 import os
 from math import floor
+from optics import asi294_135mm_fov
+from tracer import traced
 
 
 astap_path = "\"C:\\Program Files\\astap\\astap.exe\""
-asi294_135mm_fov = 5.8
 DEG_BY_H = 15.0
 DEG_BY_DEC = 60.0
 MINUTE_BY_DEC = 60.0
@@ -30,6 +31,7 @@ def degrees_to_right_ascension(d):
     return h, m, s
 
 
+@traced("blind_solve_image")
 def blind_solve_image(file_name, ra, dec):
     print(f"Trying to solve {file_name}")
     cmd_args = f" -f {file_name} -r 30 -fov {asi294_135mm_fov} -ra {ra} -dec {dec} -m 1.5 -D D20"
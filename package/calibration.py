@@ -0,0 +1,164 @@
+import argparse
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import tifffile
+from frame_writer import FITS_EXTENSIONS, TIFF_EXTENSIONS, open_fits
+
+
+logger = logging.getLogger(__name__)
+
+
+MASTER_BIAS = "bias"
+MASTER_DARK = "dark"
+MASTER_FLAT = "flat"
+# order matters: darks and flats need the bias master
+MASTER_KINDS = [MASTER_BIAS, MASTER_DARK, MASTER_FLAT]
+COMBINE_MEDIAN = "median"
+COMBINE_SIGMA_CLIP = "sigma-clip"
+COMBINE_METHODS = [COMBINE_MEDIAN, COMBINE_SIGMA_CLIP]
+DEFAULT_SIGMA = 3.0
+SIGMA_CLIP_ITERATIONS = 2
+# scales median absolute deviation to standard deviation of normal distribution
+MAD_TO_SIGMA = 1.4826
+# upper bound for float32 strips held in RAM at once by all workers together
+DEFAULT_MEMORY_BUDGET_BYTES = 512 * 1024 * 1024
+
+
+def master_file_name(kind):
+    return f"master_{kind}.tif"
+
+
+def list_frames(directory, prefix):
+    return sorted(os.path.join(directory, file_name) for file_name in os.listdir(directory)
+                  if file_name.startswith(prefix) and file_name.lower().endswith(TIFF_EXTENSIONS + FITS_EXTENSIONS))
+
+
+def open_frame(path):
+    # uncompressed TIFFs and FITS files are memory-mapped, so strips are read from disk only when needed
+    if path.lower().endswith(FITS_EXTENSIONS):
+        return open_fits(path)
+    try:
+        return tifffile.memmap(path, mode='r')
+    except ValueError:
+        logger.warning(f"{path} cannot be memory-mapped (compressed?), reading it whole")
+        return tifffile.imread(path)
+
+
+def sum_of_masters(masters, kinds):
+    selected = [masters[kind] for kind in kinds if kind in masters]
+    return sum(selected) if selected else None
+
+
+def combine_strip(strip, method=COMBINE_MEDIAN, sigma=DEFAULT_SIGMA):
+    # strip has shape (frames, rows, width), result has shape (rows, width)
+    if method == COMBINE_MEDIAN or len(strip) < 3:
+        return np.median(strip, axis=0)
+    clipped = strip.copy()
+    for _ in range(SIGMA_CLIP_ITERATIONS):
+        center = np.nanmedian(clipped, axis=0)
+        # spread from MAD, with few frames a single outlier inflates standard deviation enough to survive
+        spread = MAD_TO_SIGMA * np.nanmedian(np.abs(clipped - center), axis=0)
+        clipped[np.abs(clipped - center) > sigma * spread] = np.nan
+    combined = np.nanmean(clipped, axis=0)
+    # all values of a pixel rejected can only happen with pathological data, median is a safe answer there
+    rejected = np.isnan(combined)
+    combined[rejected] = np.median(strip, axis=0)[rejected]
+    return combined
+
+
+def combine_frames(paths, method=COMBINE_MEDIAN, sigma=DEFAULT_SIGMA, subtract=None, max_workers=None,
+                   memory_budget_bytes=DEFAULT_MEMORY_BUDGET_BYTES):
+    # Frames are combined strip by strip in parallel, only strips of all frames are held in RAM.
+    frames = [open_frame(path) for path in paths]
+    h, w = frames[0].shape
+    for path, frame in zip(paths, frames):
+        if frame.shape != (h, w):
+            raise ValueError(f"{path} has shape {frame.shape}, expected {(h, w)}")
+    max_workers = max_workers or os.cpu_count() or 1
+    strip_rows = int(max(1, min(h, memory_budget_bytes // (len(frames) * w * 4 * max_workers))))
+    combined = np.empty((h, w), dtype=np.float32)
+
+    def combine_rows(start):
+        stop = min(start + strip_rows, h)
+        strip = np.stack([frame[start:stop] for frame in frames]).astype(np.float32)
+        if subtract is not None:
+            strip -= subtract[start:stop]
+        combined[start:stop] = combine_strip(strip, method, sigma)
+
+    logger.debug(f"Combining {len(frames)} frames {w}x{h} in strips of {strip_rows} rows with {method}")
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="calibration") as executor:
+        list(executor.map(combine_rows, range(0, h, strip_rows)))
+    return combined
+
+
+def build_masters(directory, output_directory=None, method=COMBINE_MEDIAN, sigma=DEFAULT_SIGMA, max_workers=None):
+    # Frames are picked by file name prefix (bias*, dark*, flat*), like captures saved with such capture type.
+    # Dark and flat masters are bias subtracted, flat master is also normalized to median 1.
+    output_directory = output_directory or directory
+    os.makedirs(output_directory, exist_ok=True)
+    masters = {}
+    for kind in MASTER_KINDS:
+        paths = list_frames(directory, kind)
+        if not paths:
+            logger.info(f"No {kind} frames in {directory}")
+            continue
+        subtract = None if kind == MASTER_BIAS else sum_of_masters(masters, [MASTER_BIAS])
+        logger.info(f"Building master {kind} from {len(paths)} frames")
+        master = combine_frames(paths, method, sigma, subtract, max_workers)
+        if kind == MASTER_FLAT:
+            master /= np.median(master)
+        masters[kind] = master
+        tifffile.imwrite(os.path.join(output_directory, master_file_name(kind)), master)
+    return masters
+
+
+class Calibrator:
+    def __init__(self, masters):
+        self._masters = masters
+        # dark master is expected to match exposure of the lights
+        self._offset = sum_of_masters(masters, [MASTER_BIAS, MASTER_DARK])
+        flat = masters.get(MASTER_FLAT)
+        self._flat = None if flat is None else np.where(flat > 0, flat, 1).astype(np.float32)
+
+    @staticmethod
+    def from_directory(directory):
+        masters = {}
+        for kind in MASTER_KINDS:
+            path = os.path.join(directory, master_file_name(kind))
+            if os.path.exists(path):
+                masters[kind] = tifffile.imread(path).astype(np.float32)
+        return Calibrator(masters)
+
+    @property
+    def kinds(self):
+        return list(self._masters)
+
+    def apply(self, frame):
+        # returns calibrated frame with the same dtype, frames not matching masters are returned as they are
+        if not self._masters:
+            return frame
+        shape = next(iter(self._masters.values())).shape
+        if frame.shape != shape:
+            logger.warning(f"Frame {frame.shape} does not match calibration masters {shape}, not calibrating")
+            return frame
+        calibrated = frame.astype(np.float32)
+        if self._offset is not None:
+            calibrated -= self._offset
+        if self._flat is not None:
+            calibrated /= self._flat
+        return np.clip(calibrated, 0, np.iinfo(frame.dtype).max).astype(frame.dtype)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Builds master bias, dark and flat frames from TIFF or FITS files")
+    parser.add_argument("directory", help="Directory with bias*, dark* and flat* TIFF or FITS files")
+    parser.add_argument("--output", default=None, help="Where to write master_*.tif, defaults to the input directory")
+    parser.add_argument("--method", default=COMBINE_MEDIAN, choices=COMBINE_METHODS)
+    parser.add_argument("--sigma", type=float, default=DEFAULT_SIGMA)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    built = build_masters(args.directory, args.output, args.method, args.sigma, args.workers)
+    print(f"Built masters: {', '.join(built) or 'none'}")
@@ -1,28 +1,176 @@
 import logging
+import threading
+from time import monotonic, perf_counter
+from urllib.parse import urlparse
 import requests
+import tracer
+import transport
 
 
 logger = logging.getLogger(__name__)
 
 port_for_cameras = 8080
 
+DEFAULT_TIMEOUT_S = 5
+MIN_CONNECT_TIMEOUT_S = 1
+MIN_READ_TIMEOUT_S = 2
+MAX_READ_TIMEOUT_S = 120
+# a large transfer is cut when it takes that many times longer than the measured throughput says
+TRANSFER_DEADLINE_FACTOR = 4
+MAX_TRANSFER_DEADLINE_S = 600
+LATENCY_TIMEOUT_FACTOR = 4
+EWMA_ALPHA = 0.3
+# smaller responses say more about latency than about link throughput
+MIN_THROUGHPUT_SAMPLE_BYTES = 256 * 1024
+FAILURE_THRESHOLD = 3
+OPEN_CIRCUIT_S = 10
+MAX_OPEN_CIRCUIT_S = 120
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half-open"
+
 
 def null_handler(s):
     pass
 
 
-def handle_request_call(request_call, full_url):
-    logger.debug(f"Trying to reach {full_url}...")
-    try:
-        response = request_call()
-    except requests.exceptions.Timeout:
-        logger.error(f"Connection to {full_url} timed out!")
-        return None
+def ewma(previous, sample):
+    return sample if previous is None else (1 - EWMA_ALPHA) * previous + EWMA_ALPHA * sample
+
+
+class UnitHealth:
+    # Circuit breaker and latency/throughput statistics of one host, shared by all threads talking to it.
+    # After FAILURE_THRESHOLD transport failures in a row the circuit opens and calls fail immediately;
+    # after the open period a single probe call is let through (half-open) which either closes the circuit
+    # or opens it again for twice as long.
+    def __init__(self, host):
+        self.host = host
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self._open_duration_s = OPEN_CIRCUIT_S
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._latency_s = {}
+        self._throughput_bps = None
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == CIRCUIT_CLOSED:
+                return True
+            if self.state == CIRCUIT_OPEN and monotonic() - self._opened_at >= self._open_duration_s:
+                logger.info(f"Circuit to {self.host} half-open, probing")
+                self.state = CIRCUIT_HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == CIRCUIT_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self, endpoint, latency_s, payload_bytes, transfer_s):
+        with self._lock:
+            if self.state != CIRCUIT_CLOSED:
+                logger.info(f"Circuit to {self.host} closed again")
+            self.state = CIRCUIT_CLOSED
+            self.consecutive_failures = 0
+            self._open_duration_s = OPEN_CIRCUIT_S
+            self._probe_in_flight = False
+            self._latency_s[endpoint] = ewma(self._latency_s.get(endpoint), latency_s)
+            if payload_bytes >= MIN_THROUGHPUT_SAMPLE_BYTES and transfer_s > 0:
+                self._throughput_bps = ewma(self._throughput_bps, payload_bytes / transfer_s)
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == CIRCUIT_HALF_OPEN:
+                self._open_duration_s = min(2 * self._open_duration_s, MAX_OPEN_CIRCUIT_S)
+                self._open()
+            elif self.state == CIRCUIT_CLOSED and self.consecutive_failures >= FAILURE_THRESHOLD:
+                self._open()
+
+    def _open(self):
+        logger.warning(f"Circuit to {self.host} opened for {self._open_duration_s}s "
+                       f"after {self.consecutive_failures} failure(s)")
+        self.state = CIRCUIT_OPEN
+        self._opened_at = monotonic()
+        self._probe_in_flight = False
+
+    def timeout(self, endpoint):
+        # (connect, read) for requests, where read bounds a stall between bytes, not the whole transfer
+        with self._lock:
+            latency = self._latency_s.get(endpoint)
+            if latency is None:
+                return DEFAULT_TIMEOUT_S, DEFAULT_TIMEOUT_S
+            connect_timeout = min(max(LATENCY_TIMEOUT_FACTOR * latency, MIN_CONNECT_TIMEOUT_S), DEFAULT_TIMEOUT_S)
+            read_timeout = min(max(LATENCY_TIMEOUT_FACTOR * latency, MIN_READ_TIMEOUT_S), MAX_READ_TIMEOUT_S)
+            return connect_timeout, read_timeout
+
+    def transfer_deadline_s(self, endpoint, expected_bytes):
+        # whole transfer bound for a response of known size, None while throughput is not measured yet
+        with self._lock:
+            if not expected_bytes or not self._throughput_bps:
+                return None
+            expected_s = self._latency_s.get(endpoint, 0.0) + expected_bytes / self._throughput_bps
+            return min(max(TRANSFER_DEADLINE_FACTOR * expected_s, MIN_READ_TIMEOUT_S), MAX_TRANSFER_DEADLINE_S)
+
+    @property
+    def throughput_bps(self):
+        with self._lock:
+            return self._throughput_bps
+
+    def summary(self):
+        with self._lock:
+            return {"host": self.host, "state": self.state, "consecutive_failures": self.consecutive_failures,
+                    "throughput_bps": self._throughput_bps, "latency_s": dict(self._latency_s)}
+
+
+_unit_health = {}
+_unit_health_lock = threading.Lock()
+
+
+def health_for(url) -> UnitHealth:
+    host = urlparse(url).hostname
+    with _unit_health_lock:
+        if host not in _unit_health:
+            _unit_health[host] = UnitHealth(host)
+        return _unit_health[host]
+
+
+def health_summary():
+    with _unit_health_lock:
+        units = list(_unit_health.values())
+    return [health.summary() for health in units]
 
-    except Exception as e:
-        logger.error(f"Unknown exception: {e}")
+
+def handle_request_call(request_call, full_url):
+    health = health_for(full_url)
+    if not health.allow_request():
+        logger.warning(f"Circuit to {health.host} is {health.state}, not calling {full_url}")
         return None
+    endpoint = urlparse(full_url).path.rsplit("/", 1)[-1]
+    timeout = health.timeout(endpoint)
+    logger.debug(f"Trying to reach {full_url} with timeout {timeout}...")
+    start = perf_counter()
+    with tracer.span(f"request {endpoint}", host=health.host) as request_span:
+        try:
+            response = request_call(timeout)
+        except requests.exceptions.Timeout:
+            health.record_failure()
+            logger.error(f"Connection to {full_url} timed out!")
+            request_span.annotate(error="timeout")
+            return None
 
+        except Exception as e:
+            health.record_failure()
+            logger.error(f"Unknown exception: {e}")
+            request_span.annotate(error=str(e))
+            return None
+        request_span.annotate(status=response.status_code, bytes=len(response.content))
+
+    total_s = perf_counter() - start
+    latency_s = response.elapsed.total_seconds()
+    health.record_success(endpoint, latency_s, len(response.content), max(0.0, total_s - latency_s))
     logger.debug(f"Acquired response from {full_url}")
     if response.status_code != 200:
         if response.status_code == 422:
@@ -34,8 +182,8 @@ def handle_request_call(request_call, full_url):
 
 
 def standalone_get_request(url):
-    def request_call():
-        return requests.get(url, timeout=5)
+    def request_call(timeout):
+        return transport.current().send("GET", url, timeout)
 
     return handle_request_call(request_call, url)
 
@@ -43,8 +191,8 @@ def standalone_get_request(url):
 def standalone_post_request(url, headers, data):
     logger.debug(f"Trying to POST on {url}")
 
-    def request_call():
-        return requests.post(url, headers=headers, json=data, timeout=5)
+    def request_call(timeout):
+        return transport.current().send("POST", url, timeout, headers=headers, json_body=data)
 
     return handle_request_call(request_call, url)
 
@@ -54,6 +202,9 @@ class CameraRequester:
         self._ip = ip
         self._camera_index = camera_index
 
+    def health(self) -> UnitHealth:
+        return health_for(f"http://{self._ip}:{port_for_cameras}/")
+
     def _get_request(self, full_url):
         return standalone_get_request(full_url)
 
@@ -102,6 +253,9 @@ class CameraRequester:
     def custom_request(self, url):
         return self._get_request(url)
 
+    def init_camera(self):
+        return self._custom_value_set_url("init_camera", {})
+
     def start_capturing(self):
         return self._regular_set_url("start_capturing")
 
@@ -138,12 +292,18 @@ class CameraRequester:
     def get_formats(self):
         return self._get_pair_success_and_value("get_readoutmodes")
 
-    def get_last_image(self, send_as_jpg: bool):
+    def get_last_image(self, send_as_jpg: bool, expected_bytes=None, quality=None):
         url = f"http://{self._ip}:{port_for_cameras}/camera/{self._camera_index}/get_last_image"
         logger.debug(f"Trying to get last image from {url}")
+        params = {"format": "jpg" if send_as_jpg else "raw"}
+        if send_as_jpg and quality is not None:
+            params["quality"] = quality
 
-        def request_call():
-            return requests.get(url, params={"format": "jpg" if send_as_jpg else "raw"}, timeout=5)
+        # a RAW frame of known size crawling in over a degraded link is given up at a deadline
+        deadline_s = self.health().transfer_deadline_s("get_last_image", expected_bytes)
+
+        def request_call(timeout):
+            return transport.current().send("GET", url, timeout, params=params, deadline_s=deadline_s)
 
         return handle_request_call(request_call, url)
 
@@ -215,5 +375,9 @@ class CameraRequester:
         logger.debug(f"Max possible bin is {maxbin}")
         return list(range(1, maxbin+1))
 
+    def subscribe(self, callback, fallback_interval_s=5.0):
+        from status_stream import StatusSubscription
+        return StatusSubscription(self._ip, self._camera_index, callback, fallback_interval_s).start()
+
     def check_focuser(self):
         return self._get_pair_success_and_value("get_focuserstatus")
@@ -0,0 +1,452 @@
+import argparse
+import json
+import logging
+import random
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from time import sleep, time
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from camera_requester import port_for_cameras
+
+
+logger = logging.getLogger(__name__)
+
+
+ASI294_SENSOR = (4144, 2822)
+DEFAULT_JPG_QUALITY = 85
+AMBIENT_TEMPERATURE = 20.0
+COOLING_TIME_CONSTANT_S = 120.0
+MIN_FRAME_TIME_S = 0.05
+STARS_PER_FIELD = 300
+STAR_STAMP_RADIUS = 4
+SEND_CHUNK_SIZE = 64 * 1024
+EVENTS_CHECK_INTERVAL_S = 0.1
+EVENTS_KEEPALIVE_S = 10
+
+
+class LinkProfile:
+    def __init__(self, latency_s=0.0, jitter_s=0.0, bandwidth_bps=None, failure_rate=0.0,
+                 failure_mode="error", hang_s=10.0):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.bandwidth_bps = bandwidth_bps
+        self.failure_rate = failure_rate
+        self.failure_mode = failure_mode
+        self.hang_s = hang_s
+
+    def delay(self):
+        return self.latency_s + random.uniform(0, self.jitter_s)
+
+    def should_fail(self):
+        return self.failure_rate > 0 and random.random() < self.failure_rate
+
+
+def render_star_field(resolution, seed, frame_index=0, drift_px_per_frame=(0.0, 0.0), background=800.0):
+    w, h = resolution
+    rng = np.random.default_rng(seed)
+    count = STARS_PER_FIELD
+    xs = rng.uniform(0, 1, count) * w + drift_px_per_frame[0] * frame_index
+    ys = rng.uniform(0, 1, count) * h + drift_px_per_frame[1] * frame_index
+    fluxes = 10 ** rng.uniform(2.5, 4.8, count)
+    sigma = 1.2
+
+    noise_rng = np.random.default_rng((seed, frame_index))
+    img = noise_rng.normal(background, np.sqrt(background), (h, w)).astype(np.float32)
+
+    offsets = np.arange(-STAR_STAMP_RADIUS, STAR_STAMP_RADIUS + 1)
+    stamp_x = np.round(xs)[:, None, None] + offsets[None, None, :]
+    stamp_y = np.round(ys)[:, None, None] + offsets[None, :, None]
+    values = fluxes[:, None, None] * np.exp(
+        -((stamp_x - xs[:, None, None]) ** 2 + (stamp_y - ys[:, None, None]) ** 2) / (2 * sigma ** 2))
+    stamp_x, stamp_y, values = np.broadcast_arrays(stamp_x, stamp_y, values)
+    inside = (stamp_x >= 0) & (stamp_x < w) & (stamp_y >= 0) & (stamp_y < h)
+    np.add.at(img, (stamp_y[inside].astype(np.intp), stamp_x[inside].astype(np.intp)), values[inside])
+    return np.clip(img, 0, 65535).astype(np.uint16)
+
+
+class SimulatedCamera:
+    def __init__(self, name, seed, sensor=ASI294_SENSOR, drift_px_per_frame=(0.0, 0.0)):
+        self.name = name
+        self._seed = seed
+        self._sensor = sensor
+        self._drift = drift_px_per_frame
+        self._lock = threading.Lock()
+        self._binning = 1
+        self._format = "RAW16"
+        self._gain = 120
+        self._offset = 8
+        self._exposure_us = 1000000
+        self._focuser_position = 0
+        self._cooler_on = False
+        self._set_temperature = 0.0
+        self._temperature = AMBIENT_TEMPERATURE
+        self._temperature_time = time()
+        self._capture_start = None
+        self._save_start = None
+        self._save_start_frame = 0
+        self._to_save = 0
+        self._completed_saves = 0
+        self._save_dir = ""
+        self._save_prefix = ""
+        self._cached_frame_key = None
+        self._cached_frame = None
+
+    @property
+    def resolution(self):
+        return self._sensor[0] // self._binning, self._sensor[1] // self._binning
+
+    def _frame_time_s(self):
+        return max(self._exposure_us / 1000000.0, MIN_FRAME_TIME_S)
+
+    def _frames_since(self, start):
+        if start is None:
+            return 0
+        return int((time() - start) / self._frame_time_s())
+
+    def _current_frame_index(self):
+        return self._frames_since(self._capture_start)
+
+    def _saved_images(self):
+        if self._save_start is None:
+            return self._completed_saves
+        return min(self._to_save, self._current_frame_index() - self._save_start_frame)
+
+    def _update_temperature(self):
+        now = time()
+        target = self._set_temperature if self._cooler_on else AMBIENT_TEMPERATURE
+        decay = np.exp(-(now - self._temperature_time) / COOLING_TIME_CONSTANT_S)
+        self._temperature = target + (self._temperature - target) * decay
+        self._temperature_time = now
+
+    def status(self):
+        if self._save_start is not None and self._saved_images() >= self._to_save:
+            self._completed_saves = self._to_save
+            self._save_start = None
+        if self._save_start is not None:
+            state = "SAVE"
+        elif self._capture_start is not None:
+            state = "CAPTURE"
+        else:
+            state = "IDLE"
+        return {"state": state, "saved_images": self._saved_images(), "images_to_save": self._to_save,
+                "dir_name": self._save_dir, "prefix": self._save_prefix}
+
+    def last_image(self, as_jpg, quality=DEFAULT_JPG_QUALITY):
+        with self._lock:
+            key = (self._binning, self._format, self._current_frame_index())
+            if key != self._cached_frame_key:
+                frame = render_star_field(self.resolution, self._seed, key[2], self._drift)
+                if self._format == "RAW8":
+                    frame = (frame >> 8).astype(np.uint8)
+                self._cached_frame_key = key
+                self._cached_frame = frame
+            frame = self._cached_frame
+        if not as_jpg:
+            return frame.tobytes(), "application/octet-stream"
+        from PIL import Image
+        preview = frame if frame.dtype == np.uint8 else (frame >> 8).astype(np.uint8)
+        output = BytesIO()
+        Image.fromarray(preview).save(output, format="JPEG", quality=quality)
+        return output.getvalue(), "image/jpeg"
+
+    def events_snapshot(self):
+        with self._lock:
+            self._update_temperature()
+            return {"status": self.status(), "temperature": round(self._temperature, 1),
+                    "frame_ready": self._current_frame_index() if self._capture_start is not None else None}
+
+    def get(self, what_to_get):
+        with self._lock:
+            self._update_temperature()
+            getters = {
+                "get_status": self.status,
+                "get_gain": lambda: self._gain,
+                "get_offset": lambda: self._offset,
+                "get_readoutmodes": lambda: ["RAW8", "RAW16"],
+                "get_readoutmode_str": lambda: self._format,
+                "get_exposure": lambda: self._exposure_us,
+                "get_ccdtemperature": lambda: round(self._temperature, 1),
+                "get_cooleron": lambda: self._cooler_on,
+                "get_cansetcooleron": lambda: True,
+                "get_cansetccdtemperature": lambda: True,
+                "get_cangetcoolerpower": lambda: True,
+                "get_coolerpower": lambda: self._cooler_power(),
+                "get_setccdtemperature": lambda: self._set_temperature,
+                "get_numx": lambda: self.resolution[0],
+                "get_numy": lambda: self.resolution[1],
+                "get_maxbinx": lambda: 4,
+                "get_focuserstatus": lambda: {"position": self._focuser_position},
+            }
+            if what_to_get not in getters:
+                return None
+            return {"value": getters[what_to_get]()}
+
+    def _cooler_power(self):
+        if not self._cooler_on:
+            return 0
+        return int(np.clip((AMBIENT_TEMPERATURE - self._temperature) * 2.5, 0, 100))
+
+    def post(self, what_to_set, data):
+        value = data.get("value", "")
+        with self._lock:
+            self._update_temperature()
+            if what_to_set in ("init_camera", "set_focuserconnect"):
+                pass
+            elif what_to_set == "start_capturing":
+                if self._capture_start is None:
+                    self._capture_start = time()
+            elif what_to_set == "stop_capturing":
+                self._completed_saves = self._saved_images()
+                self._capture_start = None
+                self._save_start = None
+            elif what_to_set == "start_saving":
+                if self._capture_start is None:
+                    self._capture_start = time()
+                self._to_save = int(data.get("number", 1))
+                self._save_dir = data.get("dir_name", "")
+                self._save_prefix = data.get("prefix", "")
+                self._completed_saves = 0
+                self._save_start = time()
+                self._save_start_frame = self._current_frame_index()
+            elif what_to_set == "stop_saving":
+                self._completed_saves = self._saved_images()
+                self._save_start = None
+            elif what_to_set == "set_binx":
+                self._binning = int(value)
+            elif what_to_set == "set_readoutmode_str":
+                if value not in ("RAW8", "RAW16"):
+                    return False
+                self._format = value
+            elif what_to_set == "set_gain":
+                self._gain = int(value)
+            elif what_to_set == "set_offset":
+                self._offset = int(value)
+            elif what_to_set == "set_exposure":
+                self._exposure_us = int(float(value) * 1000000)
+            elif what_to_set == "set_focuserposition":
+                self._focuser_position += int(value)
+            elif what_to_set == "set_setccdtemperature":
+                self._set_temperature = float(value)
+            elif what_to_set == "set_cooleron":
+                self._cooler_on = (value == "True")
+            else:
+                return False
+            return True
+
+
+class SimulatedUnit:
+    def __init__(self, name, address, port=port_for_cameras, link=None, cameras_per_unit=1,
+                 drift_px_per_frame=(0.0, 0.0), supports_push=True):
+        self.name = name
+        self.address = address
+        self.port = port
+        self.link = link if link is not None else LinkProfile()
+        self.supports_push = supports_push
+        self.stopping = threading.Event()
+        seed = zlib.crc32(name.encode())
+        self.cameras = [SimulatedCamera(f"Simulated ASI294MC Pro #{i}", seed + i, drift_px_per_frame=drift_px_per_frame)
+                        for i in range(cameras_per_unit)]
+        self._server = ThreadingHTTPServer((address, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def _make_handler(self):
+        unit = self
+
+        class Handler(SimulatedCameraRequestHandler):
+            simulated_unit = unit
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name=f"sim-{self.name}", daemon=True)
+        self._thread.start()
+        logger.info(f"Simulated unit {self.name} listening on {self.address}:{self.port}")
+
+    def stop(self):
+        self.stopping.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class SimulatedCameraRequestHandler(BaseHTTPRequestHandler):
+    simulated_unit: SimulatedUnit = None
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.simulated_unit.name}: {format % args}")
+
+    def _camera_and_endpoint(self, path):
+        parts = path.strip("/").split("/")
+        if len(parts) != 3 or parts[0] != "camera":
+            return None, None
+        try:
+            index = int(parts[1])
+            return self.simulated_unit.cameras[index], parts[2]
+        except (ValueError, IndexError):
+            return None, None
+
+    def _apply_link_conditions(self):
+        link = self.simulated_unit.link
+        sleep(link.delay())
+        if not link.should_fail():
+            return True
+        if link.failure_mode == "drop":
+            self.close_connection = True
+        elif link.failure_mode == "hang":
+            sleep(link.hang_s)
+            self.close_connection = True
+        else:
+            self.send_error(500, "Injected failure")
+        return False
+
+    def _send(self, status_code, body, content_type):
+        self.send_response(status_code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        bandwidth = self.simulated_unit.link.bandwidth_bps
+        for start in range(0, len(body), SEND_CHUNK_SIZE):
+            chunk = body[start:start + SEND_CHUNK_SIZE]
+            self.wfile.write(chunk)
+            if bandwidth:
+                sleep(len(chunk) * 8 / bandwidth)
+
+    def _send_json(self, content, status_code=200):
+        self._send(status_code, json.dumps(content).encode(), "application/json")
+
+    def do_GET(self):
+        if not self._apply_link_conditions():
+            return
+        url = urlparse(self.path)
+        if url.path == "/cameras_list":
+            self._send_json({"cameras": [camera.name for camera in self.simulated_unit.cameras]})
+            return
+        camera, endpoint = self._camera_and_endpoint(url.path)
+        if camera is None:
+            self.send_error(404)
+            return
+        if endpoint == "events" and self.simulated_unit.supports_push:
+            self._stream_events(camera)
+            return
+        if endpoint == "get_last_image":
+            query = parse_qs(url.query)
+            as_jpg = query.get("format", ["raw"])[0] == "jpg"
+            body, content_type = camera.last_image(as_jpg, int(query.get("quality", [DEFAULT_JPG_QUALITY])[0]))
+            self._send(200, body, content_type)
+            return
+        result = camera.get(endpoint)
+        if result is None:
+            self.send_error(404)
+            return
+        self._send_json(result)
+
+    def _stream_events(self, camera):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.close_connection = True
+        last_sent = {}
+        last_write = time()
+        stopping = self.simulated_unit.stopping
+        try:
+            while not stopping.is_set():
+                for event_type, value in camera.events_snapshot().items():
+                    if value is None or last_sent.get(event_type) == value:
+                        continue
+                    last_sent[event_type] = value
+                    self.wfile.write(f"event: {event_type}\ndata: {json.dumps({'value': value})}\n\n".encode())
+                    last_write = time()
+                if time() - last_write > EVENTS_KEEPALIVE_S:
+                    self.wfile.write(b": keep-alive\n\n")
+                    last_write = time()
+                self.wfile.flush()
+                stopping.wait(EVENTS_CHECK_INTERVAL_S)
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug(f"Event stream from {self.simulated_unit.name} closed by client")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw_data = self.rfile.read(length) if length > 0 else b"{}"
+        if not self._apply_link_conditions():
+            return
+        camera, endpoint = self._camera_and_endpoint(urlparse(self.path).path)
+        if camera is None:
+            self.send_error(404)
+            return
+        try:
+            data = json.loads(raw_data or b"{}")
+            accepted = camera.post(endpoint, data)
+        except (ValueError, TypeError) as e:
+            self._send_json({"detail": str(e)}, 422)
+            return
+        if not accepted:
+            self.send_error(404)
+            return
+        self._send_json({"value": "OK"})
+
+
+class CameraSimulator:
+    def __init__(self, units=4, first_address="127.0.0.1", port=port_for_cameras, link=None, cameras_per_unit=1,
+                 drift_px_per_frame=(0.0, 0.0), supports_push=True):
+        base = first_address.split(".")
+        self.units = []
+        for i in range(units):
+            address = ".".join(base[:3] + [str(int(base[3]) + i)])
+            self.units.append(SimulatedUnit(address, address, port, link, cameras_per_unit, drift_px_per_frame,
+                                            supports_push))
+
+    @property
+    def unit_names(self):
+        return [unit.name for unit in self.units]
+
+    def start(self):
+        for unit in self.units:
+            unit.start()
+        return self
+
+    def stop(self):
+        for unit in self.units:
+            unit.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def add_link_arguments(parser):
+    parser.add_argument("--units", type=int, default=4, help="Number of simulated units")
+    parser.add_argument("--first-address", default="127.0.0.1",
+                        help="Loopback address of the first unit, next units use consecutive addresses")
+    parser.add_argument("--latency", type=float, default=0.0, help="Added latency per request [s]")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum random extra latency per request [s]")
+    parser.add_argument("--bandwidth", type=float, default=None, help="Link bandwidth [bit/s], unlimited by default")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability of injected request failure")
+    parser.add_argument("--failure-mode", choices=["error", "drop", "hang"], default="error")
+    parser.add_argument("--no-push", action="store_true", help="Do not serve the /camera/{i}/events push channel")
+
+
+def link_from_arguments(args):
+    return LinkProfile(args.latency, args.jitter, args.bandwidth, args.failure_rate, args.failure_mode)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Serves simulated camera units on loopback addresses")
+    add_link_arguments(parser)
+    parser.add_argument("--port", type=int, default=port_for_cameras)
+    args = parser.parse_args()
+
+    simulator = CameraSimulator(args.units, args.first_address, args.port, link_from_arguments(args),
+                                supports_push=not args.no_push).start()
+    print(f"Simulated units: {simulator.unit_names}")
+    try:
+        while True:
+            sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()
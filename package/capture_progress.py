@@ -0,0 +1,139 @@
+import logging
+from time import time
+
+
+logger = logging.getLogger(__name__)
+
+
+SAVED_IMAGES_KEY = "saved_images"
+SECONDS_IN_HOUR = 3600
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "?"
+    seconds = int(round(seconds))
+    if seconds >= SECONDS_IN_HOUR:
+        return f"{seconds // SECONDS_IN_HOUR}h{(seconds % SECONDS_IN_HOUR) // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class CaptureProgress:
+    # Progress of one start_saving run. Only first and last observed frame changes are kept, so memory
+    # does not depend on the number of frames.
+    def __init__(self, unit_name, requested, exposure_s, started_at=None):
+        self.unit_name = unit_name
+        self.requested = requested
+        self.exposure_s = exposure_s
+        self.started_at = started_at if started_at is not None else time()
+        self.frames_done = 0
+        self.seen_saving = False
+        self.finished = False
+        self._first_change = None
+        self._last_change = None
+
+    def update(self, frames_done, now=None):
+        now = now if now is not None else time()
+        if frames_done <= self.frames_done:
+            return
+        self.frames_done = min(frames_done, self.requested)
+        if self._first_change is None:
+            self._first_change = (now, self.frames_done)
+        self._last_change = (now, self.frames_done)
+
+    @property
+    def cycle_s(self):
+        if self._last_change is None:
+            return None
+        first_time, first_count = self._first_change
+        last_time, last_count = self._last_change
+        if last_count > first_count:
+            return (last_time - first_time) / (last_count - first_count)
+        return (last_time - self.started_at) / last_count
+
+    @property
+    def frames_per_hour(self):
+        cycle = self.cycle_s
+        return SECONDS_IN_HOUR / cycle if cycle else None
+
+    @property
+    def overhead_s(self):
+        cycle = self.cycle_s
+        return cycle - self.exposure_s if cycle is not None and self.exposure_s is not None else None
+
+    @property
+    def fraction(self):
+        return self.frames_done / self.requested if self.requested else 0.0
+
+    @property
+    def eta_s(self):
+        if self.finished:
+            return 0.0
+        cycle = self.cycle_s
+        if cycle is None:
+            if self.exposure_s is None:
+                return None
+            cycle = self.exposure_s
+        return max(0, self.requested - self.frames_done) * cycle
+
+    def text(self):
+        done = f"{self.frames_done}/{self.requested}"
+        if self.finished:
+            return f"{done} done"
+        return f"{done} ETA {format_duration(self.eta_s)}"
+
+    def details(self):
+        fph = self.frames_per_hour
+        overhead = self.overhead_s
+        cycle = self.cycle_s
+        return (f"{self.unit_name}: {self.frames_done}/{self.requested} frames, "
+                f"{'?' if fph is None else f'{fph:.1f}'} frames/h, "
+                f"cycle {'?' if cycle is None else f'{cycle:.2f}s'} for {self.exposure_s}s exposure, "
+                f"overhead {'?' if overhead is None else f'{overhead:.2f}s'} per frame, "
+                f"ETA {format_duration(self.eta_s)}")
+
+
+class ProgressTracker:
+    def __init__(self):
+        self._runs = {}
+
+    def start(self, unit_name, requested, exposure_s):
+        self._runs[unit_name] = CaptureProgress(unit_name, requested, exposure_s)
+        return self._runs[unit_name]
+
+    def progress(self, unit_name):
+        return self._runs.get(unit_name)
+
+    def update_from_status(self, unit_name, status, now=None):
+        progress = self._runs.get(unit_name)
+        if progress is None or progress.finished:
+            return progress
+        if SAVED_IMAGES_KEY in status:
+            progress.update(int(status[SAVED_IMAGES_KEY]), now)
+        if status["state"] == "SAVE":
+            progress.seen_saving = True
+        # a status taken before the run started must not finish it
+        elif progress.seen_saving or progress.frames_done >= progress.requested:
+            progress.finished = True
+            logger.info(f"Capture run finished: {progress.details()}")
+        return progress
+
+    def fleet_summary(self):
+        runs = [progress for progress in self._runs.values() if not progress.finished]
+        if not runs:
+            return "Fleet: idle"
+        done = sum(progress.frames_done for progress in runs)
+        requested = sum(progress.requested for progress in runs)
+        rates = [progress.frames_per_hour for progress in runs if progress.frames_per_hour]
+        etas = [progress.eta_s for progress in runs if progress.eta_s is not None]
+        overheads = [progress.overhead_s for progress in runs if progress.overhead_s is not None]
+        summary = f"Fleet: {done}/{requested} frames"
+        if rates:
+            summary += f", {sum(rates):.0f} frames/h"
+        if overheads:
+            summary += f", overhead {sum(overheads) / len(overheads):.2f}s/frame"
+        if etas:
+            summary += f", ETA {format_duration(max(etas))}"
+        return summary
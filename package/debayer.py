@@ -0,0 +1,113 @@
+import logging
+import numpy as np
+from PyQt5.QtGui import QImage
+
+
+logger = logging.getLogger(__name__)
+
+
+BAYER_PATTERNS = ["RGGB", "BGGR", "GRBG", "GBRG"]
+DEBAYER_OFF = "mono"
+DEBAYER_SUPERPIXEL = "color 2x2"
+DEBAYER_BILINEAR = "color full"
+DEBAYER_MODES = [DEBAYER_OFF, DEBAYER_SUPERPIXEL, DEBAYER_BILINEAR]
+STRETCH_LOW_PERCENTILE = 1
+STRETCH_HIGH_PERCENTILE = 99.5
+# percentiles are taken from every n-th pixel in both directions, enough for a stretch and much cheaper
+STRETCH_SAMPLE_STEP = 4
+
+# bilinear interpolation of masked green, red and blue use the separable [1, 2, 1] / 2 in both directions instead
+GREEN_KERNEL = np.array([[0, 1, 0], [1, 4, 1], [0, 1, 0]], dtype=np.float32) / 4
+
+
+def channel_offsets(pattern):
+    # (row, column) offsets inside the 2x2 cell for each of R, G, B
+    return {channel: [(i // 2, i % 2) for i, letter in enumerate(pattern) if letter == channel] for channel in "RGB"}
+
+
+def _even(raw):
+    h, w = raw.shape
+    return raw[:h - h % 2, :w - w % 2]
+
+
+def superpixel(raw, pattern):
+    # every 2x2 cell becomes one RGB pixel, half resolution, no interpolation
+    raw = _even(raw)
+    offsets = channel_offsets(pattern)
+    (ry, rx), = offsets["R"]
+    (by, bx), = offsets["B"]
+    (g1y, g1x), (g2y, g2x) = offsets["G"]
+    rgb = np.empty((raw.shape[0] // 2, raw.shape[1] // 2, 3), dtype=np.float32)
+    rgb[..., 0] = raw[ry::2, rx::2]
+    np.add(raw[g1y::2, g1x::2], raw[g2y::2, g2x::2], out=rgb[..., 1], dtype=np.float32)
+    rgb[..., 1] *= 0.5
+    rgb[..., 2] = raw[by::2, bx::2]
+    return rgb
+
+
+def _convolve3x3(plane, kernel):
+    # reflect padding keeps the Bayer phase at the borders
+    h, w = plane.shape
+    padded = np.pad(plane, 1, mode="reflect")
+    result = np.zeros_like(plane)
+    for dy, dx in zip(*np.nonzero(kernel)):
+        result += kernel[dy, dx] * padded[dy:dy + h, dx:dx + w]
+    return result
+
+
+def _smooth_121(plane, axis):
+    # [1, 2, 1] / 2 along one axis, sum of weights on a channel sampled every other pixel is 1
+    padded = np.pad(plane, [(1, 1) if a == axis else (0, 0) for a in range(2)], mode="reflect")
+    n = plane.shape[axis]
+    before = padded[:, :n] if axis == 1 else padded[:n]
+    after = padded[:, 2:] if axis == 1 else padded[2:]
+    result = before + after
+    result *= 0.5
+    result += plane
+    return result
+
+
+def bilinear(raw, pattern):
+    # full resolution, each channel is interpolated from its own samples by a 3x3 kernel
+    raw = _even(raw)
+    h, w = raw.shape
+    rgb = np.empty((h, w, 3), dtype=np.float32)
+    for index, channel in enumerate("RGB"):
+        masked = np.zeros((h, w), dtype=np.float32)
+        for y, x in channel_offsets(pattern)[channel]:
+            masked[y::2, x::2] = raw[y::2, x::2]
+        if channel == "G":
+            rgb[..., index] = _convolve3x3(masked, GREEN_KERNEL)
+        else:
+            rgb[..., index] = _smooth_121(_smooth_121(masked, 0), 1)
+    return rgb
+
+
+def auto_stretch_rgb(rgb):
+    # Each channel is stretched on its own, which also takes care of a rough white balance.
+    # Works in place on the float32 input.
+    sample = rgb[::STRETCH_SAMPLE_STEP, ::STRETCH_SAMPLE_STEP].reshape(-1, 3)
+    low = np.percentile(sample, STRETCH_LOW_PERCENTILE, axis=0)
+    high = np.percentile(sample, STRETCH_HIGH_PERCENTILE, axis=0)
+    rgb -= low.astype(np.float32)
+    rgb *= (255.0 / np.maximum(high - low, 1e-6)).astype(np.float32)
+    np.clip(rgb, 0, 255, out=rgb)
+    return rgb.astype(np.uint8)
+
+
+def debayer(raw, pattern, mode):
+    if mode == DEBAYER_SUPERPIXEL:
+        return superpixel(raw, pattern)
+    if mode == DEBAYER_BILINEAR:
+        return bilinear(raw, pattern)
+    raise ValueError(f"Unknown debayer mode {mode}")
+
+
+def qimage_from_rgb(rgb8):
+    h, w, _ = rgb8.shape
+    rgb8 = np.ascontiguousarray(rgb8)
+    return QImage(rgb8.data, w, h, rgb8.strides[0], QImage.Format_RGB888).copy()
+
+
+def color_qimage(raw, pattern, mode):
+    return qimage_from_rgb(auto_stretch_rgb(debayer(raw, pattern, mode)))
@@ -0,0 +1,159 @@
+import logging
+import threading
+from collections import deque
+from time import time
+import numpy as np
+from latest_wins import LatestWinsExecutor
+from optics import asi294_135mm_fov
+from registration import PhaseCorrelator
+from tracer import traced
+
+
+logger = logging.getLogger(__name__)
+
+
+ASI294_WIDTH_PX = 4144
+ARCSEC_IN_DEGREE = 3600
+# unbinned image scale of the default ASI294 + 135mm unit, config "image_scales" overrides it per unit
+DEFAULT_ARCSEC_PER_PIXEL = asi294_135mm_fov * ARCSEC_IN_DEGREE / ASI294_WIDTH_PX
+# about 2 pixels a minute at the default scale, stars are visibly elongated in a long exposure
+DEFAULT_WARNING_ARCSEC_PER_MIN = 10.0
+# drift rate is fitted over this many last samples, single frame shifts are too noisy
+RATE_WINDOW = 5
+# proxy is binned down to about this width: full frames get factor 4, already binned frames less or none,
+# a proxy pixel much coarser than stars biases the sub-pixel peak
+PROXY_WIDTH = 1024
+HISTORY_LENGTH = 5000
+SECONDS_IN_MINUTE = 60
+
+
+class DriftSample:
+    def __init__(self, timestamp, x_arcsec, y_arcsec, rate_arcsec_per_min, over_threshold):
+        # x and y are cumulative star drift in the frame since monitoring started, in frame axes
+        self.timestamp = timestamp
+        self.x_arcsec = x_arcsec
+        self.y_arcsec = y_arcsec
+        self.rate_arcsec_per_min = rate_arcsec_per_min
+        self.over_threshold = over_threshold
+
+    def text(self):
+        rate = "-" if self.rate_arcsec_per_min is None else f"{self.rate_arcsec_per_min:.1f}\"/min"
+        return f"x {self.x_arcsec:+.1f}\" y {self.y_arcsec:+.1f}\" rate {rate}"
+
+
+class DriftTracker:
+    # Drift of one unit from consecutive frames. Every frame is binned, background subtracted and transformed
+    # exactly once, its spectrum is kept to be correlated with the next frame.
+    def __init__(self, unit_name, warning_arcsec_per_min=DEFAULT_WARNING_ARCSEC_PER_MIN):
+        self.unit_name = unit_name
+        self.warning_arcsec_per_min = warning_arcsec_per_min
+        self._correlator = None
+        self._shape = None
+        self._previous_spectrum = None
+        self._x_arcsec = 0.0
+        self._y_arcsec = 0.0
+        self._history = deque(maxlen=HISTORY_LENGTH)
+        self._lock = threading.Lock()
+        self.lost_frames = 0
+
+    @traced("DriftTracker.add")
+    def add(self, frame, arcsec_per_pixel, timestamp=None):
+        # returns the new DriftSample, or None for the first frame and frames that could not be registered
+        timestamp = time() if timestamp is None else timestamp
+        if frame.ndim == 3:
+            frame = frame.mean(axis=2, dtype=np.float32)
+        if self._correlator is None or frame.shape != self._shape:
+            # first frame or binning changed: a new reference, cumulative drift goes on from where it was
+            self._correlator = PhaseCorrelator(frame, max(1, frame.shape[1] // PROXY_WIDTH))
+            self._shape = frame.shape
+            self._previous_spectrum = self._correlator.spectrum(frame)
+            return None
+        spectrum = self._correlator.spectrum(frame)
+        shift = self._correlator.shift_between(self._previous_spectrum, spectrum)
+        if shift is None:
+            # clouds or a bad frame, the next one is measured against the last good one
+            self.lost_frames += 1
+            return None
+        self._previous_spectrum = spectrum
+        # correlator gives the shift that aligns the frame back, stars moved the other way
+        dy, dx = shift
+        self._x_arcsec -= dx * arcsec_per_pixel
+        self._y_arcsec -= dy * arcsec_per_pixel
+        with self._lock:
+            self._history.append((timestamp, self._x_arcsec, self._y_arcsec))
+            rate = self._rate()
+        over = rate is not None and rate > self.warning_arcsec_per_min
+        return DriftSample(timestamp, self._x_arcsec, self._y_arcsec, rate, over)
+
+    def _rate(self):
+        # magnitude of the least squares drift velocity over the last samples
+        if len(self._history) < 2:
+            return None
+        recent = np.array(list(self._history)[-RATE_WINDOW:])
+        t = recent[:, 0] - recent[:, 0].mean()
+        spread = float((t ** 2).sum())
+        if spread == 0:
+            return None
+        vx = float((t * recent[:, 1]).sum()) / spread
+        vy = float((t * recent[:, 2]).sum()) / spread
+        return float(np.hypot(vx, vy)) * SECONDS_IN_MINUTE
+
+    def history(self):
+        # (n, 3) array of timestamp, x and y drift in arcsec
+        with self._lock:
+            return np.array(self._history, dtype=np.float64).reshape(-1, 3)
+
+
+class DriftMonitor:
+    # Feeds new frames of all units to their trackers on a worker pool. A unit has at most one frame in work;
+    # frames coming meanwhile replace each other, so the newest one is measured next and nothing queues up
+    # when frames come faster than they are fetched. on_sample(unit_name, DriftSample) is called from workers.
+    def __init__(self, on_sample=None, warning_arcsec_per_min=DEFAULT_WARNING_ARCSEC_PER_MIN, max_workers=4):
+        self.warning_arcsec_per_min = warning_arcsec_per_min
+        self._on_sample = on_sample
+        self._trackers = {}
+        self._warned = set()
+        self._lock = threading.Lock()
+        self._executor = LatestWinsExecutor(self._measure_frame, "Drift measurement", max_workers, "drift")
+
+    def tracker(self, unit_name) -> DriftTracker:
+        with self._lock:
+            if unit_name not in self._trackers:
+                self._trackers[unit_name] = DriftTracker(unit_name, self.warning_arcsec_per_min)
+            return self._trackers[unit_name]
+
+    def units(self):
+        with self._lock:
+            return list(self._trackers)
+
+    def reset(self):
+        with self._lock:
+            self._trackers = {}
+            self._warned = set()
+
+    def submit(self, unit_name, fetch_frame, arcsec_per_pixel):
+        # fetch_frame() -> frame or None, runs on a worker together with the measurement
+        self._executor.submit(unit_name, fetch_frame, arcsec_per_pixel)
+
+    def _measure_frame(self, unit_name, fetch_frame, arcsec_per_pixel):
+        frame = fetch_frame()
+        if frame is None:
+            return
+        sample = self.tracker(unit_name).add(frame, arcsec_per_pixel)
+        if sample is None:
+            return
+        logger.debug(f"Drift of {unit_name}: {sample.text()}")
+        with self._lock:
+            newly_over = sample.over_threshold and unit_name not in self._warned
+            if sample.over_threshold:
+                self._warned.add(unit_name)
+            else:
+                self._warned.discard(unit_name)
+        if newly_over:
+            logger.warning(f"{unit_name} drifts {sample.rate_arcsec_per_min:.1f}\"/min, "
+                           f"above {self.warning_arcsec_per_min:.1f}\"/min")
+        if self._on_sample is not None:
+            self._on_sample(unit_name, sample)
+
+    def shutdown(self):
+        self._executor.shutdown()
@@ -0,0 +1,129 @@
+import logging
+import numpy as np
+from PyQt5.QtCore import Qt, QPointF, pyqtSignal
+from PyQt5.QtGui import QColor, QIcon, QPainter, QPen, QPolygonF
+from PyQt5.QtWidgets import QHBoxLayout, QLabel, QMainWindow, QPushButton, QVBoxLayout, QWidget
+from drift_monitor import DriftMonitor, DEFAULT_WARNING_ARCSEC_PER_MIN
+
+
+logger = logging.getLogger(__name__)
+
+
+# units are named after their colors, others take the rest of the palette
+UNIT_COLORS = {"red": "#dd3333", "green": "#33bb33", "blue": "#3377ee", "yellow": "#ddcc22"}
+PALETTE = ["#dd8833", "#aa44cc", "#33bbbb", "#bbbbbb"]
+WARNING_COLOR = "#aa2222"
+PLOT_MARGIN = 40
+MIN_PLOT_RANGE_ARCSEC = 10.0
+SECONDS_IN_MINUTE = 60
+
+
+def unit_color(unit_name, index):
+    for color_name, color in UNIT_COLORS.items():
+        if unit_name.startswith(color_name):
+            return QColor(color)
+    return QColor(PALETTE[index % len(PALETTE)])
+
+
+class DriftPlot(QWidget):
+    # cumulative drift of every unit over time, one panel per frame axis
+    def __init__(self, parent=None):
+        super(DriftPlot, self).__init__(parent)
+        self._histories = {}
+        self.setMinimumSize(500, 360)
+
+    def set_histories(self, histories):
+        # {unit name: (n, 3) array of timestamp, x and y drift in arcsec}
+        self._histories = histories
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("black"))
+        non_empty = {name: history for name, history in self._histories.items() if len(history)}
+        panel_h = (self.height() - PLOT_MARGIN) // 2
+        if not non_empty:
+            painter.setPen(QColor("gray"))
+            painter.drawText(self.rect(), Qt.AlignCenter, "Waiting for frames")
+            painter.end()
+            return
+        start = min(float(history[0, 0]) for history in non_empty.values())
+        end = max(float(history[-1, 0]) for history in non_empty.values())
+        duration = max(end - start, 1.0)
+        for panel, (column, title) in enumerate(((1, "x [arcsec]"), (2, "y [arcsec]"))):
+            top = PLOT_MARGIN // 2 + panel * panel_h
+            extent = max([MIN_PLOT_RANGE_ARCSEC] + [float(np.abs(history[:, column]).max())
+                                                    for history in non_empty.values()])
+            self._draw_panel(painter, top, panel_h, title, extent, duration)
+            for index, (unit_name, history) in enumerate(sorted(non_empty.items())):
+                xs = PLOT_MARGIN + (history[:, 0] - start) / duration * (self.width() - 2 * PLOT_MARGIN)
+                ys = top + panel_h / 2 - history[:, column] / extent * (panel_h / 2 - 4)
+                painter.setPen(QPen(unit_color(unit_name, index), 2))
+                painter.drawPolyline(QPolygonF([QPointF(x, y) for x, y in zip(xs, ys)]))
+        painter.setPen(QColor("gray"))
+        painter.drawText(PLOT_MARGIN, self.height() - 4, f"last {duration / SECONDS_IN_MINUTE:.1f} min")
+        painter.end()
+
+    def _draw_panel(self, painter, top, height, title, extent, duration):
+        right = self.width() - PLOT_MARGIN
+        painter.setPen(QPen(QColor("#444444"), 1, Qt.DashLine))
+        middle = int(top + height / 2)
+        painter.drawLine(PLOT_MARGIN, middle, right, middle)
+        painter.setPen(QColor("gray"))
+        painter.drawRect(PLOT_MARGIN, top, right - PLOT_MARGIN, height - 4)
+        painter.drawText(PLOT_MARGIN + 4, top + 14, f"{title}, +-{extent:.0f}")
+
+
+class DriftWindow(QMainWindow):
+    # (unit name, DriftSample) from the drift workers
+    _sample_ready = pyqtSignal(object)
+
+    def __init__(self, parent, warning_arcsec_per_min=DEFAULT_WARNING_ARCSEC_PER_MIN):
+        super(DriftWindow, self).__init__(parent)
+        self.setWindowIcon(QIcon('4lufy.ico'))
+        self.setWindowTitle("Tracking drift")
+        self.monitor = DriftMonitor(lambda unit_name, sample: self._sample_ready.emit((unit_name, sample)),
+                                    warning_arcsec_per_min)
+        self._sample_ready.connect(self._show_sample)
+        self._unit_labels = {}
+        central = QWidget()
+        layout = QVBoxLayout()
+        self._plot = DriftPlot()
+        layout.addWidget(self._plot)
+        self._labels_layout = QHBoxLayout()
+        layout.addLayout(self._labels_layout)
+        bottom_layout = QHBoxLayout()
+        bottom_layout.addWidget(QLabel(f"Warning above {warning_arcsec_per_min:.1f}\"/min"))
+        reset_button = QPushButton("Reset")
+        reset_button.clicked.connect(self._reset)
+        bottom_layout.addWidget(reset_button)
+        layout.addLayout(bottom_layout)
+        central.setLayout(layout)
+        self.setCentralWidget(central)
+
+    def _unit_label(self, unit_name):
+        if unit_name not in self._unit_labels:
+            label = QLabel(f"{unit_name}: -")
+            self._unit_labels[unit_name] = label
+            self._labels_layout.addWidget(label)
+        return self._unit_labels[unit_name]
+
+    def _show_sample(self, unit_sample):
+        unit_name, sample = unit_sample
+        label = self._unit_label(unit_name)
+        label.setText(f"{unit_name}: {sample.text()}")
+        units = sorted(self.monitor.units())
+        color = unit_color(unit_name, units.index(unit_name) if unit_name in units else 0).name()
+        background = f"; background-color : {WARNING_COLOR}" if sample.over_threshold else ""
+        label.setStyleSheet(f"color : {color}{background}")
+        self._plot.set_histories({name: self.monitor.tracker(name).history() for name in self.monitor.units()})
+
+    def _reset(self):
+        self.monitor.reset()
+        for unit_name, label in self._unit_labels.items():
+            label.setText(f"{unit_name}: -")
+            label.setStyleSheet("")
+        self._plot.set_histories({})
+
+    def shutdown(self):
+        self.monitor.shutdown()
@@ -0,0 +1,87 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from camera_requester import CameraRequester
+
+
+logger = logging.getLogger(__name__)
+
+
+class UnitResult:
+    def __init__(self, unit_name, ok, value=None, latency_s=0.0, error=None):
+        self.unit_name = unit_name
+        self.ok = ok
+        self.value = value
+        self.latency_s = latency_s
+        self.error = error
+
+    def __repr__(self):
+        outcome = f"value={self.value}" if self.ok else f"error={self.error}"
+        return f"UnitResult({self.unit_name}, ok={self.ok}, {outcome}, latency={self.latency_s:.3f}s)"
+
+
+def _run_on_unit(unit_name, camera_index, send, read_back, accept):
+    start = perf_counter()
+
+    def result(ok, value=None, error=None):
+        return UnitResult(unit_name, ok, value, perf_counter() - start, error)
+
+    requester = CameraRequester(unit_name, camera_index)
+    try:
+        response = send(unit_name, requester)
+        if response is None:
+            return result(False, error="no response to command")
+        if read_back is None:
+            return result(True)
+        ok, value = read_back(requester)
+        if not ok:
+            return result(False, error="read-back failed")
+        if accept is not None and not accept(value):
+            return result(False, value, f"read-back value {value} was not accepted")
+        return result(True, value)
+    except Exception as e:
+        logger.error(f"Exception while running command on {unit_name}: {e}")
+        return result(False, error=str(e))
+
+
+# Runs send(unit_name, requester) on all targets ({unit_name: camera_index}) at once, then verifies each unit
+# with read_back(requester) -> (ok, value) and optional accept(value). Returns {unit_name: UnitResult}.
+def broadcast(targets, send, read_back=None, accept=None, max_workers=None):
+    if not targets:
+        return {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(targets)) as executor:
+        futures = {unit_name: executor.submit(_run_on_unit, unit_name, camera_index, send, read_back, accept)
+                   for unit_name, camera_index in targets.items()}
+        results = {unit_name: future.result() for unit_name, future in futures.items()}
+    log_results(results)
+    return results
+
+
+def log_results(results):
+    for result in results.values():
+        if result.ok:
+            logger.debug(f"{result}")
+        else:
+            logger.warning(f"{result}")
+
+
+def set_cooler_on_for_all(targets, value: bool):
+    return broadcast(targets,
+                     lambda unit_name, requester: requester.set_cooler_on(value),
+                     read_back=lambda requester: requester.get_cooler_on(),
+                     accept=lambda is_on: bool(is_on) == bool(value))
+
+
+def set_temperature_for_all(targets, value: int):
+    return broadcast(targets,
+                     lambda unit_name, requester: requester.set_set_temp(value),
+                     read_back=lambda requester: requester.get_set_temp(),
+                     accept=lambda temp: int(float(temp)) == int(value))
+
+
+def start_saving_for_all(targets, number_by_unit, prefix_by_unit, dir_name="Capture"):
+    return broadcast(targets,
+                     lambda unit_name, requester: requester.start_saving(
+                         number_by_unit[unit_name], dir_name, prefix_by_unit[unit_name]),
+                     read_back=lambda requester: requester.get_status(),
+                     accept=lambda status: status["state"] == "SAVE")
@@ -0,0 +1,92 @@
+import logging
+import threading
+from time import time
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+READOUT_DTYPES = {"RAW16": np.uint16, "RAW8": np.uint8}
+
+
+class Frame:
+    # One frame received from a camera: pixel data plus where and when it came from.
+    # data is a read-only (h, w) view over the received buffer (or (h, w, 3) for color JPG previews),
+    # nothing is copied until somebody changes pixels.
+    __slots__ = ("data", "unit_name", "camera_index", "readout_format", "transfer_format", "timestamp")
+
+    def __init__(self, data, unit_name=None, camera_index=None, readout_format=None, transfer_format=None,
+                 timestamp=None):
+        self.data = data
+        self.unit_name = unit_name
+        self.camera_index = camera_index
+        self.readout_format = readout_format
+        self.transfer_format = transfer_format
+        self.timestamp = time() if timestamp is None else timestamp
+
+    @classmethod
+    def from_buffer(cls, content, resolution, readout_format, **fields):
+        # resolution is (w, h) as the camera reports it, rows are h
+        w, h = resolution
+        data = np.frombuffer(content, dtype=READOUT_DTYPES.get(readout_format, np.uint8)).reshape(h, w)
+        return cls(data, readout_format=readout_format, **fields)
+
+    @property
+    def width(self):
+        return self.data.shape[1]
+
+    @property
+    def height(self):
+        return self.data.shape[0]
+
+    @property
+    def resolution(self):
+        return self.width, self.height
+
+    def age_s(self):
+        return time() - self.timestamp
+
+    def with_data(self, data):
+        # e.g. the calibrated frame, same origin
+        return Frame(data, self.unit_name, self.camera_index, self.readout_format, self.transfer_format,
+                     self.timestamp)
+
+    def __repr__(self):
+        return (f"Frame({self.unit_name}#{self.camera_index} {self.width}x{self.height} {self.readout_format} "
+                f"via {self.transfer_format})")
+
+
+class LatestFrames:
+    # Last full (RAW) frame of every camera, so viewing, saving and solving the same frame downloads it once.
+    # invalidate() on every new frame of a unit, a download that started before does not get stored then.
+    def __init__(self):
+        self._frames = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, unit_name):
+        with self._lock:
+            return self._generations.get(unit_name, 0)
+
+    def invalidate(self, unit_name):
+        with self._lock:
+            self._generations[unit_name] = self._generations.get(unit_name, 0) + 1
+            self._frames.pop(unit_name, None)
+
+    def store(self, frame: Frame, generation):
+        with self._lock:
+            if self._generations.get(frame.unit_name, 0) == generation:
+                self._frames[frame.unit_name] = frame
+
+    def get(self, unit_name, camera_index, max_age_s=None):
+        with self._lock:
+            frame = self._frames.get(unit_name)
+        if frame is None or frame.camera_index != camera_index:
+            return None
+        if max_age_s is not None and frame.age_s() > max_age_s:
+            return None
+        return frame
+
+
+latest_frames = LatestFrames()
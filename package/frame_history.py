@@ -0,0 +1,112 @@
+import logging
+import os
+import tempfile
+from time import time
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+HISTORY_DIRECTORY = os.path.join(tempfile.gettempdir(), "dyspozytornia_history")
+DEFAULT_HISTORY_FRAMES = 32
+METADATA_DTYPE = np.dtype([("sequence", "<i8"), ("timestamp", "<f8"), ("exposure_us", "<f8"), ("gain", "<f4"),
+                           ("temperature", "<f4")])
+
+
+def number_or_nan(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class FrameHistory:
+    # Ring buffer of the last frames of one camera. Frames and metadata records live in memory-mapped files,
+    # so resident memory stays bounded by what the OS keeps in page cache, not by capacity.
+    # Positions go from 0 (oldest kept frame) to len - 1 (newest).
+    def __init__(self, name, capacity=DEFAULT_HISTORY_FRAMES, directory=HISTORY_DIRECTORY):
+        self.capacity = capacity
+        self._base_path = os.path.join(directory, f"{name}_{os.getpid()}")
+        self._directory = directory
+        # frames of each (shape, dtype) in a file of their own, e.g. 8-bit JPG and 16-bit RAW previews
+        # alternate without dropping each other; a slot holds a frame in only one of them
+        self._frames = {}
+        self._slot_layouts = [None] * capacity
+        self._metadata = None
+        self._count = 0
+        self._next_sequence = 0
+
+    def __len__(self):
+        return self._count
+
+    def _frames_path(self, layout):
+        shape, dtype = layout
+        return f"{self._base_path}_{'x'.join(map(str, shape))}_{dtype.name}.frames"
+
+    def _allocate(self, layout):
+        os.makedirs(self._directory, exist_ok=True)
+        if self._metadata is None:
+            self._metadata = np.memmap(f"{self._base_path}.meta", dtype=METADATA_DTYPE, mode='w+',
+                                       shape=(self.capacity,))
+        shape, dtype = layout
+        self._frames[layout] = np.memmap(self._frames_path(layout), dtype=dtype, mode='w+',
+                                         shape=(self.capacity,) + shape)
+        logger.debug(f"Allocated history of {self.capacity} frames {shape} {dtype} at {self._base_path}")
+
+    def _release_unused(self):
+        # a layout whose frames were all overwritten by other layouts is not kept on disk
+        for layout in set(self._frames) - set(self._slot_layouts):
+            del self._frames[layout]
+            self._remove(self._frames_path(layout))
+
+    def append(self, frame, exposure_us=None, gain=None, temperature=None, timestamp=None):
+        layout = (frame.shape, frame.dtype)
+        if layout not in self._frames:
+            self._allocate(layout)
+        sequence = self._next_sequence
+        slot = sequence % self.capacity
+        self._frames[layout][slot] = frame
+        self._slot_layouts[slot] = layout
+        self._metadata[slot] = (sequence, timestamp if timestamp is not None else time(), number_or_nan(exposure_us),
+                                number_or_nan(gain), number_or_nan(temperature))
+        self._next_sequence += 1
+        self._count = min(self._count + 1, self.capacity)
+        self._release_unused()
+        return sequence
+
+    def _slot(self, position):
+        if not 0 <= position < self._count:
+            raise IndexError(f"History position {position} outside 0-{self._count - 1}")
+        return (self._next_sequence - self._count + position) % self.capacity
+
+    def position_of(self, sequence):
+        position = sequence - (self._next_sequence - self._count)
+        return position if 0 <= position < self._count else None
+
+    def frame(self, position):
+        # view into the mapped file, valid until the slot is overwritten
+        slot = self._slot(position)
+        return self._frames[self._slot_layouts[slot]][slot]
+
+    def metadata(self, position):
+        record = self._metadata[self._slot(position)]
+        return {name: record[name].item() for name in METADATA_DTYPE.names}
+
+    def close(self):
+        if self._metadata is None:
+            return
+        paths = [self._frames_path(layout) for layout in self._frames] + [f"{self._base_path}.meta"]
+        self._frames = {}
+        self._slot_layouts = [None] * self.capacity
+        self._metadata = None
+        self._count = 0
+        for path in paths:
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove history file: {e}")
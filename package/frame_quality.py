@@ -0,0 +1,239 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import numpy as np
+from frame_writer import FITS_EXTENSIONS, TIFF_EXTENSIONS, read_frame
+from quality_index import DEFAULT_INDEX_PATH, QualityIndex
+
+
+logger = logging.getLogger(__name__)
+
+
+# scales median absolute deviation to standard deviation of normal distribution
+MAD_TO_SIGMA = 1.4826
+# background is estimated per tile, so gradients from the Moon or light pollution do not look like stars
+BACKGROUND_TILE = 64
+NOISE_SAMPLE_STEP = 4
+DETECTION_SIGMA = 5.0
+# a hot pixel has no light in its neighbours, a star spreads over a few pixels
+MIN_NEIGHBOUR_RATIO = 0.1
+STAMP_RADIUS = 8
+# stamp pixels below this many sigma of noise are left out, clipped noise far from the star inflates HFR
+STAMP_FLOOR_SIGMA = 3.0
+# HFR and eccentricity are measured on the brightest stars only
+MAX_MEASURED_STARS = 300
+SATURATION_RATIO = 0.98
+
+
+def background_map(data):
+    # median of every tile, repeated back to full size, edges not covered by whole tiles take the nearest tile
+    h, w = data.shape
+    ty, tx = max(1, h // BACKGROUND_TILE), max(1, w // BACKGROUND_TILE)
+    tile_h, tile_w = h // ty, w // tx
+    tiles = data[:ty * tile_h, :tx * tile_w].reshape(ty, tile_h, tx, tile_w)
+    medians = np.median(tiles.transpose(0, 2, 1, 3).reshape(ty, tx, -1), axis=2)
+    rows = np.minimum(np.arange(h) // tile_h, ty - 1)
+    columns = np.minimum(np.arange(w) // tile_w, tx - 1)
+    return medians[rows[:, None], columns[None, :]], float(np.median(medians))
+
+
+def find_stars(residual, noise):
+    # local maxima above the detection threshold, away from the borders, hot pixels rejected
+    r = STAMP_RADIUS
+    core = residual[r:-r, r:-r]
+    threshold = DETECTION_SIGMA * max(noise, 1e-6)
+    peaks = core > threshold
+    h, w = core.shape
+    neighbour_sum = np.zeros_like(core)
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            if dy == 0 and dx == 0:
+                continue
+            neighbour = residual[r + dy:r + dy + h, r + dx:r + dx + w]
+            # ties go to the first pixel in raster order, so a flat top gives one star
+            peaks &= (core > neighbour) if (dy, dx) < (0, 0) else (core >= neighbour)
+            if dy == 0 or dx == 0:
+                neighbour_sum += neighbour
+    peaks &= neighbour_sum / 4 > MIN_NEIGHBOUR_RATIO * core
+    ys, xs = np.nonzero(peaks)
+    return ys + r, xs + r, core[ys, xs]
+
+
+def star_shapes(residual, ys, xs, noise):
+    # flux weighted half flux radius and eccentricity from second moments, for every star stamp at once
+    offsets = np.arange(-STAMP_RADIUS, STAMP_RADIUS + 1, dtype=np.float32)
+    stamps = residual[ys[:, None, None] + offsets.astype(np.intp)[None, :, None],
+                      xs[:, None, None] + offsets.astype(np.intp)[None, None, :]]
+    stamps = np.where(stamps > STAMP_FLOOR_SIGMA * noise, stamps, 0)
+    flux = stamps.sum(axis=(1, 2))
+    valid = flux > 0
+    stamps, flux = stamps[valid], flux[valid]
+    dy = offsets[None, :, None]
+    dx = offsets[None, None, :]
+    cy = (stamps * dy).sum(axis=(1, 2)) / flux
+    cx = (stamps * dx).sum(axis=(1, 2)) / flux
+    ry = dy - cy[:, None, None]
+    rx = dx - cx[:, None, None]
+    hfr = (stamps * np.sqrt(ry ** 2 + rx ** 2)).sum(axis=(1, 2)) / flux
+    myy = (stamps * ry ** 2).sum(axis=(1, 2)) / flux
+    mxx = (stamps * rx ** 2).sum(axis=(1, 2)) / flux
+    mxy = (stamps * ry * rx).sum(axis=(1, 2)) / flux
+    half_trace = (mxx + myy) / 2
+    spread = np.sqrt(((mxx - myy) / 2) ** 2 + mxy ** 2)
+    major, minor = half_trace + spread, np.maximum(half_trace - spread, 0)
+    eccentricity = np.sqrt(1 - minor / np.maximum(major, 1e-12))
+    return hfr, eccentricity
+
+
+def measure_frame(frame):
+    # background, noise and star metrics of one mono (or undebayered) frame
+    data = frame.astype(np.float32)
+    saturation = np.iinfo(frame.dtype).max if np.issubdtype(frame.dtype, np.integer) else float(data.max())
+    background, background_level = background_map(data)
+    residual = data - background
+    sample = residual[::NOISE_SAMPLE_STEP, ::NOISE_SAMPLE_STEP]
+    noise = MAD_TO_SIGMA * float(np.median(np.abs(sample - np.median(sample))))
+    ys, xs, peaks = find_stars(residual, noise)
+    metrics = {
+        "background": background_level,
+        "noise": noise,
+        "star_count": int(len(ys)),
+        "hfr": None,
+        "eccentricity": None,
+        "saturated_fraction": float(np.count_nonzero(frame >= SATURATION_RATIO * saturation)) / frame.size,
+    }
+    # saturated stars have flat tops, their shape says nothing about focus
+    unsaturated = data[ys, xs] < SATURATION_RATIO * saturation
+    ys, xs, peaks = ys[unsaturated], xs[unsaturated], peaks[unsaturated]
+    brightest = np.argsort(peaks)[::-1][:MAX_MEASURED_STARS]
+    if len(brightest):
+        hfr, eccentricity = star_shapes(residual, ys[brightest], xs[brightest], noise)
+        if len(hfr):
+            metrics["hfr"] = float(np.median(hfr))
+            metrics["eccentricity"] = float(np.median(eccentricity))
+    return metrics
+
+
+def analyze_file(path):
+    # runs in a worker process: reads the file itself, only the path and small dicts cross process boundary
+    frame, metadata = read_frame(path)
+    metrics = measure_frame(frame)
+    metrics["height"], metrics["width"] = frame.shape[:2]
+    return path, metadata, metrics
+
+
+def frame_timestamp(path, metadata):
+    date_obs = metadata.get("date_obs")
+    if date_obs:
+        try:
+            return datetime.fromisoformat(date_obs).replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            logger.warning(f"Unreadable date_obs {date_obs} in {path}")
+    return os.path.getmtime(path)
+
+
+class QualityAnalyzer:
+    # Measures saved frames in a pool of worker processes and stores results in the quality index.
+    # Processes are started lazily on the first frame and with spawn, which is safe next to Qt and other threads.
+    def __init__(self, index_path=DEFAULT_INDEX_PATH, max_workers=None):
+        self.index = QualityIndex(index_path)
+        self._max_workers = max_workers or max(1, (os.cpu_count() or 2) - 1)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._pending = 0
+        self._pending_changed = threading.Condition()
+
+    def _pool(self):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self._max_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def submit(self, path, metadata=None):
+        # metadata of the writer wins over the one read back from the file, it is the same or richer
+        future = self._pool().submit(analyze_file, path)
+        with self._pending_changed:
+            self._pending += 1
+        future.add_done_callback(lambda done: self._store(done, metadata))
+        return future
+
+    def frame_written(self, path, metadata):
+        # matches FrameWriter.on_written
+        self.submit(path, metadata)
+
+    def _store(self, future, metadata):
+        try:
+            path, file_metadata, metrics = future.result()
+            metadata = {**file_metadata, **(metadata or {})}
+            self.index.add(path, metadata, metrics, frame_timestamp(path, metadata))
+            logger.debug(f"Indexed {path}: {metrics}")
+        except Exception as e:
+            logger.error(f"Frame analysis failed: {e}")
+        finally:
+            with self._pending_changed:
+                self._pending -= 1
+                self._pending_changed.notify_all()
+
+    def wait(self):
+        # until every submitted frame is measured and stored
+        with self._pending_changed:
+            self._pending_changed.wait_for(lambda: self._pending == 0)
+
+    def shutdown(self, wait=True):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=not wait)
+                self._executor = None
+        self.index.close()
+
+
+def frame_files(directory):
+    extensions = TIFF_EXTENSIONS + FITS_EXTENSIONS
+    return sorted(os.path.join(root, file_name) for root, _, file_names in os.walk(directory)
+                  for file_name in file_names if file_name.lower().endswith(extensions)
+                  and not file_name.startswith("master_"))
+
+
+def format_row(row):
+    values = [f"{name}={row[name]:.3g}" if isinstance(row[name], float) else f"{name}={row[name]}"
+              for name in ("unit", "frame_type", "exposure_s", "gain", "star_count", "hfr", "eccentricity")]
+    return f"{row['path']}: {', '.join(values)}"
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Indexes quality of saved frames and queries the index")
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH, help="SQLite index file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    analyze = commands.add_parser("analyze", help="Measure frames in a directory that are not indexed yet")
+    analyze.add_argument("directory")
+    analyze.add_argument("--workers", type=int, default=None)
+    query = commands.add_parser("query", help="List indexed frames, best HFR first")
+    query.add_argument("--unit", default=None)
+    query.add_argument("--type", default=None, help="Frame type, e.g. light")
+    query.add_argument("--max-hfr", type=float, default=None)
+    query.add_argument("--max-eccentricity", type=float, default=None)
+    query.add_argument("--min-stars", type=int, default=None)
+    query.add_argument("--exposure", type=float, default=None, help="Exposure in seconds")
+    args = parser.parse_args()
+
+    if args.command == "analyze":
+        analyzer = QualityAnalyzer(args.index, args.workers)
+        paths = [path for path in frame_files(args.directory) if not analyzer.index.contains(path)]
+        print(f"Analyzing {len(paths)} frames")
+        for frame_path in paths:
+            analyzer.submit(frame_path)
+        analyzer.wait()
+        analyzer.shutdown()
+    else:
+        index = QualityIndex(args.index)
+        for found in index.query(unit=args.unit, frame_type=args.type, max_hfr=args.max_hfr,
+                                 max_eccentricity=args.max_eccentricity, min_stars=args.min_stars,
+                                 exposure_s=args.exposure):
+            print(format_row(found))
+        index.close()
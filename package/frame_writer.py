@@ -0,0 +1,287 @@
+import importlib.util
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from threading import Lock
+import numpy as np
+from tracer import traced
+
+
+logger = logging.getLogger(__name__)
+
+
+FORMAT_TIFF = "tiff"
+FORMAT_TIFF_DEFLATE = "tiff-deflate"
+FORMAT_TIFF_ZSTD = "tiff-zstd"
+FORMAT_FITS = "fits"
+# uncompressed TIFF is contiguous and can be memory-mapped when building calibration masters, compression is opt-in
+DEFAULT_OUTPUT_FORMAT = FORMAT_TIFF
+TIFF_COMPRESSION = {FORMAT_TIFF: None, FORMAT_TIFF_DEFLATE: "zlib", FORMAT_TIFF_ZSTD: "zstd"}
+TIFF_TILE = (256, 256)
+# on noisy sky frames higher levels gain a few percent of size for several times the CPU
+DEFLATE_LEVEL = 1
+ZSTD_LEVEL = 3
+FITS_BLOCK = 2880
+FITS_CARD = 80
+US_IN_SECOND = 1000000
+DEFAULT_WRITE_WORKERS = 4
+
+# metadata key -> (FITS keyword, comment), values in FITS units
+FITS_KEYWORDS = {
+    "exposure_s": ("EXPTIME", "[s] exposure time"),
+    "gain": ("GAIN", "camera gain setting"),
+    "temperature": ("CCD-TEMP", "[C] sensor temperature"),
+    "binning": ("XBINNING", "binning factor"),
+    "unit": ("TELESCOP", "unit name"),
+    "camera": ("INSTRUME", "camera name"),
+    "ra": ("OBJCTRA", "solved or initial RA"),
+    "dec": ("OBJCTDEC", "solved or initial DEC"),
+    "date_obs": ("DATE-OBS", "UTC time of saving"),
+    "frame_type": ("IMAGETYP", "capture type"),
+}
+TIFF_EXTENSIONS = (".tif", ".tiff")
+FITS_EXTENSIONS = (".fits", ".fit", ".fts")
+
+
+def available_formats():
+    # zstd in TIFF needs imagecodecs, deflate is in the standard library
+    formats = [FORMAT_TIFF, FORMAT_TIFF_DEFLATE, FORMAT_FITS]
+    if importlib.util.find_spec("imagecodecs") is not None:
+        formats.insert(2, FORMAT_TIFF_ZSTD)
+    return formats
+
+
+def extension_for(output_format):
+    return ".fits" if output_format == FORMAT_FITS else ".tif"
+
+
+def acquisition_metadata(unit=None, camera=None, exposure_us=None, gain=None, temperature=None, binning=None, ra=None,
+                         dec=None, frame_type=None):
+    # drops unknown values, UI placeholders like "<<value>>" included
+    def number(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+
+    metadata = {
+        "unit": unit,
+        "camera": camera,
+        "exposure_s": exposure_us / US_IN_SECOND if number(exposure_us) is not None else None,
+        "gain": number(gain),
+        "temperature": number(temperature),
+        "binning": number(str(binning).lstrip("x")) if binning is not None else None,
+        "ra": ra,
+        "dec": dec,
+        "date_obs": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3],
+        "frame_type": frame_type,
+    }
+    if "binning" in metadata and metadata["binning"] is not None:
+        metadata["binning"] = int(metadata["binning"])
+    return {key: value for key, value in metadata.items() if value is not None}
+
+
+def _fits_value(value):
+    if isinstance(value, bool):
+        return f"{'T' if value else 'F':>20}"
+    if isinstance(value, (int, np.integer)):
+        return f"{value:>20d}"
+    if isinstance(value, (float, np.floating)):
+        return f"{value:>20.10G}"
+    text = str(value).replace("'", "''")
+    return f"'{text:<8}'"
+
+
+def fits_card(keyword, value=None, comment=None):
+    if value is None:
+        card = f"{keyword:<8}"
+    else:
+        card = f"{keyword:<8}= {_fits_value(value)}"
+        if comment:
+            card += f" / {comment}"
+    return card[:FITS_CARD].ljust(FITS_CARD).encode("ascii", "replace")
+
+
+def write_fits(path, frame, metadata):
+    # Minimal single-HDU FITS writer: unsigned 16 bit data is stored as signed with BZERO = 32768.
+    if frame.dtype == np.uint16:
+        # flipping the top bit is the same as subtracting BZERO and keeps the work in 16 bits
+        data = (frame ^ np.uint16(0x8000)).astype(">u2").view(">i2")
+        bitpix, bzero = 16, 32768
+    elif frame.dtype == np.uint8:
+        data = frame
+        bitpix, bzero = 8, None
+    else:
+        data = frame.astype(">f4")
+        bitpix, bzero = -32, None
+    h, w = frame.shape
+    cards = [fits_card("SIMPLE", True), fits_card("BITPIX", bitpix), fits_card("NAXIS", 2), fits_card("NAXIS1", w),
+             fits_card("NAXIS2", h)]
+    if bzero is not None:
+        cards += [fits_card("BZERO", bzero), fits_card("BSCALE", 1)]
+    for key, (keyword, comment) in FITS_KEYWORDS.items():
+        if key in metadata:
+            cards.append(fits_card(keyword, metadata[key], comment))
+            if key == "binning":
+                cards.append(fits_card("YBINNING", metadata[key], comment))
+    cards.append(fits_card("END"))
+    header = b"".join(cards)
+    with open(path, 'wb') as outfile:
+        outfile.write(header + b" " * (-len(header) % FITS_BLOCK))
+        payload = np.ascontiguousarray(data)
+        outfile.write(memoryview(payload).cast("B"))
+        outfile.write(b"\0" * (-payload.nbytes % FITS_BLOCK))
+
+
+def _parse_fits_value(text):
+    text = text.strip()
+    if text.startswith("'"):
+        end = text.find("'", 1)
+        # a doubled quote is a quote inside the string
+        while end != -1 and text[end + 1:end + 2] == "'":
+            end = text.find("'", end + 2)
+        return text[1:end].replace("''", "'").rstrip()
+    text = text.split("/", 1)[0].strip()
+    if text in ("T", "F"):
+        return text == "T"
+    for parse in (int, float):
+        try:
+            return parse(text)
+        except ValueError:
+            pass
+    return text
+
+
+class FitsImage:
+    # Data of a FITS file written by write_fits, memory-mapped; rows are read and converted to the native
+    # dtype only when sliced, like a memory-mapped TIFF
+    def __init__(self, data, cards):
+        self._data = data
+        self.cards = cards
+        self._unsigned16 = cards["BITPIX"] == 16 and cards.get("BZERO") == 32768
+        self.shape = data.shape
+        self.dtype = np.dtype(np.uint16) if self._unsigned16 else data.dtype.newbyteorder("=")
+
+    def __getitem__(self, key):
+        data = self._data[key]
+        if self._unsigned16:
+            return (data.view(">u2") ^ np.uint16(0x8000)).astype(np.uint16)
+        return data.astype(self.dtype)
+
+
+def open_fits(path):
+    # a single 2D image HDU as write_fits writes it, header cards included
+    cards = {}
+    with open(path, 'rb') as infile:
+        header_bytes = 0
+        while "END" not in cards:
+            block = infile.read(FITS_BLOCK)
+            if len(block) < FITS_BLOCK:
+                raise ValueError(f"{path} ends inside the FITS header")
+            header_bytes += FITS_BLOCK
+            for start in range(0, FITS_BLOCK, FITS_CARD):
+                card = block[start:start + FITS_CARD].decode("ascii", "replace")
+                keyword = card[:8].strip()
+                if keyword == "END":
+                    cards["END"] = None
+                    break
+                if card[8:10] == "= ":
+                    cards[keyword] = _parse_fits_value(card[10:])
+    dtypes = {8: np.uint8, 16: ">i2", -32: ">f4"}
+    if cards.get("NAXIS") != 2 or cards.get("BITPIX") not in dtypes:
+        raise ValueError(f"{path} is not a 2D FITS image this writer produces")
+    h, w = cards["NAXIS2"], cards["NAXIS1"]
+    return FitsImage(np.memmap(path, dtype=dtypes[cards["BITPIX"]], mode='r', offset=header_bytes, shape=(h, w)),
+                     cards)
+
+
+def read_fits(path):
+    # Reads what write_fits writes: a single 2D image HDU, returns (frame, metadata)
+    image = open_fits(path)
+    metadata = {key: image.cards[keyword] for key, (keyword, _) in FITS_KEYWORDS.items() if keyword in image.cards}
+    return image[:], metadata
+
+
+def read_tiff(path):
+    import tifffile
+    with tifffile.TiffFile(path) as tiff:
+        page = tiff.pages[0]
+        frame = page.asarray()
+        try:
+            metadata = json.loads(page.description)
+        except (TypeError, ValueError):
+            metadata = {}
+    return frame, metadata if isinstance(metadata, dict) else {}
+
+
+def read_frame(path):
+    # (frame, acquisition metadata) from a file written by FrameWriter, or any plain TIFF
+    if path.lower().endswith(FITS_EXTENSIONS):
+        return read_fits(path)
+    return read_tiff(path)
+
+
+def write_tiff(path, frame, metadata, compression=None, max_workers=1):
+    import tifffile
+    options = {}
+    if compression is not None:
+        # tiles are compressed independently, which is what lets tifffile spread them over threads
+        options = {"tile": TIFF_TILE, "compression": compression, "maxworkers": max_workers,
+                   "compressionargs": {"level": ZSTD_LEVEL if compression == "zstd" else DEFLATE_LEVEL}}
+    tifffile.imwrite(path, frame, photometric="minisblack", description=json.dumps(metadata), metadata=None,
+                     **options)
+
+
+class FrameWriter:
+    # Writes frames with acquisition metadata to unique files. write() is synchronous, submit() and write_batch()
+    # use a pool of worker threads. on_written(path, metadata) is called after every file is complete.
+    def __init__(self, output_format=DEFAULT_OUTPUT_FORMAT, directory=None, max_workers=DEFAULT_WRITE_WORKERS,
+                 on_written=None):
+        if output_format not in TIFF_COMPRESSION and output_format != FORMAT_FITS:
+            raise ValueError(f"Unknown output format {output_format}")
+        self.output_format = output_format
+        self.directory = directory
+        self._max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="writer")
+        self._names_lock = Lock()
+        self.on_written = on_written
+
+    def unique_path(self, file_prefix):
+        directory = self.directory or os.getcwd()
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
+        base = os.path.join(directory, f"{file_prefix}_{stamp}")
+        extension = extension_for(self.output_format)
+        with self._names_lock:
+            path, counter = f"{base}{extension}", 1
+            while os.path.exists(path):
+                path, counter = f"{base}_{counter}{extension}", counter + 1
+            # reserve the name so that parallel writes do not pick it too
+            open(path, 'wb').close()
+        return path
+
+    @traced("FrameWriter.write")
+    def write(self, file_prefix, frame, metadata=None, compression_workers=None):
+        path = self.unique_path(file_prefix)
+        metadata = metadata or {}
+        if self.output_format == FORMAT_FITS:
+            write_fits(path, frame, metadata)
+        else:
+            write_tiff(path, frame, metadata, TIFF_COMPRESSION[self.output_format],
+                       compression_workers or self._max_workers)
+        logger.debug(f"Saved {frame.shape} {frame.dtype} frame into {path}")
+        if self.on_written is not None:
+            self.on_written(path, metadata)
+        return path
+
+    def submit(self, file_prefix, frame, metadata=None):
+        # frames in a batch are already written in parallel, so each compresses on a single thread
+        return self._executor.submit(self.write, file_prefix, frame, metadata, 1)
+
+    def write_batch(self, items):
+        # items are (file_prefix, frame, metadata), returns paths in the same order
+        return [future.result() for future in [self.submit(*item) for item in items]]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
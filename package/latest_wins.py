@@ -0,0 +1,42 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+logger = logging.getLogger(__name__)
+
+
+class LatestWinsExecutor:
+    # Runs work(key, *args) on a worker pool with at most one call per key in work. Calls submitted for a busy key
+    # replace each other, so the newest arguments run next and nothing queues up when they come faster than work
+    # is done. Exceptions of work are logged as "<description> of <key> failed".
+    def __init__(self, work, description, max_workers, thread_name_prefix):
+        self._work = work
+        self._description = description
+        self._busy = set()
+        self._waiting = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+    def submit(self, key, *args):
+        with self._lock:
+            if key in self._busy:
+                self._waiting[key] = args
+                return
+            self._busy.add(key)
+        self._executor.submit(self._run, key, args)
+
+    def _run(self, key, args):
+        while True:
+            try:
+                self._work(key, *args)
+            except Exception as e:
+                logger.error(f"{self._description} of {key} failed: {e}")
+            with self._lock:
+                if key not in self._waiting:
+                    self._busy.discard(key)
+                    return
+                args = self._waiting.pop(key)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
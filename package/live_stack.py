@@ -0,0 +1,90 @@
+import logging
+import numpy as np
+from registration import PhaseCorrelator, overlap_slices, DEFAULT_PROXY_FACTOR
+
+
+logger = logging.getLogger(__name__)
+
+
+STACK_MEAN = "mean"
+STACK_SIGMA_CLIP = "sigma-clip"
+STACK_MODES = [STACK_MEAN, STACK_SIGMA_CLIP]
+DEFAULT_SIGMA = 3.0
+# sigma clipping needs a few frames before the per-pixel spread means anything
+SIGMA_CLIP_WARMUP_FRAMES = 3
+
+
+class LiveStack:
+    # Registers each frame to the first one with phase correlation on a binned proxy and keeps a per-pixel
+    # running mean (Welford) in float32. In sigma-clip mode values further than sigma standard deviations
+    # from the current mean are rejected. Memory is a few frame-sized buffers regardless of frame count.
+    def __init__(self, mode=STACK_MEAN, sigma=DEFAULT_SIGMA, proxy_factor=DEFAULT_PROXY_FACTOR, shift_step=1):
+        self.mode = mode
+        # raw Bayer frames may only move by whole 2x2 cells, otherwise colors get mixed
+        self._shift_step = shift_step
+        self.sigma = sigma
+        self._proxy_factor = proxy_factor
+        self._correlator = None
+        self._mean = None
+        self._m2 = None
+        self._count = None
+        self.frames_stacked = 0
+        self.frames_rejected = 0
+        self.last_shift = (0.0, 0.0)
+
+    @property
+    def image(self):
+        return self._mean
+
+    def add(self, frame):
+        if self._correlator is None:
+            self._start(frame)
+            return True
+        if frame.shape != self._mean.shape:
+            logger.warning(f"Frame {frame.shape} does not match stack {self._mean.shape}, skipping")
+            self.frames_rejected += 1
+            return False
+        shift = self._correlator.shift(frame)
+        if shift is None:
+            logger.warning("Could not register frame, skipping")
+            self.frames_rejected += 1
+            return False
+        self.last_shift = shift
+        step = self._shift_step
+        dy, dx = int(round(shift[0] / step)) * step, int(round(shift[1] / step)) * step
+        h, w = frame.shape
+        if abs(dy) >= h or abs(dx) >= w:
+            self.frames_rejected += 1
+            return False
+        dst_y, src_y = overlap_slices(h, dy)
+        dst_x, src_x = overlap_slices(w, dx)
+        self._accumulate(frame[src_y, src_x].astype(np.float32), (dst_y, dst_x))
+        self.frames_stacked += 1
+        logger.debug(f"Stacked frame {self.frames_stacked} with shift dy={dy}, dx={dx}")
+        return True
+
+    def _start(self, frame):
+        self._correlator = PhaseCorrelator(frame, self._proxy_factor)
+        self._mean = frame.astype(np.float32)
+        self._count = np.ones(frame.shape, dtype=np.float32)
+        if self.mode == STACK_SIGMA_CLIP:
+            self._m2 = np.zeros(frame.shape, dtype=np.float32)
+        self.frames_stacked = 1
+
+    def _accumulate(self, values, region):
+        mean = self._mean[region]
+        count = self._count[region]
+        delta = values - mean
+        if self._m2 is not None and self.frames_stacked >= SIGMA_CLIP_WARMUP_FRAMES:
+            m2 = self._m2[region]
+            std = np.sqrt(m2 / np.maximum(count - 1, 1))
+            accepted = (np.abs(delta) <= self.sigma * std) | (count < 2)
+            count += accepted
+            delta *= accepted
+            mean += delta / count
+            m2 += delta * (values - mean) * accepted
+            return
+        count += 1
+        mean += delta / count
+        if self._m2 is not None:
+            self._m2[region] += delta * (values - mean)
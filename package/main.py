@@ -1,12 +1,22 @@
+import sys
+from time import perf_counter
+from package.startup_profiler import StartupProfiler, report_path_from_argv
+
+startup_profiler = StartupProfiler(perf_counter(), report_path_from_argv(sys.argv))
+startup_profiler.install_import_hook()
+
 from package.config_manager import read_config
 from package.welcome_view import WelcomeView
 from PyQt5.QtWidgets import QMainWindow, QApplication, QVBoxLayout
 from PyQt5.QtGui import QIcon
-import sys
 import logging
 from logging.handlers import RotatingFileHandler
 import qdarktheme
 import subprocess
+import multiprocessing
+
+
+startup_profiler.mark("imports done")
 
 
 logger = logging.getLogger(__name__)
@@ -51,6 +61,8 @@ def configure_logging(logfile_path):
 
 
 if __name__ == '__main__':
+    # frame quality workers are spawned processes, a PyInstaller bundle has to hand them over to their code
+    multiprocessing.freeze_support()
     # TODO: make this available and print result ok or not!
     # user = "pi"
     # host = "red-nano"
@@ -63,7 +75,10 @@ if __name__ == '__main__':
     app = QApplication(sys.argv)
 
     qdarktheme.setup_theme()
+    startup_profiler.mark("QApplication created")
 
     window = MainWindow()
+    startup_profiler.mark("main window created")
+    startup_profiler.watch_first_paint(window)
     window.show()
     sys.exit(app.exec_())
@@ -0,0 +1,3 @@
+# field of view of the default unit, ASI294 behind a 135mm lens, in degrees; shared by the solver and drift
+# monitoring without the latter loading the solver
+asi294_135mm_fov = 5.8
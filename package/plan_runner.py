@@ -0,0 +1,327 @@
+import argparse
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from time import monotonic, sleep
+from camera_requester import CameraRequester, health_summary
+from capture_progress import format_duration
+from frame_quality import QualityAnalyzer
+from frame_writer import DEFAULT_OUTPUT_FORMAT, FrameWriter
+from sequencer import ExposureBlock, UnitSequencer
+import tracer
+
+
+logger = logging.getLogger(__name__)
+
+
+# Plan example (JSON, or the same structure in YAML):
+# {
+#     "units": ["red-nano", {"name": "blue-nano", "gain": 200}],
+#     "camera_index": 0, "binning": 4, "format": "RAW16", "gain": 120, "exposure_s": 30,
+#     "cooler": {"set_temperature": -10, "tolerance": 1.0, "timeout_s": 900},
+#     "dir_name": "Capture",
+#     "frames": {"light": 60, "dark": 20}
+# }
+# Every setting can be overridden per unit. Frames are captured prefix after prefix in the given order,
+# saved by the unit as "{prefix}_{unit name}" like captures started from the GUI.
+# Instead of "frames", "blocks" can list exposure blocks with their own settings, e.g.
+#     "blocks": [{"prefix": "light", "count": 60}, {"prefix": "dark", "count": 20, "gain": 0, "download": true}]
+# Blocks with "download" are also fetched and written into "output_directory" in "output_format",
+# with "quality_index" set the written frames are also measured and indexed there.
+DEFAULT_PLAN = {
+    "camera_index": 0,
+    "binning": None,
+    "format": None,
+    "gain": None,
+    "exposure_s": None,
+    "cooler": None,
+    "dir_name": "Capture",
+    "download": False,
+    "frames": {},
+    "blocks": None,
+}
+# settings an exposure block takes from its unit unless it has its own
+BLOCK_SETTINGS = ["binning", "format", "gain", "exposure_s", "download"]
+DEFAULT_COOLER = {"set_temperature": None, "tolerance": 1.0, "timeout_s": 900}
+YAML_EXTENSIONS = (".yaml", ".yml")
+TEMPERATURE_POLL_INTERVAL_S = 10.0
+REPORT_TIME_FORMAT = "%Y%m%d_%H%M%S"
+
+
+class PlanError(ValueError):
+    pass
+
+
+def load_plan(path):
+    with open(path, 'r') as infile:
+        if path.lower().endswith(YAML_EXTENSIONS):
+            try:
+                import yaml
+            except ImportError:
+                raise PlanError(f"{path} is YAML, reading it needs PyYAML (pip install pyyaml)")
+            return yaml.safe_load(infile)
+        return json.load(infile)
+
+
+def unit_settings(plan):
+    # expands the plan into {unit name: settings}, with defaults and per-unit overrides applied
+    if not isinstance(plan, dict) or not plan.get("units"):
+        raise PlanError("Plan needs a non-empty list of units")
+    shared = {key: plan.get(key, default) for key, default in DEFAULT_PLAN.items()}
+    settings = {}
+    for entry in plan["units"]:
+        overrides = {"name": entry} if isinstance(entry, str) else dict(entry)
+        name = overrides.pop("name", None)
+        if not name:
+            raise PlanError(f"Unit without a name in plan: {entry}")
+        if name in settings:
+            raise PlanError(f"Unit {name} is listed twice")
+        unknown = set(overrides) - set(DEFAULT_PLAN)
+        if unknown:
+            raise PlanError(f"Unknown settings for {name}: {', '.join(sorted(unknown))}")
+        settings[name] = _validated(name, {**shared, **overrides})
+    return settings
+
+
+def _validated(name, settings):
+    blocks = settings["blocks"]
+    if blocks is None:
+        frames = settings["frames"]
+        if not isinstance(frames, dict) or not frames:
+            raise PlanError(f"{name}: frames must map capture prefixes to frame counts")
+        blocks = [{"prefix": prefix, "count": count} for prefix, count in frames.items()]
+    if not isinstance(blocks, list) or not blocks:
+        raise PlanError(f"{name}: blocks must be a non-empty list")
+    settings["blocks"] = []
+    for block in blocks:
+        unknown = set(block) - set(BLOCK_SETTINGS) - {"prefix", "count"}
+        if unknown:
+            raise PlanError(f"{name}: unknown block settings {', '.join(sorted(unknown))}")
+        if not block.get("prefix"):
+            raise PlanError(f"{name}: block without a prefix: {block}")
+        count = block.get("count")
+        if not isinstance(count, int) or count <= 0:
+            raise PlanError(f"{name}: frame count for {block['prefix']} must be a positive integer, not {count}")
+        block = {**{key: settings[key] for key in BLOCK_SETTINGS}, **block}
+        if block["exposure_s"] is not None and float(block["exposure_s"]) <= 0:
+            raise PlanError(f"{name}: exposure must be positive")
+        settings["blocks"].append(block)
+    if settings["cooler"] is not None:
+        cooler = settings["cooler"]
+        if not isinstance(cooler, dict):
+            cooler = {"set_temperature": cooler}
+        settings["cooler"] = {**DEFAULT_COOLER, **cooler}
+    return settings
+
+
+def estimated_duration_s(settings):
+    if any(block["exposure_s"] is None for block in settings["blocks"]):
+        return None
+    return sum(block["count"] * float(block["exposure_s"]) for block in settings["blocks"])
+
+
+def exposure_block(block):
+    return ExposureBlock(block["prefix"], block["count"], block["exposure_s"], block["gain"], block["binning"],
+                         block["format"], bool(block["download"]))
+
+
+class UnitRun:
+    # Runs the plan on one unit: setup steps first, then exposure blocks through the sequencer.
+    # Everything done is recorded for the run report.
+    def __init__(self, unit_name, settings, stopping: threading.Event, writer=None):
+        self.unit_name = unit_name
+        self.settings = settings
+        self._stopping = stopping
+        self._requester = CameraRequester(unit_name, settings["camera_index"])
+        self._sequencer = UnitSequencer(unit_name, settings["camera_index"], settings["dir_name"], writer, stopping)
+        self.steps = []
+        self.error = None
+
+    def _step(self, name, send, read_back=None, accept=None, required=True):
+        started = monotonic()
+        step = {"step": name, "ok": False}
+        self.steps.append(step)
+        response = send()
+        if response is None:
+            step["error"] = "no response to command"
+        elif read_back is None:
+            step["ok"] = True
+        else:
+            ok, value = read_back()
+            step["value"] = value
+            if not ok:
+                step["error"] = "read-back failed"
+            elif accept is not None and not accept(value):
+                step["error"] = f"read-back value {value} was not accepted"
+            else:
+                step["ok"] = True
+        step["duration_s"] = round(monotonic() - started, 3)
+        if step["ok"]:
+            logger.info(f"{self.unit_name}: {name} done")
+            return True
+        logger.warning(f"{self.unit_name}: {name} failed: {step['error']}")
+        if required:
+            self.error = f"{name} failed: {step['error']}"
+        return not required
+
+    def _setup(self):
+        requester = self._requester
+        settings = self.settings
+        # camera settings are applied per block by the sequencer
+        if not self._step("init camera", requester.init_camera, requester.get_status):
+            return False
+        if not self._step("start capturing", requester.start_capturing):
+            return False
+        cooler = settings["cooler"]
+        if cooler is not None and cooler["set_temperature"] is not None:
+            set_temperature = int(cooler["set_temperature"])
+            if not self._step("cooler on", lambda: requester.set_cooler_on(True), requester.get_cooler_on, bool):
+                return False
+            if not self._step("set temperature", lambda: requester.set_set_temp(set_temperature),
+                              requester.get_set_temp, lambda value: int(float(value)) == set_temperature):
+                return False
+            # reaching the setpoint is best effort, frames at a slightly wrong temperature beat no frames
+            self._step("reach temperature", lambda: True, lambda: self._wait_for_temperature(cooler),
+                       lambda temperature: temperature is not None, required=False)
+        return True
+
+    def _wait_for_temperature(self, cooler):
+        deadline = monotonic() + float(cooler["timeout_s"])
+        temperature = None
+        while not self._stopping.is_set():
+            ok, temperature = self._requester.get_temperature()
+            if ok and abs(float(temperature) - float(cooler["set_temperature"])) <= float(cooler["tolerance"]):
+                return True, temperature
+            if monotonic() >= deadline:
+                logger.warning(f"{self.unit_name}: {temperature}C after {cooler['timeout_s']}s, "
+                               f"wanted {cooler['set_temperature']}C")
+                return True, None
+            logger.info(f"{self.unit_name}: cooling, {temperature}C now, {cooler['set_temperature']}C wanted")
+            self._stopping.wait(TEMPERATURE_POLL_INTERVAL_S)
+        return False, temperature
+
+    def run(self):
+        try:
+            if self._setup():
+                for block in self.settings["blocks"]:
+                    self._sequencer.enqueue(exposure_block(block))
+                results = self._sequencer.run()
+                failed = [result for result in results if not result.ok]
+                if failed:
+                    self.error = f"{failed[0].block.prefix} block failed: {failed[0].error}"
+        except Exception as e:
+            logger.exception(f"{self.unit_name}: unexpected error")
+            self.error = str(e)
+        if self._stopping.is_set() and self.error is None:
+            self.error = "run interrupted"
+        if self.error is None:
+            logger.info(f"{self.unit_name}: plan finished")
+        else:
+            logger.error(f"{self.unit_name}: plan not finished, {self.error}")
+        return self
+
+    def report(self):
+        results = self._sequencer.results
+        return {"ok": self.error is None, "error": self.error, "settings": self.settings, "steps": self.steps,
+                "blocks": [result.report() for result in results],
+                "frames_saved": sum(result.saved for result in results),
+                "idle_gaps": self._sequencer.idle_gap_summary()}
+
+
+def run_plan(plan, max_workers=None, stopping=None):
+    # runs all units at once, returns the run report as a dict
+    settings = unit_settings(plan)
+    stopping = stopping or threading.Event()
+    started_at = datetime.now(timezone.utc)
+    started = monotonic()
+    writer = None
+    analyzer = None
+    if any(block["download"] for unit in settings.values() for block in unit["blocks"]):
+        if plan.get("quality_index"):
+            analyzer = QualityAnalyzer(plan["quality_index"])
+        writer = FrameWriter(plan.get("output_format", DEFAULT_OUTPUT_FORMAT), plan.get("output_directory"),
+                             on_written=analyzer.frame_written if analyzer is not None else None)
+    runs = [UnitRun(unit_name, unit, stopping, writer) for unit_name, unit in settings.items()]
+    logger.info(f"Running plan on {len(runs)} unit(s): {', '.join(settings)}")
+    with ThreadPoolExecutor(max_workers=max_workers or len(runs), thread_name_prefix="plan") as executor:
+        futures = [executor.submit(run.run) for run in runs]
+        try:
+            for future in futures:
+                while not future.done():
+                    sleep(0.2)
+        except KeyboardInterrupt:
+            logger.warning("Interrupted, stopping saving on all units")
+            stopping.set()
+    if writer is not None:
+        writer.shutdown()
+    if analyzer is not None:
+        analyzer.wait()
+        analyzer.shutdown()
+    units = {run.unit_name: run.report() for run in runs}
+    return {
+        "ok": all(unit["ok"] for unit in units.values()),
+        "started_at": started_at.isoformat(),
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "duration_s": round(monotonic() - started, 3),
+        "units": units,
+        "health": health_summary(),
+    }
+
+
+def write_report(report, path):
+    # written next to the target and renamed, a half written report is never left behind
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'w') as outfile:
+        json.dump(report, outfile, indent=2, default=str)
+    os.replace(temporary_path, path)
+
+
+def describe_plan(plan):
+    lines = []
+    for unit_name, settings in unit_settings(plan).items():
+        estimate = estimated_duration_s(settings)
+        lines.append(f"{unit_name} (camera {settings['camera_index']}): cooler {settings['cooler']}, "
+                     f"about {format_duration(estimate)} of exposure")
+        for block in settings["blocks"]:
+            lines.append(f"    {block['count']} {block['prefix']}: binning {block['binning']}, {block['format']}, "
+                         f"gain {block['gain']}, exposure {block['exposure_s']}s"
+                         f"{', downloaded' if block['download'] else ''}")
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs a capture plan on all its units without the GUI")
+    parser.add_argument("plan", help="JSON or YAML plan file")
+    parser.add_argument("--report", default=None,
+                        help="Where to write the JSON run report, defaults to run_report_<time>.json")
+    parser.add_argument("--dry-run", action="store_true", help="Only check the plan and print what would be done")
+    parser.add_argument("--log", default=None, help="Also log into this file")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument("--trace", default=None, help="Record a Chrome trace JSON of the run into this file")
+    args = parser.parse_args()
+
+    handlers = [logging.StreamHandler()]
+    if args.log:
+        handlers.append(logging.FileHandler(args.log, encoding='utf-8'))
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO, handlers=handlers,
+                        format="[%(asctime)s] [%(levelname)s] [%(threadName)s] %(message)s",
+                        datefmt="%d/%m/%Y %H:%M:%S")
+
+    loaded_plan = load_plan(args.plan)
+    if args.dry_run:
+        print("\n".join(describe_plan(loaded_plan)))
+        raise SystemExit(0)
+    if args.trace:
+        tracer.start()
+    run_report = run_plan(loaded_plan)
+    if args.trace:
+        tracer.stop()
+        tracer.export(args.trace)
+    run_report["plan"] = os.path.abspath(args.plan)
+    report_path = args.report or f"run_report_{datetime.now().strftime(REPORT_TIME_FORMAT)}.json"
+    write_report(run_report, report_path)
+    logger.info(f"Run {'finished' if run_report['ok'] else 'FAILED'}, report written to {report_path}")
+    raise SystemExit(0 if run_report["ok"] else 1)
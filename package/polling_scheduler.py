@@ -0,0 +1,134 @@
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+
+logger = logging.getLogger(__name__)
+
+
+TICK_MS = 250
+DEFAULT_JITTER = 0.1
+MAX_BACKOFF_S = 300
+MAX_FETCH_WORKERS = 32
+
+
+class PolledMetric:
+    # fetch(unit_name, camera_index) runs on a worker thread and returns a value or None on failure,
+    # apply({unit_name: value}) runs on the GUI thread with successful results of one sweep,
+    # interval_s(unit_name) gives current cadence for a unit or None if the unit should not be polled now,
+    # requests_per_fetch is how many requests one fetch sends to the unit.
+    def __init__(self, name, fetch, apply, interval_s, requests_per_fetch=1):
+        self.name = name
+        self.fetch = fetch
+        self.apply = apply
+        self.interval_s = interval_s
+        self.requests_per_fetch = requests_per_fetch
+
+
+class PollingScheduler(QObject):
+    sweep_finished = pyqtSignal(str)
+    _sweep_done = pyqtSignal(str, object)
+
+    def __init__(self, parent, targets, jitter=DEFAULT_JITTER, max_backoff_s=MAX_BACKOFF_S):
+        super(PollingScheduler, self).__init__(parent)
+        # targets() -> {unit_name: camera_index} of units that can be polled at all
+        self._targets = targets
+        self._jitter = jitter
+        self._max_backoff_s = max_backoff_s
+        self._metrics = {}
+        self._next_due = {}
+        self._failures = {}
+        self._in_flight = set()
+        self._sweep_executor = ThreadPoolExecutor(thread_name_prefix="sweep")
+        self._fetch_executor = ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS, thread_name_prefix="poll")
+        self._sweep_done.connect(self._sweep_finished)
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._tick)
+
+    def add_metric(self, metric: PolledMetric):
+        self._metrics[metric.name] = metric
+
+    def start(self):
+        self._timer.start(TICK_MS)
+
+    def stop(self):
+        self._timer.stop()
+        self._sweep_executor.shutdown(wait=False, cancel_futures=True)
+        self._fetch_executor.shutdown(wait=False, cancel_futures=True)
+
+    def poll_soon(self, unit_name, metric_name=None):
+        for name in ([metric_name] if metric_name else self._metrics):
+            self._next_due.pop((name, unit_name), None)
+            self._failures.pop((name, unit_name), None)
+
+    def _interval(self, metric, unit_name):
+        interval = metric.interval_s(unit_name)
+        if interval is None:
+            return None
+        failures = self._failures.get((metric.name, unit_name), 0)
+        if failures == 0:
+            return interval
+        return min(interval * 2 ** failures, max(self._max_backoff_s, interval))
+
+    def _tick(self):
+        now = monotonic()
+        targets = self._targets()
+        for metric in self._metrics.values():
+            if metric.name in self._in_flight:
+                continue
+            due = {unit_name: camera_index for unit_name, camera_index in targets.items()
+                   if self._interval(metric, unit_name) is not None
+                   and self._next_due.get((metric.name, unit_name), now) <= now}
+            if due:
+                self._in_flight.add(metric.name)
+                self._sweep_executor.submit(self._sweep, metric, due)
+
+    def _sweep(self, metric, due):
+        def fetch(unit_name):
+            try:
+                return metric.fetch(unit_name, due[unit_name])
+            except Exception as e:
+                logger.error(f"Exception while polling {metric.name} on {unit_name}: {e}")
+                return None
+
+        results = dict(zip(due, self._fetch_executor.map(fetch, due)))
+        self._sweep_done.emit(metric.name, results)
+
+    def _sweep_finished(self, metric_name, results):
+        metric = self._metrics[metric_name]
+        now = monotonic()
+        for unit_name, value in results.items():
+            key = (metric_name, unit_name)
+            if value is None:
+                self._failures[key] = self._failures.get(key, 0) + 1
+                logger.debug(f"Polling {metric_name} on {unit_name} failed {self._failures[key]} time(s) in a row")
+            else:
+                self._failures.pop(key, None)
+            interval = self._interval(metric, unit_name) or metric.interval_s(unit_name) or 0
+            self._next_due[key] = now + interval * (1 + random.uniform(-self._jitter, self._jitter))
+        self._in_flight.discard(metric_name)
+        metric.apply({unit_name: value for unit_name, value in results.items() if value is not None})
+        self.sweep_finished.emit(metric_name)
+
+    def schedule(self):
+        now = monotonic()
+        entries = []
+        for unit_name in self._targets():
+            for metric in self._metrics.values():
+                key = (metric.name, unit_name)
+                entries.append({
+                    "metric": metric.name,
+                    "unit": unit_name,
+                    "interval_s": self._interval(metric, unit_name),
+                    "due_in_s": max(0.0, self._next_due.get(key, now) - now),
+                    "failures": self._failures.get(key, 0),
+                    "in_flight": metric.name in self._in_flight,
+                })
+        return entries
+
+    def request_budget(self):
+        # average number of polling requests per second with the current cadences
+        return sum(self._metrics[entry["metric"]].requests_per_fetch / entry["interval_s"]
+                   for entry in self.schedule() if entry["interval_s"])
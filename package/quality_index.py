@@ -0,0 +1,87 @@
+import logging
+import os
+import sqlite3
+import threading
+from time import time
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_INDEX_PATH = "frame_quality.sqlite"
+# metadata keys (as written by frame_writer.acquisition_metadata) stored along the metrics
+METADATA_COLUMNS = ["unit", "camera", "frame_type", "exposure_s", "gain", "binning", "temperature"]
+METRIC_COLUMNS = ["background", "noise", "star_count", "hfr", "eccentricity", "saturated_fraction", "width", "height"]
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    path TEXT PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    unit TEXT, camera TEXT, frame_type TEXT, exposure_s REAL, gain REAL, binning INTEGER, temperature REAL,
+    background REAL, noise REAL, star_count INTEGER, hfr REAL, eccentricity REAL, saturated_fraction REAL,
+    width INTEGER, height INTEGER,
+    analyzed_at REAL NOT NULL
+);
+-- "lights from a unit with HFR below x" is answered from the index alone, same for time ranges and settings
+CREATE INDEX IF NOT EXISTS frames_unit_type_hfr ON frames (unit, frame_type, hfr);
+CREATE INDEX IF NOT EXISTS frames_unit_time ON frames (unit, timestamp);
+CREATE INDEX IF NOT EXISTS frames_settings ON frames (frame_type, exposure_s, gain, binning);
+"""
+
+
+class QualityIndex:
+    # SQLite index of per-frame quality metrics. One connection is shared by the threads of this process,
+    # WAL journal lets other processes (e.g. the query command line) read while frames are being added.
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+
+    def add(self, path, metadata, metrics, timestamp):
+        row = {"path": os.path.abspath(path), "timestamp": timestamp, "analyzed_at": time()}
+        row.update({column: metadata.get(column) for column in METADATA_COLUMNS})
+        row.update({column: metrics.get(column) for column in METRIC_COLUMNS})
+        columns = ", ".join(row)
+        placeholders = ", ".join(f":{column}" for column in row)
+        with self._lock, self._connection:
+            self._connection.execute(f"INSERT OR REPLACE INTO frames ({columns}) VALUES ({placeholders})", row)
+
+    def contains(self, path):
+        with self._lock:
+            return self._connection.execute("SELECT 1 FROM frames WHERE path = ?",
+                                            (os.path.abspath(path),)).fetchone() is not None
+
+    def query(self, unit=None, frame_type=None, max_hfr=None, max_eccentricity=None, min_stars=None,
+              exposure_s=None, gain=None, binning=None, since=None, until=None, order_by="hfr"):
+        # returns rows as dicts, conditions left as None are not applied
+        conditions = [
+            ("unit = ?", unit),
+            ("frame_type = ?", frame_type),
+            ("hfr < ?", max_hfr),
+            ("eccentricity < ?", max_eccentricity),
+            ("star_count >= ?", min_stars),
+            ("exposure_s = ?", exposure_s),
+            ("gain = ?", gain),
+            ("binning = ?", binning),
+            ("timestamp >= ?", since),
+            ("timestamp < ?", until),
+        ]
+        used = [(condition, value) for condition, value in conditions if value is not None]
+        if order_by not in METRIC_COLUMNS + ["timestamp"]:
+            raise ValueError(f"Cannot order frames by {order_by}")
+        sql = "SELECT * FROM frames"
+        if used:
+            sql += " WHERE " + " AND ".join(condition for condition, _ in used)
+        sql += f" ORDER BY {order_by} IS NULL, {order_by}"
+        with self._lock:
+            rows = self._connection.execute(sql, [value for _, value in used]).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,83 @@
+import logging
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PROXY_FACTOR = 4
+# correlation peak has to stand out this many standard deviations to be trusted
+MIN_PEAK_SIGNIFICANCE = 8.0
+
+
+def bin_proxy(img, factor=DEFAULT_PROXY_FACTOR):
+    h, w = img.shape
+    h_cropped, w_cropped = h // factor * factor, w // factor * factor
+    return img[:h_cropped, :w_cropped].reshape(h_cropped // factor, factor, w_cropped // factor, factor) \
+        .mean(axis=(1, 3), dtype=np.float32)
+
+
+def background_subtracted(proxy):
+    # stars stay, background and its negative noise go to zero
+    flattened = proxy - np.median(proxy)
+    np.clip(flattened, 0, None, out=flattened)
+    return flattened
+
+
+def _parabolic_offset(before, peak, after):
+    denominator = before - 2 * peak + after
+    if denominator == 0:
+        return 0.0
+    return 0.5 * (before - after) / denominator
+
+
+def _wrapped(position, length):
+    return position - length if position > length / 2 else position
+
+
+class PhaseCorrelator:
+    # Keeps the spectrum of a reference proxy and measures shifts of next frames against it.
+    # Shifts are returned in full resolution pixels as (dy, dx) that have to be applied to the frame
+    # to align it with the reference.
+    def __init__(self, reference, proxy_factor=DEFAULT_PROXY_FACTOR):
+        self._factor = proxy_factor
+        proxy = background_subtracted(bin_proxy(reference, proxy_factor))
+        self._shape = proxy.shape
+        self._window = np.outer(np.hanning(self._shape[0]), np.hanning(self._shape[1])).astype(np.float32)
+        self._reference_spectrum = np.fft.rfft2(proxy * self._window)
+
+    def spectrum(self, frame):
+        proxy = background_subtracted(bin_proxy(frame, self._factor))
+        if proxy.shape != self._shape:
+            return None
+        return np.fft.rfft2(proxy * self._window)
+
+    def shift(self, frame):
+        spectrum = self.spectrum(frame)
+        if spectrum is None:
+            logger.warning(f"Frame of shape {frame.shape} does not match reference, cannot register")
+            return None
+        return self.shift_between(self._reference_spectrum, spectrum)
+
+    def shift_between(self, reference_spectrum, spectrum):
+        cross_power = reference_spectrum * np.conj(spectrum)
+        cross_power /= np.abs(cross_power) + 1e-12
+        correlation = np.fft.irfft2(cross_power, s=self._shape)
+        peak_y, peak_x = np.unravel_index(np.argmax(correlation), correlation.shape)
+        significance = (correlation[peak_y, peak_x] - correlation.mean()) / (correlation.std() + 1e-12)
+        if significance < MIN_PEAK_SIGNIFICANCE:
+            logger.debug(f"Correlation peak too weak: {significance:.1f} sigma")
+            return None
+        h, w = self._shape
+        dy = peak_y + _parabolic_offset(correlation[(peak_y - 1) % h, peak_x], correlation[peak_y, peak_x],
+                                        correlation[(peak_y + 1) % h, peak_x])
+        dx = peak_x + _parabolic_offset(correlation[peak_y, (peak_x - 1) % w], correlation[peak_y, peak_x],
+                                        correlation[peak_y, (peak_x + 1) % w])
+        return float(_wrapped(dy, h) * self._factor), float(_wrapped(dx, w) * self._factor)
+
+
+def overlap_slices(length, shift):
+    # slices (destination, source) for moving a 1D range of given length by integer shift
+    if shift >= 0:
+        return slice(shift, length), slice(0, length - shift)
+    return slice(0, length + shift), slice(-shift, length)
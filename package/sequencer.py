@@ -0,0 +1,334 @@
+import logging
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from time import monotonic
+import numpy as np
+from camera_requester import CameraRequester
+from capture_progress import ProgressTracker
+from frame import Frame, READOUT_DTYPES
+from frame_writer import acquisition_metadata
+from status_stream import STATUS_EVENT
+from tracer import traced
+
+
+logger = logging.getLogger(__name__)
+
+
+# applied in this order, like the connect flow of the GUI
+SETTING_NAMES = ["binning", "format", "gain", "exposure_s"]
+# these change frame geometry, the last frame of the previous block has to be downloaded before
+GEOMETRY_SETTINGS = {"binning", "format"}
+# status polling interval of the subscription when the unit has no push channel
+EVENT_POLL_INTERVAL_S = 1.0
+# with push, status is also read directly when no event came for this long
+STATUS_CHECK_S = 10.0
+STALL_TIMEOUT_S = 60.0
+STALL_EXPOSURES = 3
+SAVE_START_TIMEOUT_S = 15.0
+US_IN_SECOND = 1000000
+
+
+class ExposureBlock:
+    def __init__(self, prefix, count, exposure_s=None, gain=None, binning=None, readout_format=None, download=False):
+        self.prefix = prefix
+        self.count = count
+        self.exposure_s = exposure_s
+        self.gain = gain
+        self.binning = binning
+        self.readout_format = readout_format
+        self.download = download
+
+    def settings(self):
+        values = {"binning": self.binning, "format": self.readout_format, "gain": self.gain,
+                  "exposure_s": self.exposure_s}
+        return {name: values[name] for name in SETTING_NAMES if values[name] is not None}
+
+    def __repr__(self):
+        return f"ExposureBlock({self.count} {self.prefix}, {self.settings()})"
+
+
+class BlockResult:
+    def __init__(self, block: ExposureBlock):
+        self.block = block
+        self.saved = 0
+        self.downloaded = 0
+        # frames finished while the previous one was still downloading, the unit only serves the last one
+        self.missed_downloads = 0
+        self.settings_applied = []
+        self.settings_s = 0.0
+        # from the previous block detected as finished to this one acknowledged as started
+        self.idle_gap_s = None
+        self.duration_s = None
+        self.frames_per_hour = None
+        self.overhead_s = None
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None and self.saved >= self.block.count
+
+    def report(self):
+        report = {"prefix": self.block.prefix, "requested": self.block.count, "settings": self.block.settings(),
+                  "ok": self.ok, "saved": self.saved, "settings_applied": self.settings_applied,
+                  "settings_s": round(self.settings_s, 3)}
+        if self.block.download:
+            report.update(downloaded=self.downloaded, missed_downloads=self.missed_downloads)
+        for key in ("idle_gap_s", "duration_s", "frames_per_hour", "overhead_s"):
+            value = getattr(self, key)
+            if value is not None:
+                report[key] = round(value, 3)
+        if self.error is not None:
+            report["error"] = self.error
+        return report
+
+
+def _accepts(name, wanted, value):
+    if name == "format":
+        return value == wanted
+    if name == "gain":
+        return int(value) == int(wanted)
+    if name == "exposure_s":
+        return abs(float(value) / US_IN_SECOND - float(wanted)) < 1e-3
+    # binning has no getter, resolution read-back only proves the camera answers
+    return True
+
+
+class UnitSequencer:
+    # Runs a queue of exposure blocks on one camera with as little idle time between them as possible:
+    # - block end is detected from pushed status events (or fast polling when the unit has no push),
+    # - the next block's settings are worked out while the current one runs and only changed ones are sent,
+    # - read-back verification happens after start_saving, while the camera already exposes,
+    # - frames of blocks with download enabled are fetched and written locally while the next ones expose.
+    # Blocks can be added from any thread while the sequencer runs.
+    def __init__(self, unit_name, camera_index, dir_name="Capture", writer=None, stopping=None):
+        self.unit_name = unit_name
+        self.dir_name = dir_name
+        self.results = []
+        self._requester = CameraRequester(unit_name, camera_index)
+        self._writer = writer
+        self._stopping = stopping or threading.Event()
+        self._blocks = deque()
+        self._blocks_changed = threading.Condition()
+        self._events = queue.Queue()
+        self._tracker = ProgressTracker()
+        self._applied = {}
+        self._planned = None
+        self._previous_finished_at = None
+        self._download_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"download-{unit_name}")
+        self._download = None
+        self._writes = []
+        self._frame_geometry = None
+
+    def enqueue(self, block: ExposureBlock):
+        with self._blocks_changed:
+            self._blocks.append(block)
+            self._blocks_changed.notify()
+
+    def stop(self):
+        self._stopping.set()
+        with self._blocks_changed:
+            self._blocks_changed.notify()
+
+    def _next_block(self, wait_for_blocks):
+        with self._blocks_changed:
+            while wait_for_blocks and not self._blocks and not self._stopping.is_set():
+                self._blocks_changed.wait()
+            return self._blocks.popleft() if self._blocks and not self._stopping.is_set() else None
+
+    def _peek_block(self):
+        with self._blocks_changed:
+            return self._blocks[0] if self._blocks else None
+
+    def _changes(self, block):
+        return {name: value for name, value in block.settings().items() if self._applied.get(name) != value}
+
+    def run(self, wait_for_blocks=False):
+        # runs queued blocks until the queue is empty (or until stop() with wait_for_blocks), returns results
+        subscription = self._requester.subscribe(lambda event_type, value: self._events.put((event_type, value)),
+                                                 EVENT_POLL_INTERVAL_S)
+        try:
+            while True:
+                block = self._next_block(wait_for_blocks)
+                if block is None:
+                    break
+                result = self._run_block(block)
+                self.results.append(result)
+                if not result.ok:
+                    logger.error(f"{self.unit_name}: {block} failed: {result.error}, dropping the rest of the queue")
+                    break
+        finally:
+            subscription.stop()
+            self._finish_downloads()
+        return self.results
+
+    def _run_block(self, block):
+        result = BlockResult(block)
+        changes = self._planned if self._planned is not None else self._changes(block)
+        self._planned = None
+        if GEOMETRY_SETTINGS & set(changes):
+            self._finish_pending_download()
+        if not self._apply(changes, result):
+            return result
+        while not self._events.empty():
+            self._events.get_nowait()
+        response = self._requester.start_saving(block.count, self.dir_name, f"{block.prefix}_{self.unit_name}")
+        started = monotonic()
+        if response is None:
+            result.error = "start_saving failed"
+            return result
+        if self._previous_finished_at is not None:
+            result.idle_gap_s = started - self._previous_finished_at
+            logger.info(f"{self.unit_name}: {block.prefix} started {result.idle_gap_s:.2f}s after previous block")
+        else:
+            logger.info(f"{self.unit_name}: {block.prefix} started")
+        if not self._verify(changes, result):
+            self._requester.stop_saving()
+            return result
+        if block.download:
+            self._read_frame_geometry()
+        exposure_s = self._applied.get("exposure_s")
+        progress = self._tracker.start(self.unit_name, block.count, float(exposure_s) if exposure_s else None)
+        next_block = self._peek_block()
+        if next_block is not None:
+            self._planned = self._changes(next_block)
+        self._wait_for_block(block, result, progress, started)
+        self._previous_finished_at = monotonic()
+        result.duration_s = self._previous_finished_at - started
+        result.frames_per_hour = progress.frames_per_hour
+        result.overhead_s = progress.overhead_s
+        return result
+
+    @traced()
+    def _apply(self, changes, result):
+        senders = {"binning": self._requester.set_binning, "format": self._requester.set_format,
+                   "gain": self._requester.set_gain, "exposure_s": self._requester.set_exposure}
+        started = monotonic()
+        for name, value in changes.items():
+            if senders[name](value) is None:
+                result.error = f"setting {name} to {value} failed"
+                # unknown state now, it will be sent again
+                self._applied.pop(name, None)
+                return False
+            self._applied[name] = value
+            result.settings_applied.append(name)
+        result.settings_s = monotonic() - started
+        return True
+
+    @traced()
+    def _verify(self, changes, result):
+        read_backs = {"binning": self._requester.get_resolution, "format": self._requester.get_current_format,
+                      "gain": self._requester.get_gain, "exposure_s": self._requester.get_exposure_us}
+        for name, value in changes.items():
+            ok, read_back = read_backs[name]()
+            if not ok or not _accepts(name, value, read_back):
+                self._applied.pop(name, None)
+                result.error = f"{name} read back as {read_back}, wanted {value}"
+                return False
+        return True
+
+    def _read_frame_geometry(self):
+        ok_resolution, resolution = self._requester.get_resolution()
+        ok_format, readout_format = self._requester.get_current_format()
+        self._frame_geometry = (resolution, readout_format) if ok_resolution and ok_format else None
+
+    @traced()
+    def _wait_for_block(self, block, result, progress, started):
+        exposure_s = progress.exposure_s or 0
+        stall_timeout_s = max(STALL_TIMEOUT_S, STALL_EXPOSURES * exposure_s)
+        # a status from before start_saving can still be on its way, it must not end the block
+        earliest_end = started + block.count * exposure_s
+        last_change = started
+        held_back = False
+        while not self._stopping.is_set():
+            if held_back and monotonic() >= earliest_end:
+                # the unit pushes no other status while its state stays the same, a fresh one is asked for
+                held_back = False
+                event_type, status = STATUS_EVENT, self._polled_status()
+            else:
+                try:
+                    event_type, status = self._events.get(
+                        timeout=max(0.0, earliest_end - monotonic()) if held_back else STATUS_CHECK_S)
+                except queue.Empty:
+                    event_type, status = STATUS_EVENT, self._polled_status()
+            now = monotonic()
+            if event_type == STATUS_EVENT and isinstance(status, dict) and not (
+                    progress.seen_saving or status["state"] == "SAVE" or now >= earliest_end):
+                held_back = True
+            elif event_type == STATUS_EVENT and isinstance(status, dict):
+                frames_done = progress.frames_done
+                self._tracker.update_from_status(self.unit_name, status)
+                if progress.frames_done > frames_done:
+                    last_change = now
+                    result.saved = progress.frames_done
+                    if block.download:
+                        self._download_latest(block, result)
+                    logger.info(f"{self.unit_name}: {block.prefix} {progress.text()}")
+            if progress.finished:
+                if progress.frames_done < progress.requested:
+                    result.error = f"unit stopped saving after {progress.frames_done} frames"
+                return
+            if not progress.seen_saving and now - started > exposure_s + SAVE_START_TIMEOUT_S:
+                result.error = "unit did not start saving"
+                return
+            if now - last_change > stall_timeout_s:
+                result.error = f"no new frames for {stall_timeout_s:.0f}s"
+                return
+        result.error = "sequence stopped"
+        self._requester.stop_saving()
+
+    def _polled_status(self):
+        ok, status = self._requester.get_status()
+        return status if ok else None
+
+    def _download_latest(self, block, result):
+        if self._download is not None and not self._download.done():
+            result.missed_downloads += 1
+            return
+        self._download = self._download_executor.submit(self._fetch_and_write, block, result, dict(self._applied))
+
+    def _fetch_and_write(self, block, result, settings):
+        try:
+            self._fetch_and_write_latest(block, result, settings)
+        except Exception as e:
+            logger.error(f"{self.unit_name}: downloading a {block.prefix} frame failed: {e}")
+
+    @traced()
+    def _fetch_and_write_latest(self, block, result, settings):
+        if self._frame_geometry is None or self._writer is None:
+            return
+        (w, h), readout_format = self._frame_geometry
+        dtype = READOUT_DTYPES.get(readout_format, np.uint8)
+        response = self._requester.get_last_image(False, expected_bytes=w * h * np.dtype(dtype).itemsize)
+        if response is None or len(response.content) != w * h * np.dtype(dtype).itemsize:
+            logger.warning(f"{self.unit_name}: could not download a {block.prefix} frame")
+            return
+        frame = Frame.from_buffer(response.content, (w, h), readout_format, unit_name=self.unit_name).data
+        exposure_s = settings.get("exposure_s")
+        metadata = acquisition_metadata(unit=self.unit_name, binning=settings.get("binning"), gain=settings.get("gain"),
+                                        exposure_us=exposure_s * US_IN_SECOND if exposure_s is not None else None,
+                                        frame_type=block.prefix)
+        # compression and writing go to the writer's pool, the next frame can be fetched meanwhile
+        self._writes.append(self._writer.submit(f"{block.prefix}_{self.unit_name}", frame, metadata))
+        result.downloaded += 1
+
+    def _finish_pending_download(self):
+        if self._download is not None:
+            wait([self._download])
+
+    def _finish_downloads(self):
+        self._finish_pending_download()
+        self._download_executor.shutdown(wait=True)
+        for write in self._writes:
+            try:
+                write.result()
+            except Exception as e:
+                logger.error(f"{self.unit_name}: writing a downloaded frame failed: {e}")
+
+    def idle_gap_summary(self):
+        gaps = [result.idle_gap_s for result in self.results if result.idle_gap_s is not None]
+        if not gaps:
+            return {"gaps": 0}
+        return {"gaps": len(gaps), "total_s": round(sum(gaps), 3), "mean_s": round(sum(gaps) / len(gaps), 3),
+                "max_s": round(max(gaps), 3)}
@@ -0,0 +1,115 @@
+import builtins
+import json
+import logging
+import sys
+from time import perf_counter
+
+
+logger = logging.getLogger(__name__)
+
+
+PROFILE_STARTUP_FLAG = "--profile-startup"
+default_report_path = "startup_profile.json"
+
+
+def report_path_from_argv(argv):
+    for arg in argv:
+        if arg == PROFILE_STARTUP_FLAG:
+            return default_report_path
+        if arg.startswith(f"{PROFILE_STARTUP_FLAG}="):
+            return arg.split("=", 1)[1] or default_report_path
+    return None
+
+
+# Does nothing unless a report path is given (see --profile-startup in main.py)
+class StartupProfiler:
+    def __init__(self, start_time, report_path=None):
+        self._start_time = start_time
+        self._report_path = report_path
+        self._marks = []
+        self._imports = {}
+        self._import_stack = []
+        self._original_import = None
+        self._paint_filter = None
+
+    @property
+    def enabled(self):
+        return self._report_path is not None
+
+    def install_import_hook(self):
+        if not self.enabled or self._original_import is not None:
+            return
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall_import_hook(self):
+        if self._original_import is None:
+            return
+        builtins.__import__ = self._original_import
+        self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level != 0 or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+        self._import_stack.append(0.0)
+        start = perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = perf_counter() - start
+            children = self._import_stack.pop()
+            if self._import_stack:
+                self._import_stack[-1] += elapsed
+            self._imports[name] = {"cumulative_s": elapsed, "self_s": elapsed - children}
+
+    def mark(self, name):
+        if not self.enabled:
+            return
+        since_start = perf_counter() - self._start_time
+        logger.debug(f"Startup milestone '{name}' after {since_start:.3f}s")
+        self._marks.append({"name": name, "since_start_s": since_start})
+
+    def watch_first_paint(self, widget):
+        if not self.enabled:
+            return
+        from PyQt5.QtCore import QObject, QEvent
+        profiler = self
+
+        class FirstPaintFilter(QObject):
+            def eventFilter(self, watched, event):
+                if event.type() == QEvent.Paint:
+                    watched.removeEventFilter(self)
+                    profiler.mark("first paint")
+                    profiler.write_report()
+                return False
+
+        self._paint_filter = FirstPaintFilter(widget)
+        widget.installEventFilter(self._paint_filter)
+
+    def _imports_by_package(self):
+        packages = {}
+        for name, timing in self._imports.items():
+            top_level = name.split(".")[0]
+            packages[top_level] = packages.get(top_level, 0.0) + timing["self_s"]
+        return dict(sorted(packages.items(), key=lambda item: item[1], reverse=True))
+
+    def write_report(self):
+        if not self.enabled:
+            return
+        self.uninstall_import_hook()
+        imports = dict(sorted(self._imports.items(), key=lambda item: item[1]["cumulative_s"], reverse=True))
+        report = {
+            "milestones": self._marks,
+            "imports_total_s": sum(timing["self_s"] for timing in self._imports.values()),
+            "imports_by_package_s": self._imports_by_package(),
+            "imports": imports,
+        }
+        try:
+            with open(self._report_path, 'w') as outfile:
+                json.dump(report, outfile, indent=2)
+        except Exception as e:
+            logger.error(f"Could not write startup profile into {self._report_path}: {e}")
+            return
+        for mark in self._marks:
+            logger.info(f"Startup: {mark['name']} at {mark['since_start_s']:.3f}s")
+        logger.info(f"Startup profile written into {self._report_path}")
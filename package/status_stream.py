@@ -0,0 +1,160 @@
+import json
+import logging
+import threading
+from time import time
+import transport
+
+
+logger = logging.getLogger(__name__)
+
+
+STATUS_EVENT = "status"
+TEMPERATURE_EVENT = "temperature"
+FRAME_READY_EVENT = "frame_ready"
+PUSH_CONNECT_TIMEOUT_S = 5
+# server sends keep-alive comments more often than that, so a read timeout means the stream is dead
+PUSH_READ_TIMEOUT_S = 30
+PUSH_RETRY_S = 60
+RECONNECT_DELAY_S = 1
+
+MODE_CONNECTING = "connecting"
+MODE_PUSH = "push"
+MODE_POLL = "poll"
+MODE_STOPPED = "stopped"
+
+
+def parse_sse_lines(lines):
+    event_type, data_lines = "message", []
+    for line in lines:
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield event_type, "\n".join(data_lines)
+            event_type, data_lines = "message", []
+        elif line.startswith(":"):
+            continue
+        else:
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "event":
+                event_type = value
+            elif field == "data":
+                data_lines.append(value)
+
+
+class StatusSubscription:
+    # Listens to server-sent events from /camera/{i}/events and calls callback(event_type, value) from its own thread.
+    # When the server has no push channel it polls status and temperature every fallback_interval_s instead
+    # (or only reports MODE_POLL when fallback_interval_s is None) and retries push every PUSH_RETRY_S.
+    def __init__(self, ip, camera_index, callback, fallback_interval_s=5.0):
+        from camera_requester import port_for_cameras
+        self._ip = ip
+        self._camera_index = camera_index
+        self._callback = callback
+        self._fallback_interval_s = fallback_interval_s
+        self._url = f"http://{ip}:{port_for_cameras}/camera/{camera_index}/events"
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._response = None
+        self._last_values = {}
+        self._last_status = None
+        self.mode = MODE_STOPPED
+
+    @property
+    def is_pushing(self):
+        return self.mode == MODE_PUSH
+
+    def start(self):
+        self.mode = MODE_CONNECTING
+        self._thread = threading.Thread(target=self._run, name=f"events-{self._ip}-{self._camera_index}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        response = self._response
+        if response is not None:
+            try:
+                response.close()
+            except Exception as e:
+                logger.debug(f"Exception while closing event stream {self._url}: {e}")
+        self.mode = MODE_STOPPED
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            if self._listen():
+                self._stop_event.wait(RECONNECT_DELAY_S)
+            else:
+                self._poll_until(time() + PUSH_RETRY_S)
+        self.mode = MODE_STOPPED
+
+    def _listen(self):
+        logger.debug(f"Subscribing to {self._url}")
+        self.mode = MODE_CONNECTING
+        try:
+            with transport.current().stream(self._url, {"Accept": "text/event-stream"},
+                                            (PUSH_CONNECT_TIMEOUT_S, PUSH_READ_TIMEOUT_S)) as response:
+                content_type = response.headers.get("Content-Type", "")
+                if response.status_code != 200 or not content_type.startswith("text/event-stream"):
+                    logger.info(f"{self._url} does not support push (status code={response.status_code}), "
+                                f"falling back to polling")
+                    return False
+                self._response = response
+                self.mode = MODE_PUSH
+                # default chunk of iter_lines holds events back until 512 bytes arrive, seconds on a quiet stream
+                for event_type, data in parse_sse_lines(response.iter_lines(chunk_size=1, decode_unicode=True)):
+                    if self._stop_event.is_set():
+                        break
+                    self._dispatch(event_type, json.loads(data)["value"])
+        except Exception as e:
+            if self._stop_event.is_set():
+                return True
+            logger.warning(f"Event stream {self._url} broken: {e}")
+            return self.mode == MODE_PUSH
+        finally:
+            self._response = None
+        logger.info(f"Event stream {self._url} closed")
+        return True
+
+    def _poll_until(self, deadline):
+        from camera_requester import CameraRequester
+        self.mode = MODE_POLL
+        if self._fallback_interval_s is None:
+            self._stop_event.wait(max(0.0, deadline - time()))
+            return
+        requester = CameraRequester(self._ip, self._camera_index)
+        while not self._stop_event.is_set() and time() < deadline:
+            ok, status = requester.get_status()
+            if ok:
+                self._dispatch(STATUS_EVENT, status)
+            ok, temperature = requester.get_temperature()
+            if ok:
+                self._dispatch(TEMPERATURE_EVENT, temperature)
+            self._stop_event.wait(self._fallback_interval_s)
+
+    def _dispatch(self, event_type, value):
+        if event_type == STATUS_EVENT and isinstance(value, dict):
+            saved_images = self.frame_ready_from_status(value)
+            if saved_images is not None:
+                self._notify(FRAME_READY_EVENT, saved_images)
+        if event_type != FRAME_READY_EVENT and self._last_values.get(event_type) == value:
+            return
+        self._last_values[event_type] = value
+        self._notify(event_type, value)
+
+    def _notify(self, event_type, value):
+        try:
+            self._callback(event_type, value)
+        except Exception as e:
+            logger.error(f"Exception in {event_type} event handler for {self._url}: {e}")
+
+    def frame_ready_from_status(self, status):
+        # in polling mode there is no frame_ready event, but a growing saved_images counter means the same;
+        # gives the new counter then, statuses polled by the caller (fallback_interval_s=None) are passed here too
+        previous, self._last_status = self._last_status, status
+        if self.mode != MODE_POLL or "saved_images" not in status:
+            return None
+        if isinstance(previous, dict) and status["saved_images"] > previous.get("saved_images", 0):
+            return status["saved_images"]
+        return None
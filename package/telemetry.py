@@ -0,0 +1,150 @@
+import argparse
+import logging
+import threading
+from time import time
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+# unit states as codes, anything else the unit reports is kept as unknown
+STATES = ["<unknown>", "IDLE", "CAPTURE", "SAVE"]
+STATE_CODES = {state: code for code, state in enumerate(STATES)}
+FIELDS = ["temperature", "set_temperature", "cooler_power", "cooler_on", "state"]
+TELEMETRY_DTYPE = np.dtype([("timestamp", "<f8"), ("temperature", "<f4"), ("set_temperature", "<f4"),
+                            ("cooler_power", "<f4"), ("cooler_on", "<f4"), ("state", "u1")])
+# values coming closer than this update the newest sample instead of adding one: a sample every 2s at most
+MIN_SAMPLE_INTERVAL_S = 2.0
+# 24 bytes a sample, about 18 hours at the fastest sampling, a whole night in constant memory
+DEFAULT_CAPACITY = 32768
+TELEMETRY_FILE_TIME_FORMAT = "%Y%m%d_%H%M%S"
+
+
+def _number_or_nan(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+class TelemetrySeries:
+    # Preallocated ring buffer of one unit's samples. Every sample carries the last known value of every field,
+    # so a field polled once a minute and one pushed every second end up in the same rows.
+    def __init__(self, capacity=DEFAULT_CAPACITY, min_interval_s=MIN_SAMPLE_INTERVAL_S):
+        self.capacity = capacity
+        self._min_interval_s = min_interval_s
+        self._samples = np.zeros(capacity, dtype=TELEMETRY_DTYPE)
+        self._current = np.zeros(1, dtype=TELEMETRY_DTYPE)[0]
+        for field in FIELDS[:-1]:
+            self._current[field] = np.nan
+        self._count = 0
+        self._next = 0
+
+    def __len__(self):
+        return self._count
+
+    def record(self, timestamp, **fields):
+        for field, value in fields.items():
+            if field == "state":
+                self._current["state"] = STATE_CODES.get(value, 0)
+            else:
+                self._current[field] = _number_or_nan(value)
+        self._current["timestamp"] = timestamp
+        newest = (self._next - 1) % self.capacity
+        if self._count and timestamp - self._samples[newest]["timestamp"] < self._min_interval_s:
+            # keeps the time of the sample it replaces, sampling stays regular
+            timestamp = self._samples[newest]["timestamp"]
+            self._samples[newest] = self._current
+            self._samples[newest]["timestamp"] = timestamp
+            return
+        self._samples[self._next] = self._current
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def samples(self, since=None):
+        # copy in time order
+        start = (self._next - self._count) % self.capacity
+        ordered = np.concatenate((self._samples[start:start + self._count],
+                                  self._samples[:max(0, start + self._count - self.capacity)]))
+        if since is not None:
+            ordered = ordered[np.searchsorted(ordered["timestamp"], since):]
+        return ordered
+
+    def latest(self):
+        return None if self._count == 0 else self._samples[(self._next - 1) % self.capacity].copy()
+
+
+def decimate(samples, field, max_points):
+    # (times, minima, maxima) with at most max_points buckets; min and max of each bucket keep short spikes
+    # visible however long the window is, NaNs (unknown values) are ignored
+    times = samples["timestamp"]
+    values = samples[field].astype(np.float64)
+    if len(samples) <= max_points:
+        return times, values, values
+    starts = np.linspace(0, len(samples), max_points, endpoint=False).astype(np.intp)
+    with np.errstate(invalid="ignore"):
+        minima = np.fmin.reduceat(values, starts)
+        maxima = np.fmax.reduceat(values, starts)
+    return times[starts], minima, maxima
+
+
+class TelemetryStore:
+    # Telemetry of all units, recorded from any thread.
+    def __init__(self, capacity=DEFAULT_CAPACITY, min_interval_s=MIN_SAMPLE_INTERVAL_S):
+        self._capacity = capacity
+        self._min_interval_s = min_interval_s
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def record(self, unit_name, timestamp=None, **fields):
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown telemetry fields {sorted(unknown)}")
+        with self._lock:
+            if unit_name not in self._series:
+                self._series[unit_name] = TelemetrySeries(self._capacity, self._min_interval_s)
+            self._series[unit_name].record(time() if timestamp is None else timestamp, **fields)
+
+    def units(self):
+        with self._lock:
+            return list(self._series)
+
+    def samples(self, unit_name, since=None):
+        with self._lock:
+            series = self._series.get(unit_name)
+            return np.zeros(0, dtype=TELEMETRY_DTYPE) if series is None else series.samples(since)
+
+    def dump(self, path):
+        # compressed npz, one structured array per unit; read back with load()
+        with self._lock:
+            arrays = {unit_name: series.samples() for unit_name, series in self._series.items()}
+        with open(path, 'wb') as outfile:
+            np.savez_compressed(outfile, states=np.array(STATES), **{f"unit:{name}": a for name, a in arrays.items()})
+        logger.info(f"Telemetry of {len(arrays)} units written to {path}")
+        return path
+
+
+def load(path):
+    # {unit name: structured array of samples}
+    with np.load(path) as data:
+        return {key[len("unit:"):]: data[key] for key in data.files if key.startswith("unit:")}
+
+
+def describe(samples):
+    temperatures = samples["temperature"][~np.isnan(samples["temperature"])]
+    text = f"{len(samples)} samples"
+    if len(samples):
+        text += f" over {(samples['timestamp'][-1] - samples['timestamp'][0]) / 3600:.2f}h"
+    if len(temperatures):
+        text += (f", temperature {temperatures.min():.1f}..{temperatures.max():.1f}C, "
+                 f"std of last 100 {temperatures[-100:].std():.2f}C")
+    return text
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Summarizes a telemetry dump")
+    parser.add_argument("path")
+    args = parser.parse_args()
+    for name, unit_samples in load(args.path).items():
+        print(f"{name}: {describe(unit_samples)}")
@@ -0,0 +1,175 @@
+import logging
+import numpy as np
+from time import strftime, localtime, time
+from PyQt5.QtCore import Qt, QPointF, QRectF, QTimer
+from PyQt5.QtGui import QColor, QFontMetrics, QIcon, QPainter, QPen, QPolygonF
+from PyQt5.QtWidgets import QComboBox, QFileDialog, QHBoxLayout, QLabel, QMainWindow, QPushButton, QVBoxLayout, \
+    QWidget
+from drift_view import unit_color
+from telemetry import STATES, TELEMETRY_FILE_TIME_FORMAT, decimate
+
+
+logger = logging.getLogger(__name__)
+
+
+# seconds shown, None is everything kept
+TIME_WINDOWS = {"15 min": 15 * 60, "1 hour": 3600, "4 hours": 4 * 3600, "Whole night": None}
+DEFAULT_TIME_WINDOW = "1 hour"
+REFRESH_MS = 5000
+PLOT_MARGIN = 40
+STATE_COLORS = {"IDLE": "#555555", "CAPTURE": "#3377ee", "SAVE": "#228822"}
+STATE_ROW_HEIGHT = 14
+
+
+class TimeSeriesPlot(QWidget):
+    # one line (or min/max envelope when decimated) per unit and field, the second field is dashed
+    def __init__(self, title, fields, parent=None):
+        super(TimeSeriesPlot, self).__init__(parent)
+        self._title = title
+        self._fields = fields
+        self._samples = {}
+        self._start = 0.0
+        self._end = 1.0
+        self.setMinimumSize(600, 160)
+
+    def set_samples(self, samples, start, end):
+        # {unit name: structured telemetry samples}, time range in epoch seconds
+        self._samples = samples
+        self._start, self._end = start, max(end, start + 1.0)
+        self.update()
+
+    def _x(self, times):
+        return PLOT_MARGIN + (times - self._start) / (self._end - self._start) * (self.width() - 2 * PLOT_MARGIN)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("black"))
+        top, bottom = PLOT_MARGIN // 2, self.height() - PLOT_MARGIN // 2
+        painter.setPen(QColor("gray"))
+        painter.drawRect(PLOT_MARGIN, top, self.width() - 2 * PLOT_MARGIN, bottom - top)
+        max_points = max(2, self.width() - 2 * PLOT_MARGIN)
+        series = []
+        for unit_name, samples in sorted(self._samples.items()):
+            for field in self._fields:
+                times, minima, maxima = decimate(samples, field, max_points)
+                series.append((unit_name, field, times, minima, maxima))
+        known = np.concatenate([values[~np.isnan(values)] for *_, minima, maxima in series
+                                for values in (minima, maxima)] or [np.zeros(0)])
+        if len(known) == 0:
+            painter.drawText(self.rect(), Qt.AlignCenter, f"{self._title}: no data")
+            painter.end()
+            return
+        low, high = float(known.min()), float(known.max())
+        if high - low < 1.0:
+            low, high = low - 0.5, high + 0.5
+        painter.drawText(4, top + 12, f"{high:.1f}")
+        painter.drawText(4, bottom, f"{low:.1f}")
+        painter.drawText(PLOT_MARGIN + 4, top + 14, self._title)
+        units = sorted(self._samples)
+        for unit_name, field, times, minima, maxima in series:
+            pen = QPen(unit_color(unit_name, units.index(unit_name)), 1.5)
+            if field != self._fields[0]:
+                pen.setStyle(Qt.DashLine)
+            painter.setPen(pen)
+            xs = self._x(times)
+            for values in (minima, maxima) if minima is not maxima else (minima,):
+                ys = bottom - (values - low) / (high - low) * (bottom - top)
+                self._draw_line(painter, xs, ys)
+        painter.end()
+
+    @staticmethod
+    def _draw_line(painter, xs, ys):
+        # unknown values break the line
+        valid = ~np.isnan(ys)
+        breaks = np.flatnonzero(np.diff(valid.astype(np.int8))) + 1
+        for part in np.split(np.arange(len(ys)), breaks):
+            if len(part) and valid[part[0]]:
+                painter.drawPolyline(QPolygonF([QPointF(xs[i], ys[i]) for i in part]))
+
+
+class StatePlot(TimeSeriesPlot):
+    # a colored strip per unit: idle, capturing or saving
+    def __init__(self, parent=None):
+        super(StatePlot, self).__init__("State", ["state"], parent)
+        self.setMinimumSize(600, 4 * STATE_ROW_HEIGHT + PLOT_MARGIN)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("black"))
+        max_points = max(2, self.width() - 2 * PLOT_MARGIN)
+        for row, (unit_name, samples) in enumerate(sorted(self._samples.items())):
+            if len(samples) == 0:
+                continue
+            # saving wins over capturing wins over idle inside a bucket
+            times, _, states = decimate(samples, "state", max_points)
+            xs = self._x(np.append(times, samples["timestamp"][-1]))
+            y = PLOT_MARGIN // 2 + row * (STATE_ROW_HEIGHT + 2)
+            painter.setPen(unit_color(unit_name, row))
+            painter.drawText(4, y + STATE_ROW_HEIGHT - 2,
+                             QFontMetrics(painter.font()).elidedText(unit_name, Qt.ElideLeft, PLOT_MARGIN - 6))
+            for i, state in enumerate(states):
+                color = STATE_COLORS.get(STATES[int(state)])
+                if color is not None:
+                    painter.fillRect(QRectF(xs[i], y, max(1.0, xs[i + 1] - xs[i]), STATE_ROW_HEIGHT), QColor(color))
+        painter.end()
+
+
+class TelemetryWindow(QMainWindow):
+    # history of temperature, set point, cooler power and state of every unit
+    def __init__(self, parent, store):
+        super(TelemetryWindow, self).__init__(parent)
+        self.setWindowIcon(QIcon('4lufy.ico'))
+        self.setWindowTitle("Telemetry")
+        self._store = store
+        central = QWidget()
+        layout = QVBoxLayout()
+        self._plots = [TimeSeriesPlot("Temperature [C], set point dashed", ["temperature", "set_temperature"]),
+                       TimeSeriesPlot("Cooler power [%]", ["cooler_power"]),
+                       StatePlot()]
+        for plot in self._plots:
+            layout.addWidget(plot)
+        controls_layout = QHBoxLayout()
+        self._time_window = QComboBox()
+        self._time_window.addItems(TIME_WINDOWS)
+        self._time_window.setCurrentText(DEFAULT_TIME_WINDOW)
+        self._time_window.currentTextChanged.connect(lambda _: self.refresh())
+        controls_layout.addWidget(self._time_window)
+        self._summary_label = QLabel("")
+        controls_layout.addWidget(self._summary_label)
+        dump_button = QPushButton("Save...")
+        dump_button.setToolTip("Save all kept telemetry into a compressed .npz file")
+        dump_button.clicked.connect(self._dump)
+        controls_layout.addWidget(dump_button)
+        layout.addLayout(controls_layout)
+        central.setLayout(layout)
+        self.setCentralWidget(central)
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self.refresh)
+
+    def show_yourself(self):
+        self.show()
+        self.refresh()
+        self._timer.start(REFRESH_MS)
+
+    def hideEvent(self, event):
+        self._timer.stop()
+        super(TelemetryWindow, self).hideEvent(event)
+
+    def refresh(self):
+        window_s = TIME_WINDOWS[self._time_window.currentText()]
+        now = time()
+        since = None if window_s is None else now - window_s
+        samples = {unit_name: self._store.samples(unit_name, since) for unit_name in self._store.units()}
+        starts = [unit_samples["timestamp"][0] for unit_samples in samples.values() if len(unit_samples)]
+        start = since if since is not None else (min(starts) if starts else now)
+        for plot in self._plots:
+            plot.set_samples(samples, start, now)
+        self._summary_label.setText(f"{sum(len(s) for s in samples.values())} samples since "
+                                    f"{strftime('%H:%M', localtime(start))}")
+
+    def _dump(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save telemetry",
+                                              f"telemetry_{strftime(TELEMETRY_FILE_TIME_FORMAT)}.npz",
+                                              "Telemetry (*.npz)")
+        if path:
+            print(f"Telemetry saved into {self._store.dump(path)}")
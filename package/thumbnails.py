@@ -0,0 +1,86 @@
+import logging
+import threading
+import zlib
+from time import time
+import numpy as np
+from latest_wins import LatestWinsExecutor
+from tracer import traced
+
+
+logger = logging.getLogger(__name__)
+
+
+THUMBNAIL_WIDTH = 72
+THUMBNAIL_HEIGHT = 48
+MAX_8B_VALUE = 255
+# stretch percentiles, the same as the single camera view uses before its sliders are touched
+STRETCH_PERCENTILES = (1, 99)
+
+
+@traced("preview_array")
+def preview_array(frame, max_width, max_height):
+    # block averaged by a whole factor down to about the given box (at most twice as large), then stretched
+    # on its own percentiles into 8 bits; mono and RGB frames alike
+    h, w = frame.shape[:2]
+    factor = max(1, h // max_height, w // max_width)
+    h, w = h // factor * factor, w // factor * factor
+    small = frame[:h, :w].reshape(h // factor, factor, w // factor, factor, *frame.shape[2:]) \
+        .mean(axis=(1, 3), dtype=np.float32)
+    a, b = np.percentile(small, STRETCH_PERCENTILES)
+    return np.clip((small - a) / max(b - a, 1e-6) * MAX_8B_VALUE, 0, MAX_8B_VALUE).astype(np.uint8)
+
+
+def frame_digest(frame):
+    # cheap content fingerprint, a re-fetched frame that did not change is not downsampled again
+    return zlib.adler32(np.ascontiguousarray(frame).data), frame.shape
+
+
+class Thumbnailer:
+    # Thumbnails of the latest frame of every unit, fetched and downsampled on a worker pool.
+    # A thumbnail is remembered with the key of its frame (e.g. the unit's frame counter), asking again with
+    # the same key costs nothing. A unit has one thumbnail in work, requests meanwhile replace each other.
+    # on_ready(unit_name, uint8 array, timestamp) is called from the workers.
+    def __init__(self, on_ready, max_workers=4, width=THUMBNAIL_WIDTH, height=THUMBNAIL_HEIGHT):
+        self._on_ready = on_ready
+        self._width = width
+        self._height = height
+        self._keys = {}
+        self._digests = {}
+        self._lock = threading.Lock()
+        self._executor = LatestWinsExecutor(self._make, "Making thumbnail", max_workers, "thumbnail")
+
+    def request(self, unit_name, frame_key, fetch_frame):
+        # frame_key None means unknown, the frame is fetched and compared by content
+        if self._is_made(unit_name, frame_key):
+            return False
+        self._executor.submit(unit_name, frame_key, fetch_frame)
+        return True
+
+    def _is_made(self, unit_name, frame_key):
+        with self._lock:
+            return frame_key is not None and self._keys.get(unit_name) == frame_key
+
+    def _make(self, unit_name, frame_key, fetch_frame):
+        # a request replaced by a later one for the same frame finds it made already
+        if self._is_made(unit_name, frame_key):
+            return
+        frame = fetch_frame()
+        if frame is None:
+            return
+        digest = frame_digest(frame)
+        with self._lock:
+            self._keys[unit_name] = frame_key
+            if self._digests.get(unit_name) == digest:
+                logger.debug(f"Frame of {unit_name} did not change, thumbnail kept")
+                return
+            self._digests[unit_name] = digest
+        self._on_ready(unit_name, preview_array(frame, self._width, self._height), time())
+
+    def forget(self, unit_name):
+        # e.g. another camera was chosen, the next request makes a new thumbnail
+        with self._lock:
+            self._keys.pop(unit_name, None)
+            self._digests.pop(unit_name, None)
+
+    def shutdown(self):
+        self._executor.shutdown()
@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import threading
+from collections import deque
+from functools import wraps
+from time import perf_counter_ns, strftime
+
+
+logger = logging.getLogger(__name__)
+
+
+# oldest spans are dropped beyond that, a long session cannot eat memory
+MAX_EVENTS = 200000
+NS_IN_US = 1000
+TRACE_FILE_TIME_FORMAT = "%Y%m%d_%H%M%S"
+
+_enabled = False
+_events = deque(maxlen=MAX_EVENTS)
+_thread_names = {}
+_origin_ns = perf_counter_ns()
+
+
+def is_enabled():
+    return _enabled
+
+
+def start():
+    global _enabled, _origin_ns
+    _events.clear()
+    _thread_names.clear()
+    _origin_ns = perf_counter_ns()
+    _enabled = True
+    logger.info("Tracing started")
+
+
+def stop():
+    global _enabled
+    _enabled = False
+    logger.info(f"Tracing stopped, {len(_events)} spans recorded")
+
+
+def _record(name, start_ns, end_ns, args):
+    thread = threading.current_thread()
+    if thread.ident not in _thread_names:
+        _thread_names[thread.ident] = thread.name
+    # complete event ("X") of the Chrome trace event format, deque append is thread safe
+    _events.append((name, (start_ns - _origin_ns) / NS_IN_US, (end_ns - start_ns) / NS_IN_US, thread.ident, args))
+
+
+class _Span:
+    __slots__ = ("name", "args", "_start_ns")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self._start_ns = 0
+
+    def __enter__(self):
+        self._start_ns = perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        _record(self.name, self._start_ns, perf_counter_ns(), self.args)
+
+    def annotate(self, **args):
+        self.args.update(args)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return None
+
+    def annotate(self, **args):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name, **args):
+    # with span("decode", bytes=n) as s: ... s.annotate(shape=...), costs one flag check when tracing is off
+    return _Span(name, args) if _enabled else _NO_SPAN
+
+
+def traced(name=None):
+    def decorator(function):
+        span_name = name or function.__qualname__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            start_ns = perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _record(span_name, start_ns, perf_counter_ns(), {})
+        return wrapper
+    return decorator
+
+
+def trace_events():
+    pid = os.getpid()
+    events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}}
+              for tid, thread_name in list(_thread_names.items())]
+    for name, ts, dur, tid, args in list(_events):
+        event = {"name": name, "ph": "X", "ts": ts, "dur": dur, "pid": pid, "tid": tid}
+        if args:
+            event["args"] = args
+        events.append(event)
+    return events
+
+
+def export(path=None):
+    # Chrome trace event JSON, opens in chrome://tracing or ui.perfetto.dev
+    path = path or f"trace_{strftime(TRACE_FILE_TIME_FORMAT)}.json"
+    with open(path, 'w') as outfile:
+        json.dump({"traceEvents": trace_events(), "displayTimeUnit": "ms"}, outfile, default=str)
+    logger.info(f"Trace with {len(_events)} spans written to {path}")
+    return path
@@ -0,0 +1,106 @@
+import logging
+import threading
+from io import BytesIO
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+TRANSFER_RAW = "raw"
+TRANSFER_JPG = "jpg"
+PURPOSE_VIEW = "view"
+PURPOSE_LIVE = "live"
+PURPOSE_SAVE = "save"
+PURPOSE_SOLVE = "solve"
+PURPOSE_MEASURE = "measure"
+# star positions on a binned proxy survive JPG, drift of four units must not wait for RAW transfers
+PURPOSE_DRIFT = "drift"
+PURPOSE_THUMBNAIL = "thumbnail"
+# anything that ends up in a file or a number needs every bit of the frame
+RAW_PURPOSES = {PURPOSE_SAVE, PURPOSE_SOLVE, PURPOSE_MEASURE}
+# how long a preview may take to transfer before RAW is traded for JPG
+TRANSFER_BUDGET_S = {PURPOSE_VIEW: 1.5, PURPOSE_LIVE: 0.5, PURPOSE_DRIFT: 1.0, PURPOSE_THUMBNAIL: 0.5}
+# best first; starting guesses of JPG bytes per pixel, refined from received images
+JPG_QUALITIES = [95, 85, 70, 50]
+DEFAULT_JPG_BYTES_PER_PIXEL = {95: 0.9, 85: 0.5, 70: 0.3, 50: 0.2}
+BPP_EWMA_ALPHA = 0.3
+BITS_IN_BYTE = 8
+
+
+class TransferChoice:
+    def __init__(self, transfer_format, quality=None, reason=""):
+        self.format = transfer_format
+        self.quality = quality
+        self.reason = reason
+
+    def __str__(self):
+        return self.format if self.quality is None else f"{self.format} q{self.quality}"
+
+
+class TransferReport:
+    def __init__(self, choice: TransferChoice, payload_bytes, transfer_s, decode_s):
+        self.choice = choice
+        self.payload_bytes = payload_bytes
+        self.transfer_s = transfer_s
+        self.decode_s = decode_s
+
+    def text(self):
+        mbps = self.payload_bytes * BITS_IN_BYTE / self.transfer_s / 1e6 if self.transfer_s > 0 else 0
+        return (f"{self.choice}: {self.payload_bytes / 1e6:.2f} MB in {self.transfer_s:.2f}s ({mbps:.0f} Mbit/s), "
+                f"decode {self.decode_s * 1000:.0f}ms")
+
+
+class TransferPolicy:
+    # Chooses RAW or JPG (and its quality) for one unit from measured link throughput.
+    def __init__(self):
+        self._jpg_bytes_per_pixel = dict(DEFAULT_JPG_BYTES_PER_PIXEL)
+        self._raw_failed = False
+        self._lock = threading.Lock()
+
+    def choose(self, purpose, pixels, raw_bytes, throughput_bps):
+        if purpose in RAW_PURPOSES:
+            return TransferChoice(TRANSFER_RAW, reason=f"{purpose} needs full data")
+        budget_s = TRANSFER_BUDGET_S[purpose]
+        if throughput_bps is None:
+            # JPG previews are too small to measure a link, one RAW transfer does it unless it fails
+            if self._raw_failed:
+                return TransferChoice(TRANSFER_JPG, JPG_QUALITIES[-1], "RAW transfer failed, link unknown")
+            return TransferChoice(TRANSFER_RAW, reason="measuring link throughput")
+        if raw_bytes / throughput_bps <= budget_s:
+            return TransferChoice(TRANSFER_RAW, reason=f"RAW fits {budget_s}s budget")
+        with self._lock:
+            for quality in JPG_QUALITIES:
+                if pixels * self._jpg_bytes_per_pixel[quality] / throughput_bps <= budget_s:
+                    return TransferChoice(TRANSFER_JPG, quality, f"RAW would take {raw_bytes / throughput_bps:.1f}s")
+        return TransferChoice(TRANSFER_JPG, JPG_QUALITIES[-1], "slow link, lowest quality")
+
+    def record_raw(self, succeeded):
+        self._raw_failed = not succeeded
+
+    def record_jpg(self, quality, pixels, payload_bytes):
+        if quality is None or pixels == 0:
+            return
+        with self._lock:
+            previous = self._jpg_bytes_per_pixel.get(quality, payload_bytes / pixels)
+            self._jpg_bytes_per_pixel[quality] = (1 - BPP_EWMA_ALPHA) * previous + BPP_EWMA_ALPHA * payload_bytes / pixels
+
+
+_policies = {}
+_policies_lock = threading.Lock()
+
+
+def policy_for(unit_name) -> TransferPolicy:
+    with _policies_lock:
+        if unit_name not in _policies:
+            _policies[unit_name] = TransferPolicy()
+        return _policies[unit_name]
+
+
+def decode_jpeg(content):
+    # Pillow releases the GIL while decoding, callers run this on worker threads
+    from PIL import Image
+    with Image.open(BytesIO(content)) as image:
+        if image.mode not in ("L", "RGB"):
+            image = image.convert("L")
+        return np.asarray(image)
@@ -0,0 +1,432 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import zlib
+from bisect import bisect_right
+from collections import Counter, defaultdict
+from datetime import timedelta
+from time import monotonic, perf_counter, sleep, strftime, time
+from urllib.parse import urlparse
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+logger = logging.getLogger(__name__)
+
+
+INDEX_FILE = "exchanges.jsonl"
+PAYLOAD_FILE = "payloads.bin"
+RECORDING_TIME_FORMAT = "%Y%m%d_%H%M%S"
+# the fastest zlib level, frames of a whole fleet have to be compressed as fast as they arrive
+PAYLOAD_COMPRESSION_LEVEL = 1
+# bodies that do not shrink below that (JPG previews) are stored as they are
+MAX_COMPRESSED_RATIO = 0.9
+ERROR_TIMEOUT = "timeout"
+METHOD_STREAM = "STREAM"
+NOT_RECORDED_STATUS = 404
+# the deadline is checked between chunks, a chunk has to arrive in a fraction of it even on a slow link
+TRANSFER_CHUNK_BYTES = 64 * 1024
+
+
+def exchange_key(method, url, params=None, json_body=None):
+    # the same request recorded and replayed gives the same key, whatever the order of params
+    return json.dumps([method, url, params or {}, json_body], sort_keys=True)
+
+
+class HttpTransport:
+    # What CameraRequester and the event streams talk through: plain requests to the real units.
+    def send(self, method, url, timeout, params=None, headers=None, json_body=None, deadline_s=None):
+        # the read timeout of requests bounds only a stall between bytes, deadline_s bounds the whole transfer
+        if deadline_s is None:
+            return requests.request(method, url, params=params, headers=headers, json=json_body, timeout=timeout)
+        deadline = monotonic() + deadline_s
+        response = requests.request(method, url, params=params, headers=headers, json=json_body, timeout=timeout,
+                                    stream=True)
+        chunks = []
+        with response:
+            for chunk in response.iter_content(TRANSFER_CHUNK_BYTES):
+                if monotonic() > deadline:
+                    raise requests.exceptions.Timeout(f"{url} not transferred within {deadline_s:.1f}s")
+                chunks.append(chunk)
+        # what requests itself does when the content is read at once
+        response._content = b"".join(chunks)
+        return response
+
+    def stream(self, url, headers, timeout):
+        return requests.get(url, stream=True, headers=headers, timeout=timeout)
+
+    def reachable(self, host):
+        # None means ask the network
+        return None
+
+    def close(self):
+        pass
+
+
+class _RecordedStream:
+    # the streamed response as it came, every line read from it is recorded on the way
+    def __init__(self, response, on_line, on_close):
+        self._response = response
+        self._on_line = on_line
+        self._on_close = on_close
+        self._closed = False
+        self.status_code = response.status_code
+        self.headers = response.headers
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def iter_lines(self, chunk_size=512, decode_unicode=False):
+        for line in self._response.iter_lines(chunk_size=chunk_size, decode_unicode=decode_unicode):
+            self._on_line(line if isinstance(line, str) else line.decode("utf-8", "replace"))
+            yield line
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._on_close()
+        self._response.close()
+
+
+class RecordingTransport:
+    # Passes everything to the inner transport and records it into a directory: a JSON line per exchange,
+    # streamed line and stream end in exchanges.jsonl (with the time since the recording started), bodies in
+    # payloads.bin. A body is zlib compressed and stored once however often it comes back, unchanged frames
+    # and repeated status answers cost a reference.
+    def __init__(self, directory, inner=None):
+        self.directory = directory
+        self._inner = inner or HttpTransport()
+        os.makedirs(directory, exist_ok=True)
+        self._index = open(os.path.join(directory, INDEX_FILE), 'w', encoding='utf-8')
+        self._payloads = open(os.path.join(directory, PAYLOAD_FILE), 'wb')
+        self._stored = {}
+        self._payload_end = 0
+        self._next_stream = 0
+        self._closed = False
+        self._origin = monotonic()
+        self._lock = threading.Lock()
+        self._write({"recording": 1, "started": time()})
+        logger.info(f"Recording camera traffic into {directory}")
+
+    def _now(self):
+        return monotonic() - self._origin
+
+    def _write(self, entry):
+        with self._lock:
+            if self._closed:
+                return
+            self._index.write(json.dumps(entry) + "\n")
+            # right away, a session that crashed is what most recordings are made for
+            self._index.flush()
+
+    def _store_payload(self, content):
+        digest = hashlib.sha1(content).digest()
+        with self._lock:
+            if digest in self._stored:
+                return self._stored[digest]
+        compressed = zlib.compress(content, PAYLOAD_COMPRESSION_LEVEL)
+        is_compressed = len(compressed) < MAX_COMPRESSED_RATIO * len(content)
+        data = compressed if is_compressed else content
+        with self._lock:
+            if digest not in self._stored and not self._closed:
+                self._payloads.write(data)
+                self._payloads.flush()
+                # offset, stored length, original length, compressed
+                self._stored[digest] = [self._payload_end, len(data), len(content), is_compressed]
+                self._payload_end += len(data)
+            return self._stored.get(digest)
+
+    @staticmethod
+    def _error_fields(e):
+        return {"error": ERROR_TIMEOUT if isinstance(e, requests.exceptions.Timeout) else type(e).__name__,
+                "message": str(e)}
+
+    def send(self, method, url, timeout, params=None, headers=None, json_body=None, deadline_s=None):
+        entry = {"t": self._now(), "method": method, "url": url, "params": params, "json": json_body}
+        start = perf_counter()
+        try:
+            response = self._inner.send(method, url, timeout, params=params, headers=headers, json_body=json_body,
+                                        deadline_s=deadline_s)
+        except Exception as e:
+            entry.update(duration_s=perf_counter() - start, **self._error_fields(e))
+            self._write(entry)
+            raise
+        entry.update(duration_s=perf_counter() - start, status=response.status_code,
+                     elapsed_s=response.elapsed.total_seconds(), content_type=response.headers.get("Content-Type"),
+                     payload=self._store_payload(response.content))
+        self._write(entry)
+        return response
+
+    def stream(self, url, headers, timeout):
+        with self._lock:
+            stream_id = self._next_stream
+            self._next_stream += 1
+        entry = {"t": self._now(), "method": METHOD_STREAM, "url": url, "stream": stream_id}
+        try:
+            response = self._inner.stream(url, headers, timeout)
+        except Exception as e:
+            entry.update(self._error_fields(e))
+            self._write(entry)
+            raise
+        entry.update(status=response.status_code, content_type=response.headers.get("Content-Type"))
+        self._write(entry)
+        return _RecordedStream(response,
+                               lambda line: self._write({"t": self._now(), "stream": stream_id, "line": line}),
+                               lambda: self._write({"t": self._now(), "stream": stream_id, "closed": True}))
+
+    def reachable(self, host):
+        return self._inner.reachable(host)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._index.close()
+            self._payloads.close()
+        logger.info(f"Recording {self.directory} closed, {len(self._stored)} distinct bodies, "
+                    f"{self._payload_end} bytes")
+
+
+class Recording:
+    # A recording directory read back. Exchanges of the same request and streams of the same URL are kept
+    # in time order, at() finds what was answered at a given time of the recording.
+    def __init__(self, directory):
+        self.directory = directory
+        self.started = None
+        self.entries = []
+        self.duration_s = 0.0
+        self._by_key = defaultdict(list)
+        self._streams = defaultdict(list)
+        self.lines = defaultdict(list)
+        self.closed_at = {}
+        with open(os.path.join(directory, INDEX_FILE), encoding='utf-8') as infile:
+            for line in infile:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"{directory} ends with a cut line, the recording stopped abruptly")
+                    break
+                self._add(entry)
+        self._key_times = {key: [entry["t"] for entry in entries] for key, entries in self._by_key.items()}
+        self._stream_times = {url: [entry["t"] for entry in entries] for url, entries in self._streams.items()}
+        self._payloads = open(os.path.join(directory, PAYLOAD_FILE), 'rb')
+        self._lock = threading.Lock()
+
+    def _add(self, entry):
+        if "recording" in entry:
+            self.started = entry["started"]
+            return
+        self.duration_s = max(self.duration_s, entry["t"])
+        if "line" in entry:
+            self.lines[entry["stream"]].append(entry)
+        elif "closed" in entry:
+            self.closed_at[entry["stream"]] = entry["t"]
+        elif entry["method"] == METHOD_STREAM:
+            self.entries.append(entry)
+            self._streams[entry["url"]].append(entry)
+        else:
+            self.entries.append(entry)
+            self._by_key[exchange_key(entry["method"], entry["url"], entry["params"], entry["json"])].append(entry)
+
+    @staticmethod
+    def _latest(entries, times, t):
+        # the last one at or before t, the first one when asked before anything was recorded
+        return entries[max(0, bisect_right(times, t) - 1)]
+
+    def at(self, key, t):
+        if key not in self._by_key:
+            return None
+        return self._latest(self._by_key[key], self._key_times[key], t)
+
+    def stream_at(self, url, t):
+        if url not in self._streams:
+            return None
+        return self._latest(self._streams[url], self._stream_times[url], t)
+
+    def hosts(self):
+        return {urlparse(entry["url"]).hostname for entry in self.entries}
+
+    def payload(self, reference):
+        if reference is None:
+            return b""
+        offset, length, _, is_compressed = reference
+        with self._lock:
+            self._payloads.seek(offset)
+            data = self._payloads.read(length)
+        return zlib.decompress(data) if is_compressed else data
+
+    def close(self):
+        self._payloads.close()
+
+
+def _replayed_response(url, status_code, content, elapsed_s, content_type=None):
+    response = requests.Response()
+    response.url = url
+    response.status_code = status_code
+    response._content = content
+    response.elapsed = timedelta(seconds=elapsed_s)
+    if content_type is not None:
+        response.headers["Content-Type"] = content_type
+    return response
+
+
+class _ReplayedStream:
+    # lines of a recorded stream, each one when the replay reaches its time
+    def __init__(self, transport, entry, lines, closed_at):
+        self._transport = transport
+        self._lines = lines
+        self._closed_at = closed_at
+        self._closed = threading.Event()
+        self.status_code = entry["status"]
+        self.headers = CaseInsensitiveDict({"Content-Type": entry.get("content_type") or ""})
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def iter_lines(self, chunk_size=512, decode_unicode=False):
+        opened_at = self._transport.now()
+        for entry in self._lines:
+            # what the unit sent before this connection was made is not sent again
+            if entry["t"] < opened_at:
+                continue
+            if self._transport.wait_until(entry["t"], self._closed):
+                return
+            yield entry["line"] if decode_unicode else entry["line"].encode("utf-8")
+        if self._closed_at is not None:
+            self._transport.wait_until(self._closed_at, self._closed)
+        else:
+            # still open when the recording ended, a quiet unit
+            self._closed.wait()
+
+    def close(self):
+        self._closed.set()
+
+
+class ReplayTransport:
+    # Answers from a recording, nothing goes to the network. A request gets what was answered to the same request
+    # most recently before the same time of the recording (the first answer before that), after the recorded
+    # duration; transport errors are raised again. The answers depend only on the replay clock, so a run replays
+    # deterministically and a night of status changes and new frames comes back in order. speed 10 plays an hour
+    # in 6 minutes, latencies shrink alike. A request never recorded gets 404.
+    def __init__(self, directory, speed=1.0, clock=monotonic):
+        if speed <= 0:
+            raise ValueError(f"Replay speed has to be positive, got {speed}")
+        self.recording = Recording(directory)
+        self.speed = speed
+        self._clock = clock
+        self._origin = clock()
+        self._hosts = self.recording.hosts()
+        self._not_recorded = set()
+        logger.info(f"Replaying {len(self.recording.entries)} exchanges ({self.recording.duration_s:.0f}s) "
+                    f"from {directory} at {speed}x")
+
+    def now(self):
+        # time of the recording being replayed
+        return (self._clock() - self._origin) * self.speed
+
+    def wait_until(self, t, event):
+        # True when the event came first
+        return event.wait(max(0.0, (t - self.now()) / self.speed))
+
+    def _answer(self, entry, url):
+        if entry is None:
+            if url not in self._not_recorded:
+                self._not_recorded.add(url)
+                logger.warning(f"{url} was not recorded like this, answering {NOT_RECORDED_STATUS}")
+            return None
+        sleep(entry.get("duration_s", 0.0) / self.speed)
+        if "error" in entry:
+            if entry["error"] == ERROR_TIMEOUT:
+                raise requests.exceptions.Timeout(entry["message"])
+            raise requests.exceptions.ConnectionError(entry["message"])
+        return entry
+
+    def send(self, method, url, timeout, params=None, headers=None, json_body=None, deadline_s=None):
+        entry = self._answer(self.recording.at(exchange_key(method, url, params, json_body), self.now()), url)
+        if entry is None:
+            return _replayed_response(url, NOT_RECORDED_STATUS, b"", 0.0)
+        return _replayed_response(url, entry["status"], self.recording.payload(entry["payload"]),
+                                  entry["elapsed_s"] / self.speed, entry.get("content_type"))
+
+    def stream(self, url, headers, timeout):
+        entry = self._answer(self.recording.stream_at(url, self.now()), url)
+        if entry is None:
+            return _replayed_response(url, NOT_RECORDED_STATUS, b"", 0.0)
+        return _ReplayedStream(self, entry, self.recording.lines[entry["stream"]],
+                               self.recording.closed_at.get(entry["stream"]))
+
+    def reachable(self, host):
+        return host in self._hosts
+
+    def close(self):
+        self.recording.close()
+
+
+_current = HttpTransport()
+
+
+def current():
+    return _current
+
+
+def install(transport):
+    # returns the one replaced, e.g. to close it
+    global _current
+    previous, _current = _current, transport
+    return previous
+
+
+def close_current():
+    # e.g. on exit, a recording is complete on disk after that
+    _current.close()
+
+
+def install_from_config(config):
+    # "replay_traffic": recording directory answering instead of the units, at "replay_speed" (1.0 by default);
+    # "record_traffic": directory every session records its traffic into
+    if config.get("replay_traffic"):
+        install(ReplayTransport(config["replay_traffic"], config.get("replay_speed", 1.0)))
+    elif config.get("record_traffic"):
+        directory = os.path.join(config["record_traffic"], f"traffic_{strftime(RECORDING_TIME_FORMAT)}")
+        install(RecordingTransport(directory))
+    return _current
+
+
+def describe(recording):
+    endpoints = Counter()
+    endpoint_bytes = Counter()
+    errors = Counter()
+    for entry in recording.entries:
+        endpoint = entry["method"] + " " + urlparse(entry["url"]).path.rsplit("/", 1)[-1]
+        endpoints[endpoint] += 1
+        if "error" in entry:
+            errors[entry["error"]] += 1
+        elif entry.get("payload") is not None:
+            endpoint_bytes[endpoint] += entry["payload"][2]
+    original = sum(endpoint_bytes.values())
+    stored = os.path.getsize(os.path.join(recording.directory, PAYLOAD_FILE))
+    lines = [f"{len(recording.entries)} exchanges over {recording.duration_s / 60:.1f} min with "
+             f"{len(recording.hosts())} hosts, {sum(len(s) for s in recording.lines.values())} streamed lines",
+             f"bodies: {original / 1e6:.1f} MB received, {stored / 1e6:.1f} MB stored"]
+    lines += [f"  {endpoint}: {count} ({endpoint_bytes[endpoint] / 1e6:.1f} MB)"
+              for endpoint, count in endpoints.most_common()]
+    if errors:
+        lines.append("errors: " + ", ".join(f"{error} x{count}" for error, count in errors.most_common()))
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Summarizes a recording of camera traffic")
+    parser.add_argument("directory")
+    args = parser.parse_args()
+    print(describe(Recording(args.directory)))
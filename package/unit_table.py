@@ -0,0 +1,298 @@
+import logging
+from time import localtime, strftime
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor, QFont
+from PyQt5.QtWidgets import QApplication, QComboBox, QStyle, QStyledItemDelegate, QStyleOptionButton, \
+    QStyleOptionProgressBar
+
+
+logger = logging.getLogger(__name__)
+
+
+EMPTY_CAMERA_LIST_ITEM = "<<no cameras connected>>"
+BINNING_OPTIONS = ["x1", "x2", "x4"]
+MIN_CAPTURE_NUMBER = 1
+MAX_CAPTURE_NUMBER = 10000
+SAVING_COLOR = "#228822"
+
+OPTIONS_ROLE = Qt.UserRole
+CHECKED_ROLE = Qt.UserRole + 1
+PROGRESS_ROLE = Qt.UserRole + 2
+
+(COL_NAME, COL_PINGABLE, COL_REACHABLE, COL_CAMERA, COL_STATUS, COL_OFFSET, COL_THUMBNAIL, COL_VIEW, COL_SAVE,
+ COL_SOLVE, COL_EXPOSURE, COL_GAIN, COL_COOLING, COL_TEMP, COL_SET_TEMP, COL_BINNING, COL_CAPTURE_TYPE,
+ COL_CAPTURE_NUMBER, COL_SAVING, COL_PROGRESS) = range(20)
+
+COLUMN_TITLES = ["Unit name", "Pingable", "Reachable", "Cameras", "Status", "Cameras offsets", "Last image", "", "",
+                 "", "Exposure", "Gain", "Cooling", "Current temp [C]", "Set temp [C]", "Binning", "Capturing type",
+                 "Capturing number", "Saving images", "Progress"]
+BUTTON_TEXTS = {COL_VIEW: "View", COL_SAVE: "Save", COL_SOLVE: "Solve"}
+EDITABLE_COLUMNS = {COL_CAMERA, COL_EXPOSURE, COL_GAIN, COL_BINNING, COL_CAPTURE_TYPE, COL_CAPTURE_NUMBER}
+BOLD_COLUMNS = {COL_PINGABLE, COL_REACHABLE, COL_COOLING}
+
+
+def yes_no(value):
+    return "YES" if value else "NO"
+
+
+def green_red(value):
+    return "green" if value else "red"
+
+
+# display text of every column that is not a button
+DISPLAY_TEXTS = {
+    COL_NAME: lambda unit: unit.name,
+    COL_PINGABLE: lambda unit: yes_no(unit.pingable),
+    COL_REACHABLE: lambda unit: yes_no(unit.reachable),
+    COL_CAMERA: lambda unit: unit.camera_name,
+    COL_STATUS: lambda unit: unit.status,
+    COL_OFFSET: lambda unit: unit.offset,
+    COL_THUMBNAIL: lambda unit: "" if unit.thumbnail is not None else "<no frame>",
+    COL_EXPOSURE: lambda unit: unit.exposure,
+    COL_GAIN: lambda unit: unit.gain,
+    COL_COOLING: lambda unit: "<on or off>" if unit.cooler_on is None else yes_no(unit.cooler_on),
+    COL_TEMP: lambda unit: unit.temperature,
+    COL_SET_TEMP: lambda unit: unit.set_temperature,
+    COL_BINNING: lambda unit: unit.binning,
+    COL_CAPTURE_TYPE: lambda unit: unit.capture_prefix,
+    COL_CAPTURE_NUMBER: lambda unit: str(unit.capture_number),
+    COL_SAVING: lambda unit: "Stop" if unit.is_saving else "Start",
+    COL_PROGRESS: lambda unit: unit.progress.text() if unit.progress is not None else "",
+}
+
+
+class UnitState:
+    __slots__ = ("name", "pingable", "reachable", "cameras", "camera_index", "status", "offset", "exposure", "gain",
+                 "cooler_on", "temperature", "set_temperature", "binning", "capture_prefix", "capture_number",
+                 "is_saving", "exposure_us", "progress", "thumbnail", "thumbnail_time")
+
+    def __init__(self, name):
+        self.name = name
+        self.pingable = False
+        self.reachable = False
+        self.cameras = [EMPTY_CAMERA_LIST_ITEM]
+        self.camera_index = 0
+        self.status = "<unknown>"
+        self.offset = "<<offset unknown>>"
+        self.exposure = "<<exposure time>>"
+        self.gain = "<<value>>"
+        self.cooler_on = None
+        self.temperature = "<<temp unknown>>"
+        self.set_temperature = "<<value>>"
+        self.binning = "x4"
+        self.capture_prefix = "light"
+        self.capture_number = 1
+        self.is_saving = False
+        self.exposure_us = None
+        self.progress = None
+        # QPixmap of the latest frame and when it was made
+        self.thumbnail = None
+        self.thumbnail_time = None
+
+    @property
+    def camera_name(self):
+        if 0 <= self.camera_index < len(self.cameras):
+            return self.cameras[self.camera_index]
+        return EMPTY_CAMERA_LIST_ITEM
+
+
+class UnitTableModel(QAbstractTableModel):
+    # unit_name, column, new value - emitted after the user edits a cell
+    value_edited = pyqtSignal(str, int, object)
+
+    def __init__(self, unit_names, parent=None):
+        super(UnitTableModel, self).__init__(parent)
+        self._units = [UnitState(unit_name) for unit_name in unit_names]
+        self._rows = {unit_name: row for row, unit_name in enumerate(unit_names)}
+        self._bold_font = QFont()
+        self._bold_font.setBold(True)
+
+    def unit_names(self):
+        return [unit.name for unit in self._units]
+
+    def unit_name(self, row):
+        return self._units[row].name
+
+    def state(self, unit_name) -> UnitState:
+        return self._units[self._rows[unit_name]]
+
+    def update_units(self, changes):
+        # changes = {unit_name: {field: value}}, all rows are refreshed with a single dataChanged
+        rows = []
+        for unit_name, fields in changes.items():
+            if not fields:
+                continue
+            unit = self.state(unit_name)
+            for field, value in fields.items():
+                setattr(unit, field, value)
+            rows.append(self._rows[unit_name])
+        if rows:
+            self.dataChanged.emit(self.index(min(rows), 0), self.index(max(rows), self.columnCount() - 1))
+
+    def update_unit(self, unit_name, **fields):
+        self.update_units({unit_name: fields})
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._units)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMN_TITLES)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return COLUMN_TITLES[section]
+        return None
+
+    def flags(self, index):
+        flags = super(UnitTableModel, self).flags(index)
+        if index.column() in EDITABLE_COLUMNS and self._units[index.row()].reachable:
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        unit = self._units[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            return self._display_text(unit, column)
+        if role == Qt.EditRole:
+            return unit.camera_index if column == COL_CAMERA else self._display_text(unit, column)
+        if role == Qt.ForegroundRole:
+            color = self._text_color(unit, column)
+            return QColor(color) if color is not None else None
+        if role == Qt.FontRole and column in BOLD_COLUMNS:
+            return self._bold_font
+        if role == OPTIONS_ROLE:
+            if column == COL_CAMERA:
+                return unit.cameras
+            if column == COL_BINNING:
+                return BINNING_OPTIONS
+        if role == CHECKED_ROLE and column == COL_SAVING:
+            return unit.is_saving
+        if column == COL_THUMBNAIL and unit.thumbnail is not None:
+            if role == Qt.DecorationRole:
+                return unit.thumbnail
+            if role == Qt.ToolTipRole:
+                return f"Frame fetched at {strftime('%H:%M:%S', localtime(unit.thumbnail_time))}"
+        if column == COL_PROGRESS and unit.progress is not None:
+            if role == PROGRESS_ROLE:
+                return unit.progress.fraction
+            if role == Qt.ToolTipRole:
+                return unit.progress.details()
+        return None
+
+    def _display_text(self, unit: UnitState, column):
+        if column in BUTTON_TEXTS:
+            return BUTTON_TEXTS[column]
+        return DISPLAY_TEXTS[column](unit)
+
+    def _text_color(self, unit: UnitState, column):
+        if column == COL_PINGABLE:
+            return green_red(unit.pingable)
+        if column == COL_REACHABLE:
+            return green_red(unit.reachable)
+        if column == COL_COOLING and unit.cooler_on is not None:
+            return green_red(unit.cooler_on)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole:
+            return False
+        unit = self._units[index.row()]
+        column = index.column()
+        if column == COL_CAPTURE_NUMBER:
+            try:
+                number = int(value)
+            except Exception as e:
+                logger.warning(f"Exception raised when changing capture number: {e}")
+                return False
+            if number < MIN_CAPTURE_NUMBER or number > MAX_CAPTURE_NUMBER:
+                logger.warning(f"Number of captures [{number}] for {unit.name} is outside allowed range "
+                               f"({MIN_CAPTURE_NUMBER}-{MAX_CAPTURE_NUMBER})")
+                return False
+            logger.debug(f"Setting new capture number for {unit.name}: {number}")
+            unit.capture_number = number
+        elif column == COL_CAPTURE_TYPE:
+            unit.capture_prefix = str(value)
+        elif column == COL_CAMERA:
+            unit.camera_index = int(value)
+        elif column == COL_BINNING:
+            unit.binning = str(value)
+        elif column == COL_EXPOSURE:
+            unit.exposure = str(value)
+        elif column == COL_GAIN:
+            unit.gain = str(value)
+        else:
+            return False
+        self.dataChanged.emit(index, index)
+        self.value_edited.emit(unit.name, column, value)
+        return True
+
+
+class ButtonDelegate(QStyledItemDelegate):
+    clicked = pyqtSignal(int)
+
+    def paint(self, painter, option, index):
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = index.data(Qt.DisplayRole)
+        button.state = QStyle.State_Enabled
+        style = option.widget.style() if option.widget is not None else QApplication.style()
+        if index.data(CHECKED_ROLE):
+            button.state |= QStyle.State_On
+            painter.fillRect(button.rect, QColor(SAVING_COLOR))
+            style.drawControl(QStyle.CE_PushButtonLabel, button, painter, option.widget)
+        else:
+            style.drawControl(QStyle.CE_PushButton, button, painter, option.widget)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton \
+                and option.rect.contains(event.pos()):
+            self.clicked.emit(index.row())
+            return True
+        return super(ButtonDelegate, self).editorEvent(event, model, option, index)
+
+
+class ComboBoxDelegate(QStyledItemDelegate):
+    def createEditor(self, parent, option, index):
+        editor = QComboBox(parent)
+        editor.addItems(index.data(OPTIONS_ROLE))
+        editor.activated.connect(lambda _: self._commit_and_close(editor))
+        QTimer.singleShot(0, editor.showPopup)
+        return editor
+
+    def _commit_and_close(self, editor):
+        self.commitData.emit(editor)
+        self.closeEditor.emit(editor)
+
+    def setEditorData(self, editor, index):
+        value = index.data(Qt.EditRole)
+        if isinstance(value, int):
+            editor.setCurrentIndex(value)
+        else:
+            editor.setCurrentText(value)
+
+    def setModelData(self, editor, model, index):
+        if isinstance(index.data(Qt.EditRole), int):
+            model.setData(index, editor.currentIndex())
+        else:
+            model.setData(index, editor.currentText())
+
+
+class ProgressBarDelegate(QStyledItemDelegate):
+    def paint(self, painter, option, index):
+        fraction = index.data(PROGRESS_ROLE)
+        if fraction is None:
+            super(ProgressBarDelegate, self).paint(painter, option, index)
+            return
+        progress_bar = QStyleOptionProgressBar()
+        progress_bar.rect = option.rect.adjusted(2, 2, -2, -2)
+        progress_bar.minimum = 0
+        progress_bar.maximum = 1000
+        progress_bar.progress = int(fraction * 1000)
+        progress_bar.text = index.data(Qt.DisplayRole)
+        progress_bar.textVisible = True
+        progress_bar.state = QStyle.State_Enabled | QStyle.State_Horizontal
+        style = option.widget.style() if option.widget is not None else QApplication.style()
+        style.drawControl(QStyle.CE_ProgressBar, progress_bar, painter, option.widget)
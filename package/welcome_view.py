@@ -1,20 +1,41 @@
 import subprocess
-from blind_solver import blind_solve_image
-from PyQt5.QtWidgets import QInputDialog, QScrollArea, QLabel, QGridLayout, QSlider, QSpacerItem, QSizePolicy, QHBoxLayout, QLineEdit, QMainWindow, QWidget, QVBoxLayout, QPushButton, QComboBox
-from PyQt5.QtGui import QPixmap, QImage, QPainter, QPen, QIcon, QFont
-from PyQt5.QtCore import Qt
+from concurrent.futures import ThreadPoolExecutor
+from PyQt5.QtWidgets import QApplication, QInputDialog, QComboBox, QFileDialog, QGridLayout, QScrollArea, QLabel, QSlider, QSpacerItem, QSizePolicy, QHBoxLayout, QLineEdit, QMainWindow, QWidget, QVBoxLayout, QPushButton, QTableView, QAbstractItemView, QStyle
+from PyQt5.QtGui import QPixmap, QImage, QPainter, QPen, QIcon
+from PyQt5.QtCore import Qt, QObject, QTimer, pyqtSignal
 import numpy as np
 import logging
 from config_manager import save_config
-from utils import start_repeated_task
+from polling_scheduler import PollingScheduler, PolledMetric
 from camera_requester import standalone_get_request, standalone_post_request, CameraRequester
-from time import time, sleep
+from fleet import broadcast, set_cooler_on_for_all, set_temperature_for_all, start_saving_for_all
+from status_stream import STATUS_EVENT, TEMPERATURE_EVENT, FRAME_READY_EVENT
+from capture_progress import ProgressTracker
+from live_stack import LiveStack, STACK_MODES
+from frame_history import FrameHistory
+from debayer import DEBAYER_MODES, DEBAYER_OFF, DEBAYER_SUPERPIXEL, color_qimage, qimage_from_rgb
+from transfer_policy import PURPOSE_DRIFT, PURPOSE_LIVE, PURPOSE_MEASURE, PURPOSE_SAVE, PURPOSE_SOLVE, \
+    PURPOSE_THUMBNAIL, PURPOSE_VIEW, TRANSFER_RAW, TRANSFER_JPG, TransferReport, policy_for, decode_jpeg
+from frame_writer import FrameWriter, FORMAT_TIFF, DEFAULT_OUTPUT_FORMAT, available_formats, acquisition_metadata
+from frame_quality import QualityAnalyzer
+import tracer
+from tracer import traced
+from quality_index import DEFAULT_INDEX_PATH
+from drift_monitor import DEFAULT_ARCSEC_PER_PIXEL, DEFAULT_WARNING_ARCSEC_PER_MIN
+from drift_view import DriftWindow
+from telemetry import TelemetryStore
+from telemetry_view import TelemetryWindow
+from frame import Frame, latest_frames
+import transport
+from thumbnails import Thumbnailer, preview_array, THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT
+from unit_table import UnitTableModel, ButtonDelegate, ComboBoxDelegate, ProgressBarDelegate, EMPTY_CAMERA_LIST_ITEM, \
+    COL_VIEW, COL_SAVE, COL_SOLVE, COL_SAVING, COL_PROGRESS, COL_CAMERA, COL_BINNING, COL_EXPOSURE, COL_GAIN, \
+    COL_THUMBNAIL
+from time import time, sleep, strftime, localtime, perf_counter
 from threading import Event
 import re
 import os
-from ssh_client import send_command_via_ssh
-from PIL import Image
-import tifffile
+from collections import OrderedDict
 
 
 logger = logging.getLogger(__name__)
@@ -22,12 +43,39 @@ logger = logging.getLogger(__name__)
 
 regexp_for_exp_time = re.compile("(([0-9]*[.])?[0-9]+)(s|ms|us)")
 port_for_cameras = 8080
-EMPTY_CAMERA_LIST_ITEM = "<<no cameras connected>>"
 US_IN_MILLISECOND = 1000
 MILLISECONDS_IN_SECOND = 1000
 US_IN_SECOND = MILLISECONDS_IN_SECOND * US_IN_MILLISECOND
 MIN_EXP_US = 64
 MAX_EXP_US = US_IN_SECOND*3600*2 # 2h is max anyway
+STATUS_INTERVAL_S = 5
+STATUS_WHILE_SAVING_INTERVAL_S = 1
+TEMPERATURE_INTERVAL_S = 10
+COOLER_INTERVAL_S = 60
+COOLER_POWER_INTERVAL_S = 30
+PROGRESS_COLUMN_WIDTH = 180
+MAX_16B_VALUE = 65535
+# stretched pixmaps of recent frames are kept up to this many bytes, a full resolution frame is tens of MB
+PIXMAP_CACHE_BYTES = 192 * 1024 * 1024
+BLINK_INTERVAL_MS = 500
+MOSAIC_TILE_SIZE = 480
+# polled units announce new frames only with their status, a remembered frame older than that may be outdated
+FRAME_REUSE_S = STATUS_INTERVAL_S
+# stretch shown while a histogram slider is dragged is computed on a frame about this wide
+HISTOGRAM_PROXY_WIDTH = 1024
+
+
+def value_or_none(pair_success_and_value):
+    ok, value = pair_success_and_value
+    return value if ok else None
+
+
+def format_exposure_us(exposure_us):
+    if exposure_us >= US_IN_SECOND:
+        return f"{exposure_us/US_IN_SECOND}s"
+    elif exposure_us >= US_IN_MILLISECOND:
+        return f"{exposure_us/US_IN_MILLISECOND}ms"
+    return f"{exposure_us}us"
 
 
 def normalize_image(img, is16b=False):
@@ -42,35 +90,54 @@ def normalize_image(img, is16b=False):
     return np.clip(maxv * normalized, 0, maxv-1).astype(typv)
 
 
+def stretch_to_16b(arr, a, b):
+    maxv = 65536
+    normalized = (arr - a) / (b - a)
+    return np.clip(maxv * normalized, 0, maxv - 1).astype(np.uint16)
+
+
+def grayscale16_view(qimage):
+    # (converted image, (h, w) uint16 array over its pixels), the array is valid as long as the image lives
+    working_image = qimage.convertToFormat(QImage.Format.Format_Grayscale16)
+    ptr = working_image.constBits()
+    ptr.setsize(working_image.height() * working_image.bytesPerLine())
+    rows = np.frombuffer(ptr, np.uint16).reshape(working_image.height(), working_image.bytesPerLine() // 2)
+    return working_image, rows[:, :working_image.width()]
+
+
+def histogram_bounds(hmin, hmax):
+    # we assume that signal will be in first 10% of histogram here:
+    maxv = 65536
+    return maxv * hmin / 1000.0, maxv * hmax / 1000.0
+
+
+@traced("qimage_from_buffer")
 def qimage_from_buffer(content, resolution, image_format):
     logger.debug(f"Creating image with format {image_format}")
-    is16b = (image_format == "RAW16")
-    buffer_type = np.uint16 if is16b else np.uint8
-    image_format = QImage.Format_Grayscale16 if is16b else QImage.Format_Grayscale8
-
-    img = np.frombuffer(content, dtype=buffer_type)
-    w, h = resolution
-    logger.debug(f"Reshaping into {h}x{w}...")
-    original_img = img.reshape(w, h)
-    logger.debug(f"dimension = {original_img.shape}, Max = {np.max(original_img)}, min = {np.min(original_img)}")
-    # final_img = normalize_image(original_img, is16b=is16b)
-    logger.debug("Normalized!")
-    q_img = QImage(original_img.data, original_img.shape[0], original_img.shape[1], image_format)
-    return q_img, original_img
+    frame = Frame.from_buffer(content, resolution, image_format)
+    qimage_format = QImage.Format_Grayscale16 if frame.data.dtype == np.uint16 else QImage.Format_Grayscale8
+    # no copy: the image points into the returned array, which has to outlive it
+    q_img = QImage(frame.data.data, frame.width, frame.height, frame.data.strides[0], qimage_format)
+    return q_img, frame.data
 
 
+@traced("save_to_unique_file_from_buffer")
 def save_to_unique_file_from_buffer(file_prefix, content, resolution, image_format):
     logger.debug(f"Creating image with format {image_format}")
-    is16b = (image_format == "RAW16")
-    buffer_type = np.uint16 if is16b else np.uint8
-    img = np.frombuffer(content, dtype=buffer_type)
-    w, h = resolution
-    logger.debug(f"Reshaping into {w}x{h}...")
-    original_img = img.reshape(h, w)
-    logger.debug(f"dimension = {original_img.shape}, Max = {np.max(original_img)}, min = {np.min(original_img)}")
-    # im = Image.fromarray(original_img)
-    # tiff_image =
+    return save_to_unique_file(file_prefix, Frame.from_buffer(content, resolution, image_format).data)
+
+
+def qimage_from_preview(preview):
+    return qimage_from_rgb(preview) if preview.ndim == 3 else qimage_from_array(preview)
 
+
+def tile_qimage(frame, tile_size=MOSAIC_TILE_SIZE):
+    # downsampled first, then stretched on its own percentiles - cheap off the GUI thread
+    return qimage_from_preview(preview_array(frame, tile_size, tile_size))
+
+
+def save_to_unique_file(file_prefix, original_img):
+    import tifffile
     try:
         cwd = os.getcwd()
         timestamp = str(time())
@@ -111,21 +178,40 @@ def connect_to_camera(camera_name, camera_index, current_ip):
 
 
 class ResizeableLabelWithImage(QLabel):
+    # (generation, cache key, stretched QImage) from the histogram thread
+    _stretch_ready = pyqtSignal(object)
+
     def __init__(self, parent, initial_image: QImage = None):
         QLabel.__init__(self, parent)
         # self.setMinimumSize(640, 480)
         self._hmin = 0
         self._hmax = 100
+        self._original_qimage = None
         if initial_image is not None:
             # initial_image = QImage("default.png")
             self._original_qimage = initial_image
             self._current_qimage = initial_image
             self._original_pixmap = QPixmap(self._original_qimage)
+            self._rendered_pixmap = self._original_pixmap
             self.setPixmap(self._original_pixmap)
+        # stretched pixmaps by (cache key, histogram settings), so going back to a frame needs no stretching
+        self._pixmap_cache = OrderedDict()
+        self._pixmap_cache_bytes = 0
+        self._cache_key = None
         self._zoom_factor = 1.0
         self._stretched = False
         self._grid = False
         self._histogram = False
+        # downsampled 16 bit copy of the original, stretched while a slider is dragged
+        self._proxy = None
+        self._proxy_pixmap = None
+        self._previewed = None
+        # full resolution stretches run one at a time off the GUI thread, a result older than the newest
+        # image or histogram setting is dropped
+        self._generation = 0
+        self._stretch_job = None
+        self._stretch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="histogram")
+        self._stretch_ready.connect(self._show_stretched)
 
     def zoom_in(self):
         self._zoom_factor *= 1.5
@@ -135,80 +221,181 @@ class ResizeableLabelWithImage(QLabel):
         self._zoom_factor /= 1.5
         self._update_image_size()
 
-    def adjust_histogram(self, hmin, hmax):
+    def _set_histogram(self, hmin, hmax):
         if hmin < 0 or hmax < 0 or hmin > 100 or hmax > 100 or hmax == hmin:
             return False
         self._histogram = True
         self._hmin = hmin
         self._hmax = hmax
+        # whatever full stretch is pending is for other settings now
+        self._generation += 1
+        if self._stretch_job is not None:
+            self._stretch_job.cancel()
+        return True
+
+    def preview_histogram(self, hmin, hmax):
+        # while a slider is dragged: the downsampled proxy is stretched right away, full resolution comes
+        # with adjust_histogram() when the slider is let go
+        if not self._set_histogram(hmin, hmax) or self._original_qimage is None:
+            return False
+        self._previewed = (hmin, hmax)
+        if self._show_cached() or self._is_color():
+            self._update_image_size()
+            return True
+        if self._proxy is None:
+            working_image, arr = grayscale16_view(self._original_qimage)
+            step = max(1, arr.shape[1] // HISTOGRAM_PROXY_WIDTH)
+            self._proxy = np.ascontiguousarray(arr[::step, ::step])
+        with tracer.span("histogram proxy"):
+            self._proxy_pixmap = QPixmap(qimage_from_array(
+                stretch_to_16b(self._proxy, *histogram_bounds(self._hmin, self._hmax))))
+        if self._grid:
+            self._draw_grid(self._proxy_pixmap)
+        self.update()
+        return True
+
+    def adjust_histogram(self, hmin, hmax):
+        if not self._set_histogram(hmin, hmax):
+            return False
+        if self._original_qimage is None:
+            return True
         logger.debug(f"Adjusting histogram to {self._hmin}/{self._hmax}")
-        self._process_with_histogram()
-        self._update_image_size()
+        if self._show_cached() or self._is_color():
+            self._update_image_size()
+            return True
+        if self._previewed != (hmin, hmax):
+            # e.g. moved by keys, nothing shown for these settings yet
+            self.preview_histogram(hmin, hmax)
+        self._stretch_job = self._stretch_executor.submit(self._stretch_full, self._generation, self._cache_key,
+                                                          self._original_qimage, self._hmin, self._hmax)
         return True
 
-    def _process_with_histogram(self):
-        qimage: QImage = self._original_qimage
-        working_image = qimage.convertToFormat(QImage.Format.Format_Grayscale16)
-        width = working_image.width()
-        height = working_image.height()
-        ptr = working_image.bits()
-        ptr.setsize(height * width * 2)
-        arr = np.frombuffer(ptr, np.uint16)
-        maxv = 65536
-        typv = np.uint16
-        # we assume that signal will be in first 10% of histogram here:
-        a = maxv*self._hmin/1000.0
-        b = maxv*self._hmax/1000.0
-        normalized = (arr - a) / (b - a)
+    def _stretch_full(self, generation, cache_key, qimage, hmin, hmax):
+        if generation != self._generation:
+            return
+        try:
+            stretched = self._process_with_histogram(qimage, hmin, hmax)
+        except Exception as e:
+            logger.error(f"Stretching failed: {e}")
+            return
+        self._stretch_ready.emit((generation, cache_key, stretched))
+
+    def _show_stretched(self, result):
+        generation, cache_key, stretched = result
+        if generation != self._generation:
+            logger.debug("Stretch is outdated, dropped")
+            return
+        self._current_qimage = stretched
+        with tracer.span("QPixmap from QImage"):
+            self._rendered_pixmap = QPixmap(stretched)
+        self._remember(self._render_key(cache_key))
+        self._update_image_size()
+
+    @staticmethod
+    @traced("_process_with_histogram")
+    def _process_with_histogram(qimage, hmin, hmax):
+        working_image, arr = grayscale16_view(qimage)
+        a, b = histogram_bounds(hmin, hmax)
         logger.debug(f"a={a}, b={b}")
-        new_arr = np.clip(maxv * normalized, 0, maxv - 1).astype(typv)
-        self._current_qimage = QImage(new_arr, width, height, QImage.Format.Format_Grayscale16)
+        return qimage_from_array(stretch_to_16b(arr, a, b))
 
+    @traced("_normalize_original")
     def _normalize_original(self):
-        qimage: QImage = self._original_qimage
-        working_image = qimage.convertToFormat(QImage.Format.Format_Grayscale16)
-        width = working_image.width()
-        height = working_image.height()
-        ptr = working_image.bits()
-        ptr.setsize(height * width * 2)
-        arr = np.frombuffer(ptr, np.uint16)
+        working_image, arr = grayscale16_view(self._original_qimage)
         a = np.percentile(arr, 1)
         b = np.percentile(arr, 99)
-        normalized = (arr - a) / (b - a)
         logger.debug(f"a={a}, b={b}")
-        maxv = 65536
-        typv = np.uint16
-        new_arr = np.clip(maxv * normalized, 0, maxv - 1).astype(typv)
-        self._current_qimage = QImage(new_arr, width, height, QImage.Format.Format_Grayscale16)
+        self._current_qimage = qimage_from_array(stretch_to_16b(arr, a, b))
 
-    def set_image(self, image: QImage):
+    def set_image(self, image: QImage, cache_key=None):
         self._original_qimage = image
-        if self._histogram:
-            self._process_with_histogram()
+        self._cache_key = cache_key
+        self._proxy = None
+        self._previewed = None
+        self._generation += 1
+        self._render()
+        self._update_image_size()
+
+    def _is_color(self):
+        return self._original_qimage.format() == QImage.Format_RGB888
+
+    def _render_key(self, cache_key):
+        return None if cache_key is None else (cache_key, self._histogram, self._hmin, self._hmax)
+
+    def _show_cached(self):
+        key = self._render_key(self._cache_key)
+        if key not in self._pixmap_cache:
+            return False
+        self._pixmap_cache.move_to_end(key)
+        self._rendered_pixmap = self._pixmap_cache[key]
+        return True
+
+    @staticmethod
+    def _pixmap_bytes(pixmap):
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+    def _remember(self, key):
+        if key is None:
+            return
+        if key in self._pixmap_cache:
+            self._pixmap_cache_bytes -= self._pixmap_bytes(self._pixmap_cache.pop(key))
+        self._pixmap_cache[key] = self._rendered_pixmap
+        self._pixmap_cache_bytes += self._pixmap_bytes(self._rendered_pixmap)
+        # the pixmap just rendered stays even if it alone is over the budget
+        while self._pixmap_cache_bytes > PIXMAP_CACHE_BYTES and len(self._pixmap_cache) > 1:
+            _, evicted = self._pixmap_cache.popitem(last=False)
+            self._pixmap_cache_bytes -= self._pixmap_bytes(evicted)
+
+    def _render(self):
+        if self._show_cached():
+            return
+        if self._is_color():
+            # color previews come already stretched per channel
+            self._current_qimage = self._original_qimage
+        elif self._histogram:
+            self._current_qimage = self._process_with_histogram(self._original_qimage, self._hmin, self._hmax)
         else:
             self._normalize_original()
-        self._update_image_size()
+        with tracer.span("QPixmap from QImage"):
+            self._rendered_pixmap = QPixmap(self._current_qimage)
+        self._remember(self._render_key(self._cache_key))
+
+    def shutdown(self):
+        self._stretch_executor.shutdown(wait=False, cancel_futures=True)
+
+    def paintEvent(self, event):
+        if self._proxy_pixmap is None:
+            return super(ResizeableLabelWithImage, self).paintEvent(event)
+        # the proxy is drawn over the place of the full image, scaling only the part that is exposed -
+        # a full size pixmap made out of it would cost more than the stretch itself
+        painter = QPainter(self)
+        painter.drawPixmap(QStyle.alignedRect(self.layoutDirection(), self.alignment(), self.pixmap().size(),
+                                              self.contentsRect()), self._proxy_pixmap)
+        painter.end()
 
+    @traced("_update_image_size")
     def _update_image_size(self):
-        self._original_pixmap = QPixmap(self._current_qimage)
+        self._proxy_pixmap = None
+        # grid is painted on a copy, cached pixmap stays clean
+        self._original_pixmap = self._rendered_pixmap.copy() if self._grid else self._rendered_pixmap
         if self._grid:
-            self._draw_grid()
-        w = self._current_qimage.width()
-        h = self._current_qimage.height()
+            self._draw_grid(self._original_pixmap)
+        w = self._rendered_pixmap.width()
+        h = self._rendered_pixmap.height()
         self._original_pixmap = self._original_pixmap.scaled(int(self._zoom_factor*w), int(self._zoom_factor*h), Qt.KeepAspectRatio)
         self.setPixmap(self._original_pixmap)
 
     def resizeEvent(self, event):
         self._update_image_size()
 
-    def _draw_grid(self):
-        painter = QPainter(self._original_pixmap)
+    def _draw_grid(self, pixmap):
+        painter = QPainter(pixmap)
         pen = QPen(Qt.red, 2)
         painter.setPen(pen)
         hdivisions = 9
         vdivisions = 9
-        max_w = self._original_pixmap.width()
-        max_h = self._original_pixmap.height()
+        max_w = pixmap.width()
+        max_h = pixmap.height()
         increment_w = int(max_w / hdivisions)
         for i in range(0, hdivisions):
             begin_x = int(increment_w * (i + 0.5))
@@ -231,48 +418,133 @@ class ResizeableLabelWithImage(QLabel):
         self._update_image_size()
 
 
-def get_last_image_as_qimage(unit_name, camera_index):
-    is_ok1, (w, h) = CameraRequester(unit_name, camera_index).get_resolution()
-    is_ok2, current_format = CameraRequester(unit_name, camera_index).get_current_format()
-    if not is_ok1 or not is_ok2:
-        logger.error("Could not get required image parameters from camera")
-        return None
-    start_time = time()
-    response = CameraRequester(unit_name, camera_index).get_last_image(send_as_jpg=False)
-    time_elapsed = time() - start_time
-    logger.debug(f"Time elapsed on receiving response: {time_elapsed}s")
-    if response is None:
-        return response
-    q_img, _ = qimage_from_buffer(response.content, [w, h], current_format)
-    return q_img
+def get_last_image_as_qimage(unit_name, camera_index, calibrator=None):
+    frame = get_last_image_as_array(unit_name, camera_index)
+    if frame is None:
+        return frame
+    if calibrator is not None:
+        frame = calibrator.apply(frame)
+    return qimage_from_array(frame)
 
 
-def save_last_image_locally(unit_name, camera_index):
-    is_ok1, (w, h) = CameraRequester(unit_name, camera_index).get_resolution()
-    is_ok2, current_format = CameraRequester(unit_name, camera_index).get_current_format()
+@traced("get_last_image_for")
+def get_last_image_for(unit_name, camera_index, purpose):
+    # returns (Frame, TransferReport) or (None, None), transfer format is chosen by the unit's transfer policy.
+    # RAW frames are remembered in latest_frames until the unit announces the next one.
+    generation = latest_frames.generation(unit_name)
+    requester = CameraRequester(unit_name, camera_index)
+    is_ok1, resolution = requester.get_resolution()
+    is_ok2, current_format = requester.get_current_format()
     if not is_ok1 or not is_ok2:
         logger.error("Could not get required image parameters from camera")
-        return None
-    start_time = time()
-    response = CameraRequester(unit_name, camera_index).get_last_image(send_as_jpg=False)
-    time_elapsed = time() - start_time
+        return None, None
+    w, h = resolution
+    is16b = (current_format == "RAW16")
+    raw_bytes = w * h * (2 if is16b else 1)
+    policy = policy_for(unit_name)
+    choice = policy.choose(purpose, w * h, raw_bytes, requester.health().throughput_bps)
+    as_jpg = (choice.format == TRANSFER_JPG)
+    logger.debug(f"Getting last image from {unit_name} for {purpose} as {choice} ({choice.reason})")
+    start_time = perf_counter()
+    response = requester.get_last_image(send_as_jpg=as_jpg, expected_bytes=None if as_jpg else raw_bytes,
+                                        quality=choice.quality)
+    time_elapsed = perf_counter() - start_time
     logger.debug(f"Time elapsed on receiving response: {time_elapsed}s")
+    if not as_jpg:
+        policy.record_raw(response is not None)
     if response is None:
-        return response
-    kkk = save_to_unique_file_from_buffer(unit_name, response.content, [w, h], current_format)
-    logger.debug("Saved last image to tiff")
+        return None, None
+    start_time = perf_counter()
+    with tracer.span("decode", format=str(choice), bytes=len(response.content)):
+        if as_jpg:
+            frame = Frame(decode_jpeg(response.content), unit_name, camera_index, current_format, choice.format)
+            policy.record_jpg(choice.quality, w * h, len(response.content))
+        else:
+            frame = Frame.from_buffer(response.content, (w, h), current_format, unit_name=unit_name,
+                                      camera_index=camera_index, transfer_format=choice.format)
+            latest_frames.store(frame, generation)
+    return frame, TransferReport(choice, len(response.content), time_elapsed, perf_counter() - start_time)
+
+
+def get_last_frame_data(unit_name, camera_index, purpose):
+    frame, _ = get_last_image_for(unit_name, camera_index, purpose)
+    return None if frame is None else frame.data
+
+
+def get_last_image_as_array(unit_name, camera_index):
+    return get_last_frame_data(unit_name, camera_index, PURPOSE_MEASURE)
+
+
+def qimage_from_array(arr):
+    if arr.ndim == 3:
+        return qimage_from_rgb(arr)
+    image_format = QImage.Format_Grayscale16 if arr.dtype == np.uint16 else QImage.Format_Grayscale8
+    h, w = arr.shape
+    # copy so that the image does not point into a numpy buffer that may go away
+    return QImage(arr.data, w, h, arr.strides[0], image_format).copy()
+
+
+def save_frame_locally(frame: Frame, calibrator=None, writer=None, metadata=None):
+    writer = writer or FrameWriter(FORMAT_TIFF)
+    if calibrator is not None:
+        kkk = writer.write(f"{frame.unit_name}_calibrated", calibrator.apply(frame.data), metadata)
+    else:
+        kkk = writer.write(frame.unit_name, frame.data, metadata)
+    logger.debug(f"Saved {frame} as {writer.output_format}")
     return kkk
 
 
 class ImageView(QWidget):
-    def __init__(self):
+    # (live stack, fetched frame or None, stacked image or None) from the stacking thread
+    _stack_updated = pyqtSignal(object)
+    # (unit name, camera index, frame or None, TransferReport or None) from the fetching thread
+    _frame_fetched = pyqtSignal(object)
+
+    def __init__(self, metadata_provider=None):
         super(ImageView, self).__init__()
+        # metadata_provider(unit_name) -> {"exposure_us", "gain", "temperature"} stored along frames in history
+        self._metadata_provider = metadata_provider
+        self._histories = {}
+        self._blink_sequence = None
+        self._blink_on_marked = False
+        self._blink_timer = QTimer(self)
+        self._blink_timer.timeout.connect(self._blink)
+        self._live_stack = None
+        self._calibrator = None
+        self._bayer_pattern = None
+        self._stack_pending = False
+        self._stack_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stack")
+        self._stack_updated.connect(self._show_stack)
+        self._fetch_pending = False
+        # purpose of a fetch asked for while another one was in flight, done as soon as that one ends
+        self._refetch_purpose = None
+        self._fetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fetch")
+        self._frame_fetched.connect(self._show_fetched)
         self._main_layout = QHBoxLayout()
         self._image_label = ResizeableLabelWithImage(parent=self, initial_image=QImage("default.png"))
         scroll = QScrollArea()
         scroll.setWidget(self._image_label)
         scroll.setWidgetResizable(True)
-        self._main_layout.addWidget(scroll)
+        image_layout = QVBoxLayout()
+        image_layout.addWidget(scroll)
+
+        history_layout = QHBoxLayout()
+        self._history_slider = QSlider(Qt.Horizontal)
+        self._history_slider.setRange(0, 0)
+        self._history_slider.valueChanged.connect(self._history_moved)
+        history_layout.addWidget(self._history_slider)
+        self._history_label = QLabel("No frames")
+        history_layout.addWidget(self._history_label)
+        mark_button = QPushButton("Mark for blink")
+        mark_button.clicked.connect(self._mark_for_blink)
+        history_layout.addWidget(mark_button)
+        self._blink_button = QPushButton("Blink")
+        self._blink_button.setCheckable(True)
+        self._blink_button.setStyleSheet("background-color : black")
+        self._blink_button.clicked.connect(self._blink_clicked)
+        history_layout.addWidget(self._blink_button)
+        image_layout.addLayout(history_layout)
+        self._main_layout.addLayout(image_layout)
         self._current_index = -1
         self._current_name = ""
         button_layout = QVBoxLayout()
@@ -281,12 +553,40 @@ class ImageView(QWidget):
         refresh_button.clicked.connect(self._refresh)
         button_layout.addWidget(refresh_button)
 
+        self._auto_refresh_button = QPushButton("Auto refresh")
+        self._auto_refresh_button.setCheckable(True)
+        self._auto_refresh_button.setToolTip("Fetch a preview whenever the camera reports a new frame")
+        button_layout.addWidget(self._auto_refresh_button)
+
+        self._transfer_label = QLabel("")
+        self._transfer_label.setWordWrap(True)
+        button_layout.addWidget(self._transfer_label)
+
         self._grid_button = QPushButton("Grid ON")
         self._grid_button.clicked.connect(self._grid_on_clicked)
         self._grid_button.setCheckable(True)
         self._grid_button.setStyleSheet("background-color : black")
         button_layout.addWidget(self._grid_button)
 
+        self._live_stack_button = QPushButton("Live stack")
+        self._live_stack_button.setCheckable(True)
+        self._live_stack_button.setStyleSheet("background-color : black")
+        self._live_stack_button.clicked.connect(self._live_stack_clicked)
+        button_layout.addWidget(self._live_stack_button)
+
+        self._stack_mode = QComboBox()
+        self._stack_mode.addItems(STACK_MODES)
+        button_layout.addWidget(self._stack_mode)
+
+        self._stack_label = QLabel("")
+        button_layout.addWidget(self._stack_label)
+
+        self._color_mode = QComboBox()
+        self._color_mode.addItems(DEBAYER_MODES)
+        self._color_mode.setCurrentText(DEBAYER_SUPERPIXEL)
+        self._color_mode.currentTextChanged.connect(self._color_mode_changed)
+        button_layout.addWidget(self._color_mode)
+
         zoom_in_button = QPushButton("Zoom in (+)")
         zoom_in_button.clicked.connect(self._zoom_in)
         button_layout.addWidget(zoom_in_button)
@@ -308,11 +608,13 @@ class ImageView(QWidget):
         self._slider_min = QSlider(Qt.Vertical)
         self._slider_min.sliderReleased.connect(self._slider_released)
         self._slider_min.setValue(0)
+        self._slider_min.valueChanged.connect(self._slider_moved)
         self._main_layout.addWidget(self._slider_min)
 
         self._slider_max = QSlider(Qt.Vertical)
         self._slider_max.setValue(100)
         self._slider_max.sliderReleased.connect(self._slider_released)
+        self._slider_max.valueChanged.connect(self._slider_moved)
         self._main_layout.addWidget(self._slider_max)
         self.setLayout(self._main_layout)
 
@@ -342,56 +644,513 @@ class ImageView(QWidget):
         logger.debug(f"New max/min = {maxp}/{minp}")
         self._image_label.adjust_histogram(minp, maxp)
 
+    def _slider_moved(self, _):
+        if self._slider_min.isSliderDown() or self._slider_max.isSliderDown():
+            self._image_label.preview_histogram(self._slider_min.value(), self._slider_max.value())
+        else:
+            # keys and clicks beside the handle move it without a release
+            self._slider_released()
+
+    def set_calibrator(self, calibrator):
+        self._calibrator = calibrator
+
     def _refresh(self):
-        q_image = get_last_image_as_qimage(self._current_name, self._current_index)
-        self._image_label.set_image(q_image)
+        self._fetch(PURPOSE_VIEW)
+
+    def _fetch(self, purpose):
+        if self._fetch_pending:
+            logger.debug("Previous frame is still being fetched, fetching again after it")
+            # a view asked for by the user is not downgraded by a live update coming meanwhile
+            if self._refetch_purpose != PURPOSE_VIEW:
+                self._refetch_purpose = purpose
+            return
+        self._fetch_pending = True
+        self._transfer_label.setText("Fetching...")
+        self._fetch_executor.submit(self._fetch_frame, self._current_name, self._current_index, self._calibrator,
+                                    purpose)
+
+    def _fetch_frame(self, unit_name, camera_index, calibrator, purpose):
+        frame, report = None, None
+        try:
+            frame, report = get_last_image_for(unit_name, camera_index, purpose)
+            # masters are in RAW units, JPG previews cannot be calibrated with them
+            if frame is not None and calibrator is not None and frame.transfer_format == TRANSFER_RAW:
+                with tracer.span("calibrate"):
+                    frame = frame.with_data(calibrator.apply(frame.data))
+        except Exception as e:
+            logger.error(f"Exception while fetching frame from {unit_name}: {e}")
+        self._frame_fetched.emit((unit_name, camera_index, frame, report))
+
+    def _show_fetched(self, result):
+        unit_name, camera_index, frame, report = result
+        self._fetch_pending = False
+        refetch_purpose, self._refetch_purpose = self._refetch_purpose, None
+        if (unit_name, camera_index) != (self._current_name, self._current_index):
+            # camera was switched meanwhile, its own frame is fetched now
+            self._fetch(refetch_purpose or PURPOSE_VIEW)
+            return
+        self._transfer_label.setText("Fetching failed" if report is None else report.text())
+        self._show_frame(frame)
+        if refetch_purpose is not None:
+            self._fetch(refetch_purpose)
+
+    def _history(self):
+        key = (self._current_name, self._current_index)
+        if key not in self._histories:
+            self._histories[key] = FrameHistory(f"{self._current_name}_{self._current_index}")
+        return self._histories[key]
+
+    def _add_to_history(self, frame):
+        if frame is None:
+            return
+        metadata = self._metadata_provider(self._current_name) if self._metadata_provider is not None else {}
+        history = self._history()
+        history.append(frame, **metadata)
+        self._history_slider.blockSignals(True)
+        self._history_slider.setRange(0, len(history) - 1)
+        self._history_slider.setValue(len(history) - 1)
+        self._history_slider.blockSignals(False)
+        self._update_history_label(len(history) - 1)
+
+    def _show_frame(self, frame: Frame):
+        if frame is None:
+            return
+        self._add_to_history(frame.data)
+        self._history_moved(self._history_slider.value())
+
+    def _debayer_mode(self):
+        return DEBAYER_OFF if self._bayer_pattern is None else self._color_mode.currentText()
+
+    @traced("_frame_qimage")
+    def _frame_qimage(self, frame):
+        # frames that already are RGB (color JPG previews) are not debayered
+        mode = self._debayer_mode() if frame.ndim == 2 else DEBAYER_OFF
+        if mode == DEBAYER_OFF:
+            return qimage_from_array(frame)
+        return color_qimage(frame, self._bayer_pattern, mode)
+
+    def _color_mode_changed(self, _):
+        if self._live_stack is None and len(self._history()) > 0:
+            self._history_moved(self._history_slider.value())
+
+    def _show_history_frame(self, position):
+        history = self._history()
+        metadata = history.metadata(position)
+        self._image_label.set_image(self._frame_qimage(history.frame(position)), cache_key=(
+            self._current_name, self._current_index, metadata["sequence"], self._debayer_mode()))
+
+    def _history_moved(self, position):
+        if len(self._history()) == 0:
+            return
+        self._update_history_label(position)
+        self._show_history_frame(position)
+
+    def _update_history_label(self, position):
+        metadata = self._history().metadata(position)
+        # unknown values are stored as NaN
+        exposure = "?" if np.isnan(metadata["exposure_us"]) else format_exposure_us(int(metadata["exposure_us"]))
+        gain = "?" if np.isnan(metadata["gain"]) else f"{metadata['gain']:g}"
+        temperature = "?" if np.isnan(metadata["temperature"]) else f"{metadata['temperature']:.1f}"
+        self._history_label.setText(f"#{metadata['sequence']} {strftime('%H:%M:%S', localtime(metadata['timestamp']))}, "
+                                    f"exp {exposure}, gain {gain}, temp {temperature}C")
+
+    def _mark_for_blink(self):
+        history = self._history()
+        if len(history) == 0:
+            return
+        self._blink_sequence = history.metadata(self._history_slider.value())["sequence"]
+        logger.debug(f"Marked frame #{self._blink_sequence} for blinking")
+
+    def _blink_clicked(self):
+        if self._blink_button.isChecked() and self._blink_sequence is not None:
+            self._blink_button.setStyleSheet("background-color : #228822")
+            self._blink_timer.start(BLINK_INTERVAL_MS)
+        else:
+            self._stop_blink()
+
+    def _stop_blink(self):
+        self._blink_timer.stop()
+        self._blink_button.setChecked(False)
+        self._blink_button.setStyleSheet("background-color : black")
+        self._blink_on_marked = False
+
+    def _blink(self):
+        history = self._history()
+        marked = history.position_of(self._blink_sequence)
+        if marked is None:
+            logger.info("Marked frame is no longer in history, stopping blink")
+            self._stop_blink()
+            return
+        self._blink_on_marked = not self._blink_on_marked
+        self._show_history_frame(marked if self._blink_on_marked else self._history_slider.value())
+
+    def shutdown(self):
+        self._fetch_executor.shutdown(wait=False, cancel_futures=True)
+        self._stack_executor.shutdown(wait=False, cancel_futures=True)
+        self._image_label.shutdown()
+        self._stop_blink()
+        for history in self._histories.values():
+            history.close()
+        self._histories = {}
+
+    def _live_stack_clicked(self):
+        if self._live_stack_button.isChecked():
+            self._live_stack = LiveStack(self._stack_mode.currentText(),
+                                         shift_step=1 if self._bayer_pattern is None else 2)
+            self._live_stack_button.setStyleSheet("background-color : #228822")
+            self._stack_mode.setEnabled(False)
+            self._stack_label.setText("Waiting for frame...")
+            self._stack_next_frame()
+        else:
+            self._stop_live_stack()
+
+    def _stop_live_stack(self):
+        self._live_stack = None
+        self._live_stack_button.setChecked(False)
+        self._live_stack_button.setStyleSheet("background-color : black")
+        self._stack_mode.setEnabled(True)
+
+    def new_frame_ready(self, unit_name):
+        if unit_name != self._current_name:
+            return
+        if self._live_stack is not None:
+            self._stack_next_frame()
+        elif self._auto_refresh_button.isChecked() and self.isVisible():
+            self._fetch(PURPOSE_LIVE)
+
+    def _stack_next_frame(self):
+        if self._stack_pending:
+            logger.debug("Previous frame is still being stacked, skipping this one")
+            return
+        self._stack_pending = True
+        self._stack_executor.submit(self._stack_frame, self._live_stack, self._calibrator, self._current_name,
+                                    self._current_index)
+
+    def _stack_frame(self, live_stack, calibrator, unit_name, camera_index):
+        image = None
+        try:
+            frame = get_last_image_as_array(unit_name, camera_index)
+            if frame is not None and calibrator is not None:
+                frame = calibrator.apply(frame)
+            if frame is not None and live_stack.add(frame):
+                image = np.clip(live_stack.image, 0, MAX_16B_VALUE).astype(np.uint16)
+        except Exception as e:
+            logger.error(f"Exception while stacking frame from {unit_name}: {e}")
+            frame = None
+        self._stack_updated.emit((live_stack, frame, image))
+
+    def _show_stack(self, result):
+        live_stack, frame, image = result
+        self._stack_pending = False
+        # stack could have been stopped or restarted in the meantime
+        if live_stack is not self._live_stack:
+            return
+        self._add_to_history(frame)
+        self._stack_label.setText(f"{live_stack.frames_stacked} stacked, {live_stack.frames_rejected} rejected")
+        if image is not None:
+            self._image_label.set_image(self._frame_qimage(image))
 
     def _move_focuser(self, value):
         if self._current_index < 0 or len(self._current_name) < 1:
             return
         CameraRequester(self._current_name, self._current_index).move_focuser(value)
 
-    def set_image_and_camera(self, q_image: QImage, current_index: int, current_name: str):
+    def set_camera(self, current_index: int, current_name: str, bayer_pattern=None):
+        self._bayer_pattern = bayer_pattern
+        if (current_name, current_index) != (self._current_name, self._current_index):
+            self._stop_live_stack()
+            self._stop_blink()
+            self._blink_sequence = None
         self._current_index = current_index
         self._current_name = current_name
         CameraRequester(current_name, current_index).connect_focuser()
-        self._image_label.set_image(q_image)
+        self._refresh()
 
 
 class ViewImageWindow(QMainWindow):
-    def __init__(self, parent):
+    def __init__(self, parent, metadata_provider=None):
         super(ViewImageWindow, self).__init__(parent)
         self.setWindowIcon(QIcon('4lufy.ico'))
-        self._main_view = ImageView()
+        self._main_view = ImageView(metadata_provider)
         self.setCentralWidget(self._main_view)
 
-    def show_yourself(self, unit_name, camera_index):
-        q_image = get_last_image_as_qimage(unit_name, camera_index)
+    def set_calibrator(self, calibrator):
+        self._main_view.set_calibrator(calibrator)
+
+    def show_yourself(self, unit_name, camera_index, calibrator=None, bayer_pattern=None):
+        self.set_calibrator(calibrator)
         self.setWindowTitle(f"View last image from {unit_name}")
-        self._main_view.set_image_and_camera(q_image, camera_index, unit_name)
+        self._main_view.set_camera(camera_index, unit_name, bayer_pattern)
+        self.show()
+
+    def new_frame_ready(self, unit_name):
+        self._main_view.new_frame_ready(unit_name)
+
+    def shutdown(self):
+        self._main_view.shutdown()
+
+
+class MosaicTile(QWidget):
+    clicked = pyqtSignal(str)
+
+    def __init__(self, unit_name):
+        super(MosaicTile, self).__init__()
+        self.unit_name = unit_name
+        layout = QVBoxLayout()
+        self._image_label = QLabel("Fetching...")
+        self._image_label.setAlignment(Qt.AlignCenter)
+        self._image_label.setMinimumSize(MOSAIC_TILE_SIZE // 2, MOSAIC_TILE_SIZE // 3)
+        # pixmap follows the tile size, not the other way round
+        self._image_label.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
+        self._image_label.setStyleSheet("background-color : black")
+        layout.addWidget(self._image_label, stretch=1)
+        self._caption = QLabel(unit_name)
+        self._caption.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Fixed)
+        layout.addWidget(self._caption)
+        self.setLayout(layout)
+        self.setToolTip(f"Open {unit_name} in the single camera view")
+        self._pixmap = None
+
+    def set_image(self, image: QImage, caption):
+        if image is not None:
+            self._pixmap = QPixmap(image)
+            self._fit_pixmap()
+        self._caption.setText(caption)
+
+    def _fit_pixmap(self):
+        if self._pixmap is not None:
+            self._image_label.setPixmap(self._pixmap.scaled(self._image_label.size(), Qt.KeepAspectRatio,
+                                                            Qt.SmoothTransformation))
+
+    def resizeEvent(self, event):
+        super(MosaicTile, self).resizeEvent(event)
+        self._fit_pixmap()
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.clicked.emit(self.unit_name)
+
+
+class MosaicWindow(QMainWindow):
+    # (unit name, QImage or None, caption) from the fetching threads
+    _tile_fetched = pyqtSignal(object)
+    unit_clicked = pyqtSignal(str)
+
+    def __init__(self, parent, max_units):
+        super(MosaicWindow, self).__init__(parent)
+        self.setWindowIcon(QIcon('4lufy.ico'))
+        self.setWindowTitle("All cameras")
+        self._tiles = {}
+        self._targets = {}
+        self._calibrator = None
+        # a unit has one fetch at a time, a frame announced meanwhile is fetched right after
+        self._pending = set()
+        self._refetch = set()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_units), thread_name_prefix="mosaic")
+        self._tile_fetched.connect(self._show_tile)
+        central = QWidget()
+        layout = QVBoxLayout()
+        self._grid = QGridLayout()
+        layout.addLayout(self._grid)
+        refresh_button = QPushButton("Refresh all")
+        refresh_button.clicked.connect(lambda: self._fetch_all(PURPOSE_VIEW))
+        layout.addWidget(refresh_button)
+        central.setLayout(layout)
+        self.setCentralWidget(central)
+        self.resize(2 * MOSAIC_TILE_SIZE, 2 * MOSAIC_TILE_SIZE * 3 // 4)
+
+    def show_yourself(self, targets, calibrator=None):
+        # targets: {unit name: camera index} of reachable units
+        self._calibrator = calibrator
+        if list(targets) != list(self._targets):
+            self._build_tiles(targets)
+        self._targets = dict(targets)
         self.show()
+        self._fetch_all(PURPOSE_VIEW)
+
+    def _build_tiles(self, targets):
+        for tile in self._tiles.values():
+            self._grid.removeWidget(tile)
+            tile.deleteLater()
+        self._tiles = {}
+        columns = max(1, int(np.ceil(np.sqrt(len(targets)))))
+        for position, unit_name in enumerate(targets):
+            tile = MosaicTile(unit_name)
+            tile.clicked.connect(self.unit_clicked.emit)
+            self._grid.addWidget(tile, position // columns, position % columns)
+            self._tiles[unit_name] = tile
+
+    def _fetch_all(self, purpose):
+        for unit_name in self._targets:
+            self._fetch(unit_name, purpose)
+
+    def _fetch(self, unit_name, purpose):
+        if unit_name in self._pending:
+            self._refetch.add(unit_name)
+            return
+        self._pending.add(unit_name)
+        self._executor.submit(self._fetch_tile, unit_name, self._targets[unit_name], self._calibrator, purpose)
+
+    def _fetch_tile(self, unit_name, camera_index, calibrator, purpose):
+        image, caption = None, f"{unit_name}: fetching failed"
+        try:
+            frame, report = get_last_image_for(unit_name, camera_index, purpose)
+            if frame is not None:
+                data = frame.data
+                if calibrator is not None and frame.transfer_format == TRANSFER_RAW:
+                    with tracer.span("calibrate"):
+                        data = calibrator.apply(data)
+                image = tile_qimage(data)
+                caption = f"{unit_name} {strftime('%H:%M:%S')}: {report.text()}"
+        except Exception as e:
+            logger.error(f"Exception while fetching mosaic tile of {unit_name}: {e}")
+        self._tile_fetched.emit((unit_name, image, caption))
+
+    def _show_tile(self, result):
+        unit_name, image, caption = result
+        self._pending.discard(unit_name)
+        if unit_name in self._tiles:
+            self._tiles[unit_name].set_image(image, caption)
+        if unit_name in self._refetch:
+            self._refetch.discard(unit_name)
+            if unit_name in self._targets:
+                self._fetch(unit_name, PURPOSE_LIVE)
+
+    def new_frame_ready(self, unit_name):
+        if self.isVisible() and unit_name in self._targets:
+            self._fetch(unit_name, PURPOSE_LIVE)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class UnitEventBridge(QObject):
+    # subscriptions call back from their own threads, the signal delivers events on the GUI thread
+    event_received = pyqtSignal(str, str, object)
 
 
 class WelcomeView(QWidget):
+    # (masters directory, Calibrator or exception) from the calibration thread
+    _calibration_loaded = pyqtSignal(object)
+    # (unit name, uint8 preview array, timestamp) from the thumbnail workers
+    _thumbnail_ready = pyqtSignal(object)
+
     def __init__(self, config):
         super(WelcomeView, self).__init__()
         self._config = config
+        # before anything talks to the units: record the session or answer from a recording
+        transport.install_from_config(self._config)
         self._kill_event = Event()
+        self._tasks_ended = False
         self._task_events = {}
+        self._subscriptions = {}
+        self._scheduler = None
+        self._progress = ProgressTracker()
+        self._calibrator = None
+        self._telemetry = TelemetryStore()
+        # every frame saved locally is measured in the background and indexed
+        self._quality = QualityAnalyzer(self._config.get("quality_index", DEFAULT_INDEX_PATH))
+        self._writer = FrameWriter(self._config.get("output_format", DEFAULT_OUTPUT_FORMAT),
+                                   on_written=self._quality.frame_written)
+        self._calibration_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="masters")
+        self._calibration_loaded.connect(self._masters_loaded)
+        self._thumbnails = Thumbnailer(lambda unit_name, preview, timestamp: self._thumbnail_ready.emit(
+            (unit_name, preview, timestamp)), max_workers=max(1, len(self._config["units"])))
+        self._thumbnail_ready.connect(self._show_thumbnail)
+        self._unit_events = UnitEventBridge(self)
+        self._unit_events.event_received.connect(self._unit_event)
+        self._model = UnitTableModel(self._config["units"], parent=self)
         self._prepare_ui()
-
-    def _add_task(self, refresh_rate, callback, unique_name):
-        start_repeated_task(self, callback, refresh_rate)
-        # new_refresh_event = Event()
-        # logger.debug("About to start new task")
-        # self._task_events[unique_name] = new_refresh_event
-        # start_interval_polling(new_refresh_event, callback, refresh_rate, self._kill_event)
+        # a central widget gets no closeEvent when the main window closes, quitting the application is what ends it;
+        # the trace and a traffic recording are finished first and on their own, a failing teardown must not lose them
+        QApplication.instance().aboutToQuit.connect(self._export_trace)
+        QApplication.instance().aboutToQuit.connect(transport.close_current)
+        QApplication.instance().aboutToQuit.connect(self._end_tasks)
+
+    def _prepare_polling(self):
+        self._scheduler = PollingScheduler(self, self._fleet_targets)
+        self._scheduler.add_metric(PolledMetric(
+            "status", lambda u, i: value_or_none(CameraRequester(u, i).get_status()),
+            lambda results: self._apply_polled(STATUS_EVENT, results), self._status_interval))
+        self._scheduler.add_metric(PolledMetric(
+            "temperature", lambda u, i: value_or_none(CameraRequester(u, i).get_temperature()),
+            lambda results: self._apply_polled(TEMPERATURE_EVENT, results), self._temperature_interval))
+        self._scheduler.add_metric(PolledMetric(
+            "cooler", lambda u, i: value_or_none(CameraRequester(u, i).get_cooler_on()),
+            self._apply_cooler, lambda u: COOLER_INTERVAL_S))
+        self._scheduler.add_metric(PolledMetric(
+            "cooler_power", self._fetch_cooler_power, self._apply_cooler_power, lambda u: COOLER_POWER_INTERVAL_S,
+            requests_per_fetch=2))
+        self._scheduler.sweep_finished.connect(self._refresh_polling_label)
+        self._scheduler.start()
+
+    def _is_pushing(self, unit_name):
+        subscription = self._subscriptions.get(unit_name)
+        return subscription is not None and subscription.is_pushing
+
+    def _status_interval(self, unit_name):
+        if self._is_pushing(unit_name):
+            return None
+        return STATUS_WHILE_SAVING_INTERVAL_S if self._model.state(unit_name).is_saving else STATUS_INTERVAL_S
+
+    def _temperature_interval(self, unit_name):
+        return None if self._is_pushing(unit_name) else TEMPERATURE_INTERVAL_S
+
+    def _apply_cooler(self, results):
+        self._model.update_units({u: {"cooler_on": v} for u, v in results.items()})
+        for unit_name, cooler_on in results.items():
+            self._telemetry.record(unit_name, cooler_on=cooler_on)
+
+    @staticmethod
+    def _fetch_cooler_power(unit_name, camera_index):
+        # only for the telemetry history, the table does not show these; two requests, see requests_per_fetch
+        requester = CameraRequester(unit_name, camera_index)
+        power = value_or_none(requester.get_cooler_power())
+        if power is None:
+            return None
+        return {"cooler_power": power, "set_temperature": value_or_none(requester.get_set_temp())}
+
+    def _apply_cooler_power(self, results):
+        for unit_name, values in results.items():
+            self._telemetry.record(unit_name, **values)
+
+    def _apply_polled(self, event_type, results):
+        for unit_name, value in results.items():
+            self._unit_event(unit_name, event_type, value)
+
+    def _refresh_polling_label(self, metric_name):
+        self._polling_label.setText(f"Polling: {self._scheduler.request_budget():.2f} req/s")
+        self._polling_label.setToolTip("\n".join(
+            f"{e['unit']} {e['metric']}: every {e['interval_s']}s, due in {e['due_in_s']:.1f}s, failures={e['failures']}"
+            for e in self._scheduler.schedule() if e["interval_s"] is not None))
 
     def _end_tasks(self):
+        if getattr(self, "_tasks_ended", False):
+            return
+        self._tasks_ended = True
         print("===== ENDING TASKS!")
+        self._export_trace()
         self._kill_event.set()
+        self._calibration_executor.shutdown(wait=False, cancel_futures=True)
+        self._writer.shutdown()
+        self._quality.shutdown(wait=False)
+        self._thumbnails.shutdown()
+        if self._config.get("telemetry_file"):
+            self._telemetry.dump(self._config["telemetry_file"])
+        transport.close_current()
+        if hasattr(self, "_view_image_window"):
+            self._view_image_window.shutdown()
+        if hasattr(self, "_drift_window"):
+            self._drift_window.shutdown()
+        if hasattr(self, "_mosaic_window"):
+            self._mosaic_window.shutdown()
+        if self._scheduler is not None:
+            self._scheduler.stop()
         for task_event in self._task_events.values():
             task_event.set()
+        for subscription in self._subscriptions.values():
+            subscription.stop()
+        self._subscriptions = {}
 
     def __del__(self):
         self._end_tasks()
@@ -427,356 +1186,480 @@ class WelcomeView(QWidget):
         self._solved_dec = QLabel("<unknown>")
         initial_coordinates_layout.addWidget(self._solved_dec)
         self._main_layout.addLayout(initial_coordinates_layout)
-        self._grid = QGridLayout()
 
-        CURRENT_COL = 0
-        self._grid.addWidget(QLabel("Unit name"), 0, CURRENT_COL)
-        CURRENT_COL += 1
-
-        self._grid.addWidget(QLabel("Pingable"), 0, CURRENT_COL)
+        fleet_layout = QHBoxLayout()
         ping_button = QPushButton("Ping units")
         ping_button.clicked.connect(self._ping_units)
-        self._grid.addWidget(ping_button, 1, CURRENT_COL)
-        CURRENT_COL += 1
-
-        self._grid.addWidget(QLabel("Reachable"), 0, CURRENT_COL)
-        CURRENT_COL += 1
+        fleet_layout.addWidget(ping_button)
 
-        self._grid.addWidget(QLabel("Cameras"), 0, CURRENT_COL)
         refresh_servers_button = QPushButton("Restart inactive servers")
         refresh_servers_button.clicked.connect(self._refresh_servers)
-        self._grid.addWidget(refresh_servers_button, 1, CURRENT_COL)
+        fleet_layout.addWidget(refresh_servers_button)
         ##################################################################################
         # TODO: refresh should again go through all unit_names, ask cameras_list on them and put results into ComboBoxes
         # TODO: if a camera is already in a state that makes it being regularly requested then do not refresh it!
-        CURRENT_COL += 1
 
-        self._grid.addWidget(QLabel("Status"), 0, CURRENT_COL)
-        CURRENT_COL += 1
+        fleet_layout.addWidget(QPushButton("Calculate offsets"))
 
-        self._grid.addWidget(QLabel("Cameras offsets"), 0, CURRENT_COL)
-        self._grid.addWidget(QPushButton("Calculate"), 1, CURRENT_COL)
-        CURRENT_COL += 1
-
-        WIDTH = 3
-        self._grid.addWidget(QLabel("Last image"), 0, CURRENT_COL, 1, WIDTH)
-        CURRENT_COL += WIDTH
-
-        self._grid.addWidget(QLabel("Exposure"), 0, CURRENT_COL)
-        CURRENT_COL += 1
-
-        self._grid.addWidget(QLabel("Gain"), 0, CURRENT_COL)
-        CURRENT_COL += 1
-
-        self._grid.addWidget(QLabel("Cooling"), 0, CURRENT_COL)
-        self._all_coolers_button = QPushButton("Turn on")
+        self._all_coolers_button = QPushButton("Turn on coolers")
         self._all_coolers_button.setCheckable(True)
         self._all_coolers_button.setStyleSheet("background-color : black")
         self._all_coolers_button.clicked.connect(self._turn_all_coolers)
-        self._grid.addWidget(self._all_coolers_button, 1, CURRENT_COL)
-        # TODO: This button should update text on apropriate labels.
-        CURRENT_COL += 1
-
-        self._grid.addWidget(QLabel("Current temp [C]"), 0, CURRENT_COL)
-        # TODO should ask for current temp every few seconds
-        CURRENT_COL += 1
+        fleet_layout.addWidget(self._all_coolers_button)
 
-        self._grid.addWidget(QLabel("Set temp [C]"), 0, CURRENT_COL)
+        fleet_layout.addWidget(QLabel("Set temp [C]:"))
         self._set_temperature_edit = QLineEdit("0")
+        self._set_temperature_edit.setMaximumWidth(60)
         self._set_temperature_edit.returnPressed.connect(self._set_desired_temperature_for_all)
-        self._grid.addWidget(self._set_temperature_edit, 1, CURRENT_COL)
-        CURRENT_COL += 1
+        fleet_layout.addWidget(self._set_temperature_edit)
 
-        self._grid.addWidget(QLabel("Binning"), 0, CURRENT_COL)
-        self._grid.addWidget(QPushButton("Update"), 1, CURRENT_COL)
-        CURRENT_COL += 1
+        update_binning_button = QPushButton("Update binning")
+        update_binning_button.clicked.connect(self._update_binning_for_all)
+        fleet_layout.addWidget(update_binning_button)
 
-        self._grid.addWidget(QLabel("Capturing type"), 0, CURRENT_COL)
-        CURRENT_COL += 1
-
-        self._grid.addWidget(QLabel("Capturing number"), 0, CURRENT_COL)
-        CURRENT_COL += 1
-
-        self._grid.addWidget(QLabel("Saving images"), 0, CURRENT_COL)
         self._start_all_button = QPushButton("Start all")
         self._start_all_button.clicked.connect(self._start_save_all)
-        self._grid.addWidget(self._start_all_button, 1, CURRENT_COL)
-        CURRENT_COL += 1
-
-        view_image_window = ViewImageWindow(parent=self)
-
-        self._gain_edits = {}
-        self._cameras_combos = {}
-        self._view_buttons = {}
-        self._solve_buttons = {}
-        self._exp_edits = {}
-        self._capture_number_edits = {}
-        self._pingable = {}
-        self._ping_labels = {}
-        self._reacheable = {}
-        self._camera_statuses = {}
-        self._temp_displays = {}
-        self._cooling_statuses = {}
-        self._cooling_labels = {}
-        self._set_temperature_display = {}
-        self._start_capture_buttons = {}
-        self._capture_number = {}
-        self._capture_prefix_edit = {}
-        self._reachable_labels = {}
-
-        def save_tmp(u):
-            if not self._reacheable[u]:
-                print(f"Cannot save from {u}")
-                return
-            print(f"Saving locally from {u}")
-            i = self._cameras_combos[unit_name].currentIndex()
-            save_last_image_locally(u, i)
-            logger.debug("Saved tiff image")
-
-        def solve_tmp(u):
-            if not self._reacheable[u]:
-                print(f"Cannot save from {u}")
-                return
-            print(f"Saving locally from {u}")
-            i = self._cameras_combos[unit_name].currentIndex()
-            file_path = save_last_image_locally(u, i)
-            logger.debug("Saved tiff image")
-            initial_ra = float(self._initial_ra.text())
-            initial_dec = float(self._initial_dec.text())
-            print(f"Using initial values: RA={initial_ra}, DEC={initial_dec}")
-            (rh, rm, rs), (dh, dm, ds) = blind_solve_image(file_path, initial_ra, initial_dec)
-
-            self._solved_ra.setText(f"{rh}:{rm}:{rs}")
-            self._solved_dec.setText(f"{dh}:{dm}:{ds}")
-
-        def view(u):
-            if not self._reacheable[u]:
-                print(f"Cannot view from {u}")
-                return
-            print(f"Viewing from {u}")
-            i = self._cameras_combos[unit_name].currentIndex()
-            view_image_window.show_yourself(u, i)
-
-        ROW_SHIFT=2
-        for index, unit_name in enumerate(self._config["units"]):
-            CURRENT_COL = 0
-            self._grid.addWidget(QLabel(unit_name), index+ROW_SHIFT, CURRENT_COL)
-            CURRENT_COL += 1
-
-            ##################################################
-            self._capture_number[unit_name] = 1
-            self._pingable[unit_name] = self._ping(unit_name)
-            self._ping_labels[unit_name] = QLabel()
-            self._prepare_pingable_label(unit_name)
-            self._grid.addWidget(self._ping_labels[unit_name])
-            CURRENT_COL += 1
-            ##################################################
-            # TODO: this check should go again whenever user presses Refresh button!
-            # TODO: UNLESS it is already connected and working then it is useless and may disrupt work!!!
-            cameras_list = None
-            if self._pingable[unit_name]:
-                cameras_list = get_cameras_list(unit_name)
-            self._reacheable[unit_name] = cameras_list is not None
-            reachable_label = QLabel()
-            reachable_font = QFont()
-            reachable_font.setBold(True)
-            reachable_label.setFont(reachable_font)
-            self._reachable_labels[unit_name] = reachable_label
-            self._grid.addWidget(reachable_label, index+ROW_SHIFT, CURRENT_COL)
-            self._refresh_reachable_label(unit_name)
-            CURRENT_COL += 1
-            self._cameras_combos[unit_name] = QComboBox()
-            self._refresh_cameras_combo(cameras_list, unit_name)
-            self._grid.addWidget(self._cameras_combos[unit_name], index+ROW_SHIFT, CURRENT_COL)
-            CURRENT_COL += 1
-
-            ######################################################################
-            # TODO: status should be checked once per second ideally. It will also return number of already captured images!
-            camera_status_text = "<unknown>"
-            # TODO should react on pressing "Turn On" button!!!
-            camera_cooling_status_text = "<on or off>"
-            camera_cooling_status_color = "white"
-            current_exposure_text = "<<exposure time>>"
-            current_binning_txt = "x4"
-            set_temp_text = "<<value>>"
-            current_gain_text = "<<value>>"
-            # TODO: should ask for temperature and update this every few seconds:
-            camera_temp_text = "<<temp unknown>>"
-            if self._reacheable[unit_name]:
-                current_camera = self._cameras_combos[unit_name].currentText()
-                if current_camera is not EMPTY_CAMERA_LIST_ITEM:
-                    current_index = self._cameras_combos[unit_name].currentIndex()
-                    result = connect_to_camera(current_camera, current_index, unit_name)
-                    if result is not None:
-                        ok, status = result
-                        if ok:
-                            camera_status_text = status["state"]
-
-                            ########## a little bit of hardcode:
-                            bin_value = 4
-                            CameraRequester(unit_name, current_index).set_binning(bin_value)
-                            format_str = "RAW16"
-                            CameraRequester(unit_name, current_index).set_format(format_str)
-                            CameraRequester(unit_name, current_index).start_capturing()
-
-                            ok, is_cooler_on = CameraRequester(unit_name, current_index).get_cooler_on()
-                            if ok:
-                                camera_cooling_status_text = "YES" if is_cooler_on else "NO"
-                                camera_cooling_status_color = "green" if is_cooler_on else "red"
-
-                            ok, temp = CameraRequester(unit_name, current_index).get_set_temp()
-                            if ok:
-                                set_temp_text = str(temp)
-
-                            ok, camera_temp = CameraRequester(unit_name, current_index).get_temperature()
-                            if ok:
-                                camera_temp_text = str(camera_temp)
-
-                            ok, exposure_raw_us = CameraRequester(unit_name, current_index).get_exposure_us()
-                            if ok:
-                                exposure_us = int(exposure_raw_us)
-                                if exposure_us >= US_IN_SECOND:
-                                    current_exposure_text = f"{exposure_us/US_IN_SECOND}s"
-                                elif exposure_us >= US_IN_MILLISECOND:
-                                    current_exposure_text = f"{exposure_us/US_IN_MILLISECOND}ms"
-                                else:
-                                    current_exposure_text = f"{exposure_us}us"
-                            ok, gain = CameraRequester(unit_name, current_index).get_gain()
-                            if ok:
-                                current_gain_text = str(gain)
-
-            self._camera_statuses[unit_name] = QLabel(camera_status_text)
-            self._grid.addWidget(self._camera_statuses[unit_name], index+ROW_SHIFT, CURRENT_COL)
-            CURRENT_COL += 1
-            self._grid.addWidget(QLabel("<<offset unknown>>"), index+ROW_SHIFT, CURRENT_COL)
-            CURRENT_COL += 1
-
-            self._view_buttons[unit_name] = QPushButton("View")
-            self._view_buttons[unit_name].clicked.connect(lambda always_false, z=unit_name: view(z))
-            self._grid.addWidget(self._view_buttons[unit_name], index+ROW_SHIFT, CURRENT_COL)
-            CURRENT_COL += 1
-
-            self._view_buttons[unit_name] = QPushButton("Save")
-            self._view_buttons[unit_name].clicked.connect(lambda always_false, z=unit_name: save_tmp(z))
-            self._grid.addWidget(self._view_buttons[unit_name], index+ROW_SHIFT, CURRENT_COL)
-            CURRENT_COL += 1
-
-            self._solve_buttons[unit_name] = QPushButton("Solve")
-            self._solve_buttons[unit_name].clicked.connect(lambda always_false, z=unit_name: solve_tmp(z))
-            self._grid.addWidget(self._solve_buttons[unit_name], index+ROW_SHIFT, CURRENT_COL)
-            CURRENT_COL += 1
-
-            self._exp_edits[unit_name] = QLineEdit(current_exposure_text)
-            self._exp_edits[unit_name].returnPressed.connect(lambda u=unit_name: self._pressed_exp_edit(u))
-            self._grid.addWidget(self._exp_edits[unit_name],  index+ROW_SHIFT, CURRENT_COL)
-
-            CURRENT_COL += 1
-            self._gain_edits[unit_name] = QLineEdit(current_gain_text)
-            self._gain_edits[unit_name].returnPressed.connect(lambda u=unit_name: self._pressed_gain_edit(u))
-            self._grid.addWidget(self._gain_edits[unit_name], index+ROW_SHIFT, CURRENT_COL)
-            CURRENT_COL += 1
-
-            ############################################################################
-            cooling_label = QLabel(camera_cooling_status_text)
-            cooling_font = QFont()
-            cooling_font.setBold(True)
-            cooling_label.setFont(cooling_font)
-            cooling_label.setStyleSheet(f"color: {camera_cooling_status_color}")
-            self._grid.addWidget(cooling_label,  index+ROW_SHIFT, CURRENT_COL)
-            self._cooling_labels[unit_name] = cooling_label
-            CURRENT_COL += 1
-
-            self._temp_displays[unit_name] = QLabel(camera_temp_text)
-            self._grid.addWidget(self._temp_displays[unit_name],  index+ROW_SHIFT, CURRENT_COL)
-            CURRENT_COL += 1
-
-            self._set_temperature_display[unit_name] = QLabel(set_temp_text)
-            self._grid.addWidget(self._set_temperature_display[unit_name],  index+ROW_SHIFT, CURRENT_COL)
-            CURRENT_COL += 1
-
-            bin_combo = QComboBox()
-            bin_combo.addItems(["x1", "x2", "x4"])
-            bin_combo.setCurrentText(current_binning_txt)
-            self._grid.addWidget(bin_combo,  index+ROW_SHIFT, CURRENT_COL)
-            CURRENT_COL += 1
-
-            capture_prefix_edit = QLineEdit("light")
-            self._grid.addWidget(capture_prefix_edit,  index+ROW_SHIFT, CURRENT_COL)
-            self._capture_prefix_edit[unit_name] = capture_prefix_edit
-            CURRENT_COL += 1
-            self._capture_number_edits[unit_name] = QLineEdit("1")
-            self._capture_number_edits[unit_name].returnPressed.connect(lambda u=unit_name: self._changed_capture_number(u))
-            self._capture_number_edits[unit_name].textChanged.connect(lambda nt, u=unit_name: self._changed_capture_number(u))
-            self._grid.addWidget(self._capture_number_edits[unit_name], index + ROW_SHIFT, CURRENT_COL)
-            CURRENT_COL += 1
-
-            self._start_capture_buttons[unit_name] = QPushButton("Start")
-            self._start_capture_buttons[unit_name].setCheckable(True)
-            self._start_capture_buttons[unit_name].setStyleSheet("background-color : black")
-            self._start_capture_buttons[unit_name].clicked.connect(lambda always_false, u=unit_name: self._start_capture(u))
-            self._grid.addWidget(self._start_capture_buttons[unit_name], index+ROW_SHIFT, CURRENT_COL)
-            CURRENT_COL += 1
-
-        self._main_layout.addLayout(self._grid)
-        self._main_layout.addItem(QSpacerItem(0, 0, QSizePolicy.Expanding, QSizePolicy.Expanding))
+        fleet_layout.addWidget(self._start_all_button)
+
+        save_all_button = QPushButton("Save all")
+        save_all_button.clicked.connect(self._save_all)
+        fleet_layout.addWidget(save_all_button)
+
+        self._output_format = QComboBox()
+        self._output_format.addItems(available_formats())
+        self._output_format.setCurrentText(self._writer.output_format)
+        self._output_format.setToolTip("Format of locally saved images")
+        self._output_format.currentTextChanged.connect(self._output_format_changed)
+        fleet_layout.addWidget(self._output_format)
+
+        self._masters_button = QPushButton("Calibration masters...")
+        self._masters_button.clicked.connect(self._choose_masters)
+        fleet_layout.addWidget(self._masters_button)
+
+        self._calibrate_button = QPushButton("Calibrate")
+        self._calibrate_button.setCheckable(True)
+        self._calibrate_button.setEnabled(False)
+        self._calibrate_button.setStyleSheet("background-color : black")
+        self._calibrate_button.clicked.connect(self._calibrate_clicked)
+        fleet_layout.addWidget(self._calibrate_button)
+
+        self._trace_button = QPushButton("Trace")
+        self._trace_button.setCheckable(True)
+        self._trace_button.setStyleSheet("background-color : black")
+        self._trace_button.setToolTip("Record a timeline of the frame pipeline, saved as Chrome trace JSON when stopped")
+        self._trace_button.clicked.connect(self._trace_clicked)
+        fleet_layout.addWidget(self._trace_button)
+
+        mosaic_button = QPushButton("View all")
+        mosaic_button.setToolTip("Latest frame of every unit side by side, click a tile for the single camera view")
+        mosaic_button.clicked.connect(self._view_all)
+        fleet_layout.addWidget(mosaic_button)
+
+        telemetry_button = QPushButton("Telemetry")
+        telemetry_button.setToolTip("Temperature, cooler power and state of all units over the night")
+        telemetry_button.clicked.connect(lambda: self._telemetry_window.show_yourself())
+        fleet_layout.addWidget(telemetry_button)
+
+        self._drift_button = QPushButton("Drift")
+        self._drift_button.setCheckable(True)
+        self._drift_button.setStyleSheet("background-color : black")
+        self._drift_button.setToolTip("Measure tracking drift of all units from their consecutive frames")
+        self._drift_button.clicked.connect(self._drift_clicked)
+        fleet_layout.addWidget(self._drift_button)
+        fleet_layout.addItem(QSpacerItem(0, 0, QSizePolicy.Expanding, QSizePolicy.Minimum))
+        self._fleet_progress_label = QLabel(self._progress.fleet_summary())
+        fleet_layout.addWidget(self._fleet_progress_label)
+        self._polling_label = QLabel("Polling: -")
+        fleet_layout.addWidget(self._polling_label)
+        self._main_layout.addLayout(fleet_layout)
+
+        self._view_image_window = ViewImageWindow(parent=self, metadata_provider=self._frame_metadata)
+        self._telemetry_window = TelemetryWindow(self, self._telemetry)
+        self._mosaic_window = MosaicWindow(self, len(self._config["units"]))
+        self._mosaic_window.unit_clicked.connect(self._view)
+        self._drift_window = DriftWindow(self, self._config.get("drift_warning_arcsec_per_min",
+                                                                DEFAULT_WARNING_ARCSEC_PER_MIN))
+
+        self._table = QTableView()
+        self._table.setModel(self._model)
+        self._table.verticalHeader().setVisible(False)
+        self._table.verticalHeader().setDefaultSectionSize(THUMBNAIL_HEIGHT + 6)
+        self._table.setSelectionMode(QAbstractItemView.NoSelection)
+        self._table.setEditTriggers(QAbstractItemView.AllEditTriggers)
+        self._add_button_column(COL_VIEW, self._view)
+        self._add_button_column(COL_SAVE, self._save)
+        self._add_button_column(COL_SOLVE, self._solve)
+        self._add_button_column(COL_SAVING, self._start_capture)
+        self._table.setItemDelegateForColumn(COL_PROGRESS, ProgressBarDelegate(self._table))
+        combo_delegate = ComboBoxDelegate(self._table)
+        self._table.setItemDelegateForColumn(COL_CAMERA, combo_delegate)
+        self._table.setItemDelegateForColumn(COL_BINNING, combo_delegate)
+        self._model.value_edited.connect(self._value_edited)
+        self._main_layout.addWidget(self._table)
         self.setLayout(self._main_layout)
-        ######################
-        self._add_task(5, self._refresh_statuses, "refresh_statuses")
 
-    def _refresh_reachable_label(self, unit_name):
-        self._reachable_labels[unit_name].setText("YES" if self._reacheable[unit_name] else "NO")
-        reachable_color = "green" if self._reacheable[unit_name] else "red"
-        self._reachable_labels[unit_name].setStyleSheet(f"color: {reachable_color}")
+        self._probe_all_units()
+        self._table.resizeColumnsToContents()
+        self._table.setColumnWidth(COL_PROGRESS, PROGRESS_COLUMN_WIDTH)
+        self._table.setColumnWidth(COL_THUMBNAIL, max(THUMBNAIL_WIDTH + 8,
+                                                      self._table.horizontalHeader().sectionSizeHint(COL_THUMBNAIL)))
+        self._prepare_polling()
+
+    def _add_button_column(self, column, callback):
+        delegate = ButtonDelegate(self._table)
+        delegate.clicked.connect(lambda row: callback(self._model.unit_name(row)))
+        self._table.setItemDelegateForColumn(column, delegate)
+
+    def _map_units(self, callback, unit_names):
+        # network/subprocess work only - results are applied to the model afterwards on the GUI thread
+        if not unit_names:
+            return {}
+        with ThreadPoolExecutor(max_workers=len(unit_names)) as executor:
+            return dict(zip(unit_names, executor.map(callback, unit_names)))
+
+    def _probe_all_units(self):
+        self._model.update_units(self._map_units(self._probe_unit, self._model.unit_names()))
+        for unit_name in self._model.unit_names():
+            self._subscribe(unit_name)
+            self._request_thumbnail(unit_name, None)
+
+    def _subscribe(self, unit_name):
+        old_subscription = self._subscriptions.pop(unit_name, None)
+        if old_subscription is not None:
+            old_subscription.stop()
+        unit = self._model.state(unit_name)
+        if not unit.reachable:
+            return
+        # fallback polling is done by the scheduler for units without push
+        self._subscriptions[unit_name] = CameraRequester(unit_name, unit.camera_index).subscribe(
+            lambda event_type, value: self._unit_events.event_received.emit(unit_name, event_type, value),
+            fallback_interval_s=None)
+        if self._scheduler is not None:
+            self._scheduler.poll_soon(unit_name)
+
+    def _unit_event(self, unit_name, event_type, value):
+        if event_type == STATUS_EVENT:
+            logger.debug(f"Acquired status of {unit_name}: {value}")
+            progress = self._progress.update_from_status(unit_name, value)
+            self._model.update_unit(unit_name, status=value["state"], is_saving=(value["state"] == "SAVE"),
+                                    progress=progress)
+            self._fleet_progress_label.setText(self._progress.fleet_summary())
+            self._telemetry.record(unit_name, state=value["state"])
+            self._frame_ready_from_polled_status(unit_name, value)
+        elif event_type == TEMPERATURE_EVENT:
+            self._model.update_unit(unit_name, temperature=str(value))
+            self._telemetry.record(unit_name, temperature=value)
+        elif event_type == FRAME_READY_EVENT:
+            logger.debug(f"New frame ready on {unit_name}: {value}")
+            latest_frames.invalidate(unit_name)
+            self._view_image_window.new_frame_ready(unit_name)
+            self._mosaic_window.new_frame_ready(unit_name)
+            self._request_thumbnail(unit_name, value)
+            if self._drift_button.isChecked():
+                self._measure_drift(unit_name)
+
+    def _frame_ready_from_polled_status(self, unit_name, status):
+        # pushed units send frame_ready themselves, the subscription tells it for polled ones
+        subscription = self._subscriptions.get(unit_name)
+        saved_images = None if subscription is None else subscription.frame_ready_from_status(status)
+        if saved_images is not None:
+            self._unit_event(unit_name, FRAME_READY_EVENT, saved_images)
+
+    def _probe_unit(self, unit_name):
+        fields = {"pingable": self._ping(unit_name)}
+        # TODO: this check should go again whenever user presses Refresh button!
+        # TODO: UNLESS it is already connected and working then it is useless and may disrupt work!!!
+        cameras_list = None
+        if fields["pingable"]:
+            cameras_list = get_cameras_list(unit_name)
+        fields["reachable"] = cameras_list is not None
+        fields["cameras"] = cameras_list if cameras_list else [EMPTY_CAMERA_LIST_ITEM]
+        fields["camera_index"] = 0
+        logger.debug(f"Obtained cameras list: {fields['cameras']} for {unit_name}")
+        if cameras_list:
+            fields.update(self._connect_and_read_settings(unit_name, cameras_list[0], 0))
+        return fields
+
+    def _connect_and_read_settings(self, unit_name, camera_name, camera_index):
+        fields = {}
+        result = connect_to_camera(camera_name, camera_index, unit_name)
+        if result is None:
+            return fields
+        ok, status = result
+        if not ok:
+            return fields
+        # TODO: status should be checked once per second ideally. It will also return number of already captured images!
+        fields["status"] = status["state"]
+
+        ########## a little bit of hardcode:
+        bin_value = 4
+        CameraRequester(unit_name, camera_index).set_binning(bin_value)
+        fields["binning"] = f"x{bin_value}"
+        format_str = "RAW16"
+        CameraRequester(unit_name, camera_index).set_format(format_str)
+        CameraRequester(unit_name, camera_index).start_capturing()
+
+        ok, is_cooler_on = CameraRequester(unit_name, camera_index).get_cooler_on()
+        if ok:
+            fields["cooler_on"] = is_cooler_on
 
-    def _start_save_all(self):
-        for unit_name in self._config["units"]:
-           self._start_capture(unit_name)
+        ok, temp = CameraRequester(unit_name, camera_index).get_set_temp()
+        if ok:
+            fields["set_temperature"] = str(temp)
+
+        ok, camera_temp = CameraRequester(unit_name, camera_index).get_temperature()
+        if ok:
+            fields["temperature"] = str(camera_temp)
+
+        ok, exposure_raw_us = CameraRequester(unit_name, camera_index).get_exposure_us()
+        if ok:
+            fields["exposure_us"] = int(exposure_raw_us)
+            fields["exposure"] = format_exposure_us(int(exposure_raw_us))
 
-    def _changed_capture_number(self, unit_name):
-        if not self._reacheable[unit_name]:
-            logger.debug(f"Cannot change capture number in {unit_name}")
+        ok, gain = CameraRequester(unit_name, camera_index).get_gain()
+        if ok:
+            fields["gain"] = str(gain)
+        return fields
+
+    def _value_edited(self, unit_name, column, value):
+        if column == COL_CAMERA:
+            self._subscribe(unit_name)
+            self._thumbnails.forget(unit_name)
+            self._request_thumbnail(unit_name, None)
+        elif column == COL_EXPOSURE:
+            self._pressed_exp_edit(unit_name, value)
+        elif column == COL_GAIN:
+            self._pressed_gain_edit(unit_name, value)
+
+    def _view(self, unit_name):
+        unit = self._model.state(unit_name)
+        if not unit.reachable:
+            print(f"Cannot view from {unit_name}")
+            return
+        print(f"Viewing from {unit_name}")
+        self._view_image_window.show_yourself(unit_name, unit.camera_index, self._active_calibrator(),
+                                              self._bayer_pattern(unit_name))
+
+    def _request_thumbnail(self, unit_name, frame_key):
+        # frame_key is the frame counter of the unit's frame_ready, None when not known
+        unit = self._model.state(unit_name)
+        if not unit.reachable:
+            return
+        camera_index = unit.camera_index
+        self._thumbnails.request(unit_name, None if frame_key is None else (camera_index, frame_key),
+                                 lambda: get_last_frame_data(unit_name, camera_index, PURPOSE_THUMBNAIL))
+
+    def _show_thumbnail(self, result):
+        unit_name, preview, timestamp = result
+        pixmap = QPixmap(qimage_from_preview(preview)).scaled(THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT, Qt.KeepAspectRatio,
+                                                              Qt.SmoothTransformation)
+        self._model.update_unit(unit_name, thumbnail=pixmap, thumbnail_time=timestamp)
+
+    def _view_all(self):
+        print("Viewing all units")
+        self._mosaic_window.show_yourself(self._fleet_targets(), self._active_calibrator())
+
+    def _save(self, unit_name):
+        unit = self._model.state(unit_name)
+        if not unit.reachable:
+            print(f"Cannot save from {unit_name}")
+            return
+        print(f"Saving locally from {unit_name}")
+        frame = self._frame_for(unit_name)
+        if frame is None:
+            logger.warning(f"Could not get last image from {unit_name}")
+            return
+        save_frame_locally(frame, self._active_calibrator(), self._writer, self._output_metadata(unit_name))
+        logger.debug("Saved image")
+
+    def _frame_for(self, unit_name, purpose=PURPOSE_SAVE):
+        # the frame just viewed (or saved) is not downloaded again, a pushed unit tells when it gets outdated
+        camera_index = self._model.state(unit_name).camera_index
+        frame = latest_frames.get(unit_name, camera_index, None if self._is_pushing(unit_name) else FRAME_REUSE_S)
+        if frame is not None:
+            logger.debug(f"Reusing {frame}")
+            return frame
+        frame, _ = get_last_image_for(unit_name, camera_index, purpose)
+        return frame
+
+    def _save_all(self):
+        unit_names = [unit_name for unit_name in self._model.unit_names() if self._model.state(unit_name).reachable]
+        calibrator = self._active_calibrator()
+        frames = self._map_units(self._frame_for, unit_names)
+        items = []
+        for unit_name, frame in frames.items():
+            if frame is None:
+                logger.warning(f"Could not get last image from {unit_name}")
+                continue
+            prefix = unit_name if calibrator is None else f"{unit_name}_calibrated"
+            data = frame.data if calibrator is None else calibrator.apply(frame.data)
+            items.append((prefix, data, self._output_metadata(unit_name)))
+        paths = self._writer.write_batch(items)
+        print(f"Saved {len(paths)} images: {paths}")
+
+    def _output_format_changed(self, output_format):
+        self._writer.shutdown()
+        self._writer = FrameWriter(output_format, on_written=self._quality.frame_written)
+        self._save_to_config({"output_format": output_format})
+
+    def _output_metadata(self, unit_name):
+        unit = self._model.state(unit_name)
+        solved = self._solved_ra.text() != "<unknown>"
+        return acquisition_metadata(unit_name, unit.camera_name, unit.exposure_us, unit.gain, unit.temperature,
+                                    unit.binning, self._solved_ra.text() if solved else self._initial_ra.text(),
+                                    self._solved_dec.text() if solved else self._initial_dec.text(),
+                                    unit.capture_prefix)
+
+    def _solve(self, unit_name):
+        unit = self._model.state(unit_name)
+        if not unit.reachable:
+            print(f"Cannot save from {unit_name}")
+            return
+        print(f"Saving locally from {unit_name}")
+        # the solver gets a plain TIFF whatever the output format is
+        frame = self._frame_for(unit_name, PURPOSE_SOLVE)
+        if frame is None:
+            logger.warning(f"Could not get last image from {unit_name}")
+            return
+        writer = FrameWriter(FORMAT_TIFF, on_written=self._quality.frame_written)
+        file_path = save_frame_locally(frame, self._active_calibrator(), writer, self._output_metadata(unit_name))
+        writer.shutdown()
+        logger.debug("Saved tiff image")
+        initial_ra = float(self._initial_ra.text())
+        initial_dec = float(self._initial_dec.text())
+        print(f"Using initial values: RA={initial_ra}, DEC={initial_dec}")
+        from blind_solver import blind_solve_image
+        (rh, rm, rs), (dh, dm, ds) = blind_solve_image(file_path, initial_ra, initial_dec)
+
+        self._solved_ra.setText(f"{rh}:{rm}:{rs}")
+        self._solved_dec.setText(f"{dh}:{dm}:{ds}")
+
+    def _bayer_pattern(self, unit_name):
+        # config: "bayer_patterns": {camera name: "RGGB" | "BGGR" | "GRBG" | "GBRG"}, mono cameras are not listed
+        return self._config.get("bayer_patterns", {}).get(self._model.state(unit_name).camera_name)
+
+    def _frame_metadata(self, unit_name):
+        unit = self._model.state(unit_name)
+        return {"exposure_us": unit.exposure_us, "gain": unit.gain, "temperature": unit.temperature}
+
+    def _active_calibrator(self):
+        return self._calibrator if self._calibrate_button.isChecked() else None
+
+    def _choose_masters(self):
+        directory = QFileDialog.getExistingDirectory(self, "Directory with master_*.tif or bias/dark/flat frames")
+        if not directory:
             return
+        self._masters_button.setEnabled(False)
+        self._masters_button.setText("Building masters...")
+        self._calibration_executor.submit(self._load_masters, directory)
 
-        number_raw = self._capture_number_edits[unit_name].text()
+    def _load_masters(self, directory):
+        from calibration import Calibrator, build_masters
         try:
-            number = int(number_raw)
+            calibrator = Calibrator.from_directory(directory)
+            if not calibrator.kinds:
+                build_masters(directory)
+                calibrator = Calibrator.from_directory(directory)
+            self._calibration_loaded.emit((directory, calibrator))
         except Exception as e:
-            logger.warning(f"Exception raised when changing capture number: {e}")
+            self._calibration_loaded.emit((directory, e))
+
+    def _masters_loaded(self, result):
+        directory, calibrator = result
+        self._masters_button.setEnabled(True)
+        self._masters_button.setText("Calibration masters...")
+        if isinstance(calibrator, Exception) or not calibrator.kinds:
+            logger.error(f"Could not load calibration masters from {directory}: {calibrator}")
             return
-        if number < 1 or number > 10000:
-            logger.warning(f"Number of captures [{number}] for {unit_name} is outside allowed range (1-10000)")
-            return
-        logger.debug(f"Setting new capture number for {unit_name}: {number}")
-        self._capture_number[unit_name] = number
+        logger.info(f"Loaded calibration masters {calibrator.kinds} from {directory}")
+        self._calibrator = calibrator
+        self._calibrate_button.setEnabled(True)
+        self._calibrate_button.setToolTip(f"{', '.join(calibrator.kinds)} from {directory}")
+        if not self._calibrate_button.isChecked():
+            self._calibrate_button.setChecked(True)
+        self._calibrate_clicked()
+
+    def _calibrate_clicked(self):
+        calibrating = self._calibrate_button.isChecked()
+        self._calibrate_button.setStyleSheet(f"background-color : {'#228822' if calibrating else 'black'}")
+        self._view_image_window.set_calibrator(self._active_calibrator())
+
+    def _trace_clicked(self):
+        tracing = self._trace_button.isChecked()
+        self._trace_button.setStyleSheet(f"background-color : {'#228822' if tracing else 'black'}")
+        if tracing:
+            tracer.start()
+        else:
+            self._export_trace()
+
+    @staticmethod
+    def _export_trace():
+        if tracer.is_enabled():
+            tracer.stop()
+            print(f"Trace saved into {tracer.export()}")
+
+    def _drift_clicked(self):
+        monitoring = self._drift_button.isChecked()
+        self._drift_button.setStyleSheet(f"background-color : {'#228822' if monitoring else 'black'}")
+        if monitoring:
+            self._drift_window.show()
+
+    def _measure_drift(self, unit_name):
+        unit = self._model.state(unit_name)
+        camera_index = unit.camera_index
+        self._drift_window.monitor.submit(
+            unit_name, lambda: get_last_frame_data(unit_name, camera_index, PURPOSE_DRIFT),
+            self._image_scale(unit_name) * int(unit.binning[1:]))
+
+    def _image_scale(self, unit_name):
+        # config: "image_scales": {unit name: arcsec per unbinned pixel}, lens and camera differ between units
+        return self._config.get("image_scales", {}).get(unit_name, DEFAULT_ARCSEC_PER_PIXEL)
+
+    def _fleet_targets(self):
+        return {unit_name: self._model.state(unit_name).camera_index
+                for unit_name in self._model.unit_names() if self._model.state(unit_name).reachable}
 
-    def _refresh_statuses(self):
-        for unit_name in self._config["units"]:
-            if not self._reacheable[unit_name]:
-                continue
-            camera_index = self._cameras_combos[unit_name].currentIndex()
-            ok, status = CameraRequester(unit_name, camera_index).get_status()
-            if ok:
-                logger.debug(f"Acquired status of {unit_name}: {status}")
-                camera_status_text = status["state"]
-                self._camera_statuses[unit_name].setText(camera_status_text)
-            ok, camera_temp = CameraRequester(unit_name, camera_index).get_temperature()
-            if ok:
-                camera_temp_text = str(camera_temp)
-                self._temp_displays[unit_name].setText(camera_temp_text)
+    def _start_save_all(self):
+        targets = self._fleet_targets()
+        numbers = {unit_name: self._model.state(unit_name).capture_number for unit_name in targets}
+        prefixes = {unit_name: f"{self._model.state(unit_name).capture_prefix}_{unit_name}" for unit_name in targets}
+        results = start_saving_for_all(targets, numbers, prefixes)
+        for unit_name, result in results.items():
+            logger.debug(f"Result from saving @ {unit_name}: {result}")
+            self._scheduler.poll_soon(unit_name, "status")
+        self._model.update_units({unit_name: {"is_saving": result.ok} for unit_name, result in results.items()})
+        for unit_name, result in results.items():
+            if result.ok:
+                self._start_progress(unit_name)
+
+    def _start_progress(self, unit_name):
+        unit = self._model.state(unit_name)
+        exposure_s = unit.exposure_us / US_IN_SECOND if unit.exposure_us is not None else None
+        progress = self._progress.start(unit_name, unit.capture_number, exposure_s)
+        self._model.update_unit(unit_name, progress=progress)
+        self._fleet_progress_label.setText(self._progress.fleet_summary())
+
+    def _update_binning_for_all(self):
+        targets = self._fleet_targets()
+        binning = {unit_name: int(self._model.state(unit_name).binning[1:]) for unit_name in targets}
+        results = broadcast(targets, lambda unit_name, requester: requester.set_binning(binning[unit_name]))
+        for unit_name, result in results.items():
+            print(f"Setting binning at {unit_name} to x{binning[unit_name]}: {result}")
 
     def _start_capture(self, unit_name):
         logger.debug(f"Start saving on {unit_name} pressed!")
-        if not self._reacheable[unit_name]:
+        unit = self._model.state(unit_name)
+        if not unit.reachable:
             print(f"Cannot start capturing in {unit_name}")
             return
-        camera_index = self._cameras_combos[unit_name].currentIndex()
-        button = self._start_capture_buttons[unit_name]
-        is_checked = button.isChecked()
-        if is_checked:
-            number = self._capture_number[unit_name]
-            capture_type = self._capture_prefix_edit[unit_name].text()
+        camera_index = unit.camera_index
+        if not unit.is_saving:
+            number = unit.capture_number
+            capture_type = unit.capture_prefix
             logger.debug(f"Starting saving {number} frames with capture type {capture_type} on {unit_name}")
             result = CameraRequester(unit_name, camera_index).start_saving(number, "Capture", f"{capture_type}_{unit_name}")
+            if result is not None:
+                self._start_progress(unit_name)
         else:
             logger.debug(f"Stopping saving on {unit_name}")
             result = CameraRequester(unit_name, camera_index).stop_saving()
@@ -789,24 +1672,8 @@ class WelcomeView(QWidget):
         else:
             logger.warning(f"Could not get save status from {unit_name}")
             return
-
-        if is_saving:
-            button.setChecked(True)
-            button.setStyleSheet("background-color : #228822")
-            button.setText("Stop")
-        else:
-            button.setText("Start")
-            button.setStyleSheet("background-color : black")
-            button.setChecked(False)
-
-    def _refresh_cooler_status(self, unit_name: str, camera_index: int):
-        ok, is_on = CameraRequester(unit_name, camera_index).get_cooler_on()
-        if not ok:
-            return
-        camera_cooling_status_text = "YES" if is_on else "NO"
-        camera_cooling_status_color = "green" if is_on else "red"
-        self._cooling_labels[unit_name].setText(camera_cooling_status_text)
-        self._cooling_labels[unit_name].setStyleSheet(f"color: {camera_cooling_status_color}")
+        self._model.update_unit(unit_name, is_saving=is_saving, status=status["state"])
+        self._scheduler.poll_soon(unit_name, "status")
 
     def _turn_all_coolers(self):
         value = self._all_coolers_button.isChecked()
@@ -814,41 +1681,34 @@ class WelcomeView(QWidget):
             print("Turning ON!")
             self._all_coolers_button.setChecked(True)
             self._all_coolers_button.setStyleSheet("background-color : #228822")
-            self._all_coolers_button.setText("Turn off")
+            self._all_coolers_button.setText("Turn off coolers")
         else:
             print("Turning OFF!")
-            self._all_coolers_button.setText("Turn on")
+            self._all_coolers_button.setText("Turn on coolers")
             self._all_coolers_button.setStyleSheet("background-color : black")
             self._all_coolers_button.setChecked(False)
 
-        for unit_name in self._config["units"]:
-            if not self._reacheable[unit_name]:
-                continue
-            camera_index = self._cameras_combos[unit_name].currentIndex()
-            result = CameraRequester(unit_name, camera_index).set_cooler_on(value)
-            onoroff = "on" if value else "off"
+        results = set_cooler_on_for_all(self._fleet_targets(), value)
+        onoroff = "on" if value else "off"
+        for unit_name, result in results.items():
             print(f"Turning cooler at {unit_name} {onoroff}: {result}")
-
-            self._refresh_cooler_status(unit_name, camera_index)
+        self._model.update_units({unit_name: {"cooler_on": bool(result.value)}
+                                  for unit_name, result in results.items() if result.value is not None})
 
     def _set_desired_temperature_for_all(self):
         value = int(self._set_temperature_edit.text())
-        for unit_name in self._config["units"]:
-            if not self._reacheable[unit_name]:
-                continue
-            camera_index = self._cameras_combos[unit_name].currentIndex()
-            result = CameraRequester(unit_name, camera_index).set_set_temp(value)
+        results = set_temperature_for_all(self._fleet_targets(), value)
+        for unit_name, result in results.items():
             print(f"Setting cooler temperature at {unit_name} to {value}: {result}")
-            ok, temp = CameraRequester(unit_name, camera_index).get_set_temp()
-            if ok:
-                self._set_temperature_display[unit_name].setText(str(temp))
+        self._model.update_units({unit_name: {"set_temperature": str(result.value)}
+                                  for unit_name, result in results.items() if result.value is not None})
 
-    def _pressed_gain_edit(self, unit_name):
-        if not self._reacheable[unit_name]:
+    def _pressed_gain_edit(self, unit_name, gain_raw):
+        unit = self._model.state(unit_name)
+        if not unit.reachable:
             print(f"Cannot change gain in {unit_name}")
             return
-        camera_index = self._cameras_combos[unit_name].currentIndex()
-        gain_raw = self._gain_edits[unit_name].text()
+        camera_index = unit.camera_index
         try:
             gain = int(gain_raw)
         except Exception as e:
@@ -861,13 +1721,15 @@ class WelcomeView(QWidget):
             print(f"Gain change successful to {gain}")
         else:
             print(f"Gain change failed: result={ok} value received={check_gain} while expecting {gain}")
+        if ok:
+            self._model.update_unit(unit_name, gain=str(check_gain))
 
-    def _pressed_exp_edit(self, unit_name):
-        if not self._reacheable[unit_name]:
+    def _pressed_exp_edit(self, unit_name, exp_raw):
+        unit = self._model.state(unit_name)
+        if not unit.reachable:
             print(f"Cannot change exp in {unit_name}")
             return
-        camera_index = self._cameras_combos[unit_name].currentIndex()
-        exp_raw = self._exp_edits[unit_name].text()
+        camera_index = unit.camera_index
         m = regexp_for_exp_time.match(exp_raw)
         if not m:
             logger.warning(f"Could not match regexp for exposure time")
@@ -892,21 +1754,18 @@ class WelcomeView(QWidget):
         CameraRequester(unit_name, camera_index).set_exposure(new_exp)
         ok, check_exp = CameraRequester(unit_name, camera_index).get_exposure_us()
         check_exp_s = int(check_exp/1000000)
+        if ok:
+            self._model.update_unit(unit_name, exposure_us=int(check_exp))
         if ok and check_exp_s == int(new_exp):
             logger.debug(f"Exposure change successful to {new_exp}")
         else:
             logger.error(f"Exposure change failed: result={ok} value received={check_exp_s}s while expecting {new_exp}s")
 
-    def _prepare_pingable_label(self, unit_name):
-        self._ping_labels[unit_name].setText("YES" if self._pingable[unit_name] else "NO")
-        pingable_color = "green" if self._pingable[unit_name] else "red"
-        pingable_font = QFont()
-        pingable_font.setBold(True)
-        self._ping_labels[unit_name].setFont(pingable_font)
-        self._ping_labels[unit_name].setStyleSheet(f"color: {pingable_color}")
-
     def _ping(self, unit_name):
         logger.debug(f"Pinging {unit_name}....")
+        known = transport.current().reachable(unit_name)
+        if known is not None:
+            return known
         try:
             result = subprocess.check_output(["ping", unit_name, "-n", "1"]).decode("UTF-8")
         except Exception as e:
@@ -919,56 +1778,49 @@ class WelcomeView(QWidget):
         return pingable
 
     def _ping_units(self):
-        for unit_name in self._config["units"]:
-            self._pingable[unit_name] = self._ping(unit_name)
-            self._prepare_pingable_label(unit_name)
+        pingable = self._map_units(self._ping, self._model.unit_names())
+        self._model.update_units({unit_name: {"pingable": value} for unit_name, value in pingable.items()})
 
     def _save_to_config(self, d: dict):
         self._config.update(d)
         save_config(self._config)
 
-    def _refresh_cameras_combo(self, cameras_list, unit_name):
-        if not self._reacheable[unit_name] or len(cameras_list) == 0:
-            cameras_list = [EMPTY_CAMERA_LIST_ITEM]
-        logger.debug(f"Obtained cameras list: {cameras_list} for {unit_name}")
-        self._cameras_combos[unit_name].clear()
-        self._cameras_combos[unit_name].addItems(cameras_list)
-
     def _refresh_servers(self):
         self._ping_units()
-
-        for unit_name in self._config["units"]:
-            if self._pingable[unit_name]:
-                # try:
-                cameras_list = get_cameras_list(unit_name)
-                # except Exception as e:
-                #     cameras_list = None
-                #     print(f"Exception while getting cameras list: {e}")
-                print("WTF?!?!")
-                if cameras_list is None:
-                    try:
-                        send_command_via_ssh(unit_name, "supervisorctl restart gunicorn")
-                    except Exception as e:
-                        print(f"Exception while sending command: {e}")
-                        continue
-                    sleep(3)
-                    cameras_list = get_cameras_list(unit_name)
-                if cameras_list is None:
-                    print(f"Failed to get cameras even after gunicorn restart. Continuing to next...")
-                    continue
-                print(f"Trying to refresh cameras combo for {unit_name} with {cameras_list}")
-                self._reacheable[unit_name] = True
-                self._refresh_reachable_label(unit_name)
-                self._refresh_cameras_combo(cameras_list, unit_name)
-
-                current_camera = self._cameras_combos[unit_name].currentText()
-                if current_camera is not EMPTY_CAMERA_LIST_ITEM:
-                    current_index = self._cameras_combos[unit_name].currentIndex()
-                    result = connect_to_camera(current_camera, current_index, unit_name)
-                    if result is not None:
-                        ok, status = result
-                        if ok:
-                            camera_status_text = status["state"]
-                            self._camera_statuses[unit_name].setText(camera_status_text)
-                            self._refresh_cooler_status(unit_name, current_index)
-
+        pingable_units = [unit_name for unit_name in self._model.unit_names() if self._model.state(unit_name).pingable]
+        self._model.update_units(self._map_units(self._restart_server_if_inactive, pingable_units))
+        for unit_name in pingable_units:
+            self._subscribe(unit_name)
+
+    def _restart_server_if_inactive(self, unit_name):
+        from ssh_client import send_command_via_ssh
+        # try:
+        cameras_list = get_cameras_list(unit_name)
+        # except Exception as e:
+        #     cameras_list = None
+        #     print(f"Exception while getting cameras list: {e}")
+        if cameras_list is None:
+            try:
+                send_command_via_ssh(unit_name, "supervisorctl restart gunicorn")
+            except Exception as e:
+                print(f"Exception while sending command: {e}")
+                return {}
+            sleep(3)
+            cameras_list = get_cameras_list(unit_name)
+        if cameras_list is None:
+            print(f"Failed to get cameras even after gunicorn restart. Continuing to next...")
+            return {}
+        print(f"Trying to refresh cameras combo for {unit_name} with {cameras_list}")
+        fields = {"reachable": True, "cameras": cameras_list if cameras_list else [EMPTY_CAMERA_LIST_ITEM],
+                  "camera_index": 0}
+        if not cameras_list:
+            return fields
+        result = connect_to_camera(cameras_list[0], 0, unit_name)
+        if result is not None:
+            ok, status = result
+            if ok:
+                fields["status"] = status["state"]
+                ok, is_on = CameraRequester(unit_name, 0).get_cooler_on()
+                if ok:
+                    fields["cooler_on"] = is_on
+        return fields
@@ -0,0 +1,14 @@
+import os
+import sys
+import pytest
+
+# modules of the package import each other by plain name, the way the application runs them
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "package"))
+
+
+@pytest.fixture(scope="session")
+def app():
+    # widgets need a QApplication, it has to be the first application object of the session
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
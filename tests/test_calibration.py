@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+import tifffile
+from calibration import (COMBINE_MEDIAN, COMBINE_SIGMA_CLIP, MASTER_BIAS, MASTER_DARK, MASTER_FLAT, Calibrator,
+                         build_masters, combine_frames, combine_strip, list_frames)
+from camera_simulator import render_star_field
+from frame_writer import write_fits
+
+RESOLUTION = (96, 64)
+
+
+def test_sigma_clip_rejects_outliers_that_move_the_mean():
+    rng = np.random.default_rng(3)
+    strip = rng.normal(1000, 10, (9, 4, 5)).astype(np.float32)
+    # a satellite trail in one frame
+    strip[4, 2, :] = 30000
+    clipped = combine_strip(strip, COMBINE_SIGMA_CLIP)
+    assert clipped.shape == (4, 5)
+    assert np.abs(clipped - 1000).max() < 20
+    assert np.abs(strip.mean(axis=0)[2] - 1000).min() > 3000
+    np.testing.assert_allclose(combine_strip(strip, COMBINE_MEDIAN), np.median(strip, axis=0))
+
+
+def test_sigma_clip_of_identical_values_keeps_them():
+    strip = np.full((5, 2, 3), 7.0, dtype=np.float32)
+    np.testing.assert_array_equal(combine_strip(strip, COMBINE_SIGMA_CLIP), np.full((2, 3), 7.0))
+
+
+def test_few_frames_fall_back_to_median():
+    strip = np.array([[[1.0]], [[100.0]]], dtype=np.float32)
+    assert combine_strip(strip, COMBINE_SIGMA_CLIP)[0, 0] == 50.5
+
+
+def write_frames(directory, prefix, frames):
+    # TIFF and FITS frames mixed, as saved with different output formats
+    for i, frame in enumerate(frames):
+        if i % 2:
+            write_fits(str(directory / f"{prefix}_{i}.fits"), frame, {})
+        else:
+            tifffile.imwrite(str(directory / f"{prefix}_{i}.tif"), frame)
+
+
+def test_combine_frames_by_strips_matches_whole_frames(tmp_path):
+    frames = [render_star_field(RESOLUTION, seed=7, frame_index=i) for i in range(5)]
+    frames[2][10:13, :] = 60000
+    write_frames(tmp_path, "light", frames)
+    paths = list_frames(str(tmp_path), "light")
+    assert len(paths) == 5
+    # a budget of a few rows makes many strips
+    combined = combine_frames(paths, COMBINE_SIGMA_CLIP, max_workers=2, memory_budget_bytes=5 * 96 * 4 * 2 * 3)
+    expected = combine_strip(np.stack(frames).astype(np.float32), COMBINE_SIGMA_CLIP)
+    np.testing.assert_allclose(combined, expected, rtol=1e-6)
+    clean = np.mean([frame for i, frame in enumerate(frames) if i != 2], axis=0)
+    assert np.abs(combined[10:13] - clean[10:13]).max() < 100
+
+
+def test_masters_calibrate_a_frame(tmp_path):
+    rng = np.random.default_rng(5)
+    bias_level, dark_level = 500, 200
+    vignetting = np.linspace(0.5, 1.0, RESOLUTION[0], dtype=np.float32)[None, :].repeat(RESOLUTION[1], axis=0)
+
+    def noisy(level):
+        return np.clip(rng.normal(level, 5, vignetting.shape), 0, 65535).astype(np.uint16)
+
+    write_frames(tmp_path, MASTER_BIAS, [noisy(bias_level) for _ in range(5)])
+    write_frames(tmp_path, MASTER_DARK, [noisy(bias_level + dark_level) for _ in range(5)])
+    write_frames(tmp_path, MASTER_FLAT, [(noisy(0) + bias_level + 20000 * vignetting).astype(np.uint16)
+                                         for _ in range(5)])
+    masters = build_masters(str(tmp_path), str(tmp_path / "masters"), COMBINE_SIGMA_CLIP, max_workers=2)
+    assert set(masters) == {MASTER_BIAS, MASTER_DARK, MASTER_FLAT}
+    assert np.median(masters[MASTER_DARK]) == pytest.approx(dark_level, abs=2)
+    assert np.median(masters[MASTER_FLAT]) == pytest.approx(1.0)
+
+    sky = 1000 * vignetting + bias_level + dark_level
+    calibrated = Calibrator.from_directory(str(tmp_path / "masters")).apply(sky.astype(np.uint16))
+    # vignetting is gone, what is left is flat up to noise
+    assert calibrated.std() / calibrated.mean() < 0.02
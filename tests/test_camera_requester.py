@@ -0,0 +1,133 @@
+import time
+import pytest
+import camera_requester
+from camera_requester import (CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, DEFAULT_TIMEOUT_S, FAILURE_THRESHOLD,
+                              LATENCY_TIMEOUT_FACTOR, MAX_OPEN_CIRCUIT_S, MIN_READ_TIMEOUT_S, OPEN_CIRCUIT_S,
+                              CameraRequester, UnitHealth, health_for)
+from camera_simulator import CameraSimulator, LinkProfile
+
+
+class ManualClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = ManualClock()
+    monkeypatch.setattr(camera_requester, "monotonic", clock)
+    return clock
+
+
+def test_circuit_opens_after_consecutive_failures(clock):
+    health = UnitHealth("unit")
+    for _ in range(FAILURE_THRESHOLD - 1):
+        health.record_failure()
+    assert health.state == CIRCUIT_CLOSED and health.allow_request()
+    health.record_failure()
+    assert health.state == CIRCUIT_OPEN
+    assert not health.allow_request()
+
+
+def test_success_resets_the_failure_count(clock):
+    health = UnitHealth("unit")
+    for _ in range(FAILURE_THRESHOLD - 1):
+        health.record_failure()
+    health.record_success("get_status", 0.01, 100, 0.0)
+    health.record_failure()
+    assert health.state == CIRCUIT_CLOSED
+
+
+def test_half_open_lets_a_single_probe_through(clock):
+    health = UnitHealth("unit")
+    for _ in range(FAILURE_THRESHOLD):
+        health.record_failure()
+    clock.now += OPEN_CIRCUIT_S
+    assert health.allow_request()
+    assert health.state == CIRCUIT_HALF_OPEN
+    assert not health.allow_request()
+    health.record_success("get_status", 0.01, 100, 0.0)
+    assert health.state == CIRCUIT_CLOSED and health.allow_request()
+
+
+def test_failed_probe_opens_the_circuit_for_longer(clock):
+    health = UnitHealth("unit")
+    for _ in range(FAILURE_THRESHOLD):
+        health.record_failure()
+    open_s = OPEN_CIRCUIT_S
+    while open_s < MAX_OPEN_CIRCUIT_S:
+        clock.now += open_s
+        assert health.allow_request()
+        health.record_failure()
+        open_s = min(2 * open_s, MAX_OPEN_CIRCUIT_S)
+        assert health.state == CIRCUIT_OPEN
+        clock.now += open_s - 1
+        assert not health.allow_request()
+        clock.now -= open_s - 1
+    # doubling stops at the maximum
+    clock.now += MAX_OPEN_CIRCUIT_S
+    assert health.allow_request()
+    health.record_failure()
+    clock.now += MAX_OPEN_CIRCUIT_S
+    assert health.allow_request()
+
+
+def test_timeout_follows_latency_and_ignores_payload_size():
+    health = UnitHealth("unit")
+    assert health.timeout("get_last_image") == (DEFAULT_TIMEOUT_S, DEFAULT_TIMEOUT_S)
+    health.record_success("get_last_image", 1.0, 50 * 1024 * 1024, 10.0)
+    connect_timeout, read_timeout = health.timeout("get_last_image")
+    assert connect_timeout == LATENCY_TIMEOUT_FACTOR * 1.0
+    # the read timeout bounds a stall between bytes, however long the whole transfer takes
+    assert read_timeout == LATENCY_TIMEOUT_FACTOR * 1.0
+    health.record_success("get_status", 0.001, 100, 0.0)
+    assert health.timeout("get_status")[1] == MIN_READ_TIMEOUT_S
+
+
+def test_transfer_deadline_needs_measured_throughput():
+    health = UnitHealth("unit")
+    assert health.transfer_deadline_s("get_last_image", 10 * 1024 * 1024) is None
+    health.record_success("get_last_image", 0.5, 10 * 1024 * 1024, 1.0)
+    short = health.transfer_deadline_s("get_last_image", 10 * 1024 * 1024)
+    long = health.transfer_deadline_s("get_last_image", 40 * 1024 * 1024)
+    assert MIN_READ_TIMEOUT_S <= short < long
+    assert health.transfer_deadline_s("get_last_image", None) is None
+
+
+def test_unreachable_unit_opens_its_circuit():
+    # nothing listens there
+    requester = CameraRequester("127.0.0.241", 0)
+    for _ in range(FAILURE_THRESHOLD):
+        assert requester.get_status() == (False, None)
+    assert requester.health().state == CIRCUIT_OPEN
+    start = time.monotonic()
+    assert requester.get_status() == (False, None)
+    assert time.monotonic() - start < 0.5
+
+
+def test_simulated_unit_is_measured():
+    with CameraSimulator(1, "127.0.0.242") as simulator:
+        requester = CameraRequester(simulator.unit_names[0], 0)
+        assert requester.get_status()[0]
+        response = requester.get_last_image(False)
+        assert response is not None
+        summary = health_for(f"http://{simulator.unit_names[0]}").summary()
+        assert summary["state"] == CIRCUIT_CLOSED
+        assert set(summary["latency_s"]) == {"get_status", "get_last_image"}
+        assert summary["throughput_bps"] > 0
+
+
+def test_crawling_transfer_is_cut_at_the_deadline():
+    with CameraSimulator(1, "127.0.0.243", link=LinkProfile(bandwidth_bps=800e6)) as simulator:
+        requester = CameraRequester(simulator.unit_names[0], 0)
+        requester.set_binning(4)
+        expected_bytes = len(requester.get_last_image(False).content)
+        deadline_s = requester.health().transfer_deadline_s("get_last_image", expected_bytes)
+        # bytes keep coming, far slower than measured, so only the deadline ends the transfer
+        simulator.units[0].link.bandwidth_bps = 8 * expected_bytes / (3 * deadline_s)
+        start = time.monotonic()
+        assert requester.get_last_image(False, expected_bytes=expected_bytes) is None
+        assert time.monotonic() - start < 2 * deadline_s
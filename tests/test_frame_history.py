@@ -0,0 +1,52 @@
+import os
+import numpy as np
+import pytest
+from frame_history import FrameHistory
+
+
+def frame(value, shape=(4, 6), dtype=np.uint16):
+    return np.full(shape, value, dtype=dtype)
+
+
+def test_ring_keeps_the_last_frames_in_order(tmp_path):
+    history = FrameHistory("unit", capacity=4, directory=str(tmp_path))
+    sequences = [history.append(frame(i), exposure_us=1000 * i, gain=i, temperature=-i, timestamp=100.0 + i)
+                 for i in range(10)]
+    assert sequences == list(range(10))
+    assert len(history) == 4
+    assert [int(history.frame(position)[0, 0]) for position in range(4)] == [6, 7, 8, 9]
+    assert history.metadata(0) == {"sequence": 6, "timestamp": 106.0, "exposure_us": 6000.0, "gain": 6.0,
+                                   "temperature": -6.0}
+    assert history.position_of(9) == 3
+    assert history.position_of(5) is None
+    with pytest.raises(IndexError):
+        history.frame(4)
+    history.close()
+
+
+def test_unknown_metadata_is_nan(tmp_path):
+    history = FrameHistory("unit", capacity=2, directory=str(tmp_path))
+    history.append(frame(1), exposure_us="<<exposure time>>")
+    metadata = history.metadata(0)
+    assert np.isnan(metadata["exposure_us"]) and np.isnan(metadata["gain"]) and np.isnan(metadata["temperature"])
+    history.close()
+
+
+def test_frames_of_other_dtype_and_shape_are_kept(tmp_path):
+    history = FrameHistory("unit", capacity=4, directory=str(tmp_path))
+    history.append(frame(1))
+    # a color JPG preview between RAW16 frames
+    history.append(frame(2, (4, 6, 3), np.uint8))
+    history.append(frame(3))
+    assert [history.frame(position).dtype for position in range(3)] == [np.uint16, np.uint8, np.uint16]
+    assert [int(history.frame(position).flat[0]) for position in range(3)] == [1, 2, 3]
+    assert history.frame(1).shape == (4, 6, 3)
+    assert len(os.listdir(tmp_path)) == 3
+    # once the color frame is overwritten its file goes away
+    for value in range(4, 7):
+        history.append(frame(value))
+    assert [int(history.frame(position)[0, 0]) for position in range(4)] == [3, 4, 5, 6]
+    assert len(os.listdir(tmp_path)) == 2
+    history.close()
+    assert os.listdir(tmp_path) == []
+    assert len(history) == 0
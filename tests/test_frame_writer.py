@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from camera_requester import CameraRequester
+from camera_simulator import CameraSimulator
+from frame import Frame
+from frame_writer import (FORMAT_FITS, FORMAT_TIFF, FrameWriter, acquisition_metadata, open_fits, read_fits,
+                          read_frame, write_fits)
+
+
+def simulated_frame(address):
+    with CameraSimulator(1, address) as simulator:
+        requester = CameraRequester(simulator.unit_names[0], 0)
+        requester.set_binning(4)
+        ok, resolution = requester.get_resolution()
+        assert ok
+        return Frame.from_buffer(requester.get_last_image(False).content, resolution, "RAW16").data
+
+
+@pytest.mark.parametrize("dtype", [np.uint16, np.uint8, np.float32])
+def test_fits_round_trip(tmp_path, dtype):
+    rng = np.random.default_rng(1)
+    limit = np.iinfo(dtype).max if np.issubdtype(dtype, np.integer) else 1.0
+    frame = (rng.uniform(0, limit, (37, 53))).astype(dtype)
+    # the extremes of unsigned 16 bits are where BZERO goes wrong
+    frame[0, :2] = [0, limit]
+    metadata = {"unit": "unit 'one'", "exposure_s": 2.5, "gain": 120.0, "binning": 2, "frame_type": "light"}
+    path = str(tmp_path / "frame.fits")
+    write_fits(path, frame, metadata)
+    assert (tmp_path / "frame.fits").stat().st_size % 2880 == 0
+    read, read_metadata = read_fits(path)
+    assert read.dtype == dtype
+    np.testing.assert_array_equal(read, frame)
+    assert read_metadata == metadata
+
+
+def test_fits_is_read_lazily_by_rows(tmp_path):
+    frame = np.arange(20 * 30, dtype=np.uint16).reshape(20, 30) * 100
+    path = str(tmp_path / "frame.fits")
+    write_fits(path, frame, {})
+    image = open_fits(path)
+    assert image.shape == (20, 30) and image.dtype == np.uint16
+    np.testing.assert_array_equal(image[5:8], frame[5:8])
+
+
+def test_simulated_frame_round_trip(tmp_path):
+    frame = simulated_frame("127.0.0.231")
+    metadata = acquisition_metadata(unit="127.0.0.231", exposure_us=1000000, gain="120", temperature="<<temp unknown>>",
+                                    binning="x4", frame_type="light")
+    assert "temperature" not in metadata and metadata["binning"] == 4
+    for output_format in (FORMAT_FITS, FORMAT_TIFF):
+        writer = FrameWriter(output_format, directory=str(tmp_path))
+        paths = writer.write_batch([("light", frame, metadata), ("light", frame, metadata)])
+        writer.shutdown()
+        assert len(set(paths)) == 2
+        read, read_metadata = read_frame(paths[0])
+        np.testing.assert_array_equal(read, frame)
+        assert read_metadata["exposure_s"] == 1.0 and read_metadata["unit"] == "127.0.0.231"
@@ -0,0 +1,38 @@
+import time
+from camera_simulator import CameraSimulator, LinkProfile
+from welcome_view import ImageView
+
+
+def wait_for_fetches(app, view, timeout_s=10.0):
+    deadline = time.monotonic() + timeout_s
+    while view._fetch_pending and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    assert not view._fetch_pending
+
+
+def test_camera_switched_during_a_fetch_gets_its_own_frame(app):
+    with CameraSimulator(2, "127.0.0.171", link=LinkProfile(latency_s=0.3)) as simulator:
+        first, second = simulator.unit_names
+        view = ImageView()
+        try:
+            view.set_camera(0, first)
+            # the first unit's frame is still on its way
+            view.set_camera(0, second)
+            wait_for_fetches(app, view)
+            assert list(view._histories) == [(second, 0)]
+            assert len(view._history()) == 1
+        finally:
+            view.shutdown()
+
+
+def test_refresh_during_a_fetch_is_done_after_it(app):
+    with CameraSimulator(1, "127.0.0.173", link=LinkProfile(latency_s=0.3)) as simulator:
+        view = ImageView()
+        try:
+            view.set_camera(0, simulator.unit_names[0])
+            view._refresh()
+            wait_for_fetches(app, view)
+            assert len(view._history()) == 2
+        finally:
+            view.shutdown()
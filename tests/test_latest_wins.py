@@ -0,0 +1,58 @@
+import threading
+import numpy as np
+from latest_wins import LatestWinsExecutor
+from thumbnails import Thumbnailer
+
+
+def test_calls_coming_while_busy_are_replaced_by_the_newest():
+    release = threading.Event()
+    done = threading.Event()
+    calls = []
+
+    def work(key, value):
+        calls.append((key, value))
+        if value == 0:
+            release.wait(5)
+        if value == 3:
+            done.set()
+
+    executor = LatestWinsExecutor(work, "Test", 2, "test")
+    try:
+        for value in range(4):
+            executor.submit("a", value)
+        release.set()
+        assert done.wait(5)
+        assert calls == [("a", 0), ("a", 3)]
+    finally:
+        executor.shutdown()
+
+
+def test_failing_work_does_not_block_the_key():
+    done = threading.Event()
+
+    def work(key, value):
+        if value == "fail":
+            raise ValueError("broken")
+        done.set()
+
+    executor = LatestWinsExecutor(work, "Test", 1, "test")
+    try:
+        executor.submit("a", "fail")
+        executor.submit("a", "ok")
+        assert done.wait(5)
+    finally:
+        executor.shutdown()
+
+
+def test_thumbnail_is_made_once_per_frame_key():
+    ready = []
+    made = threading.Event()
+    thumbnailer = Thumbnailer(lambda unit_name, thumbnail, timestamp: (ready.append(thumbnail.shape), made.set()))
+    try:
+        frame = np.arange(480 * 720, dtype=np.uint16).reshape(480, 720)
+        assert thumbnailer.request("unit", 1, lambda: frame)
+        assert made.wait(5)
+        assert not thumbnailer.request("unit", 1, lambda: frame)
+        assert ready == [(48, 72)]
+    finally:
+        thumbnailer.shutdown()
@@ -0,0 +1,36 @@
+import numpy as np
+from camera_simulator import render_star_field
+from live_stack import STACK_MEAN, STACK_SIGMA_CLIP, LiveStack
+
+RESOLUTION = (96, 64)
+
+
+def test_live_stack_sigma_clip_rejects_a_transient():
+    frames = [render_star_field(RESOLUTION, seed=11, frame_index=i) for i in range(8)]
+    frames[5] = frames[5].copy()
+    frames[5][30:32, :] = 60000
+    stacks = {mode: LiveStack(mode, proxy_factor=1) for mode in (STACK_MEAN, STACK_SIGMA_CLIP)}
+    for frame in frames:
+        for stack in stacks.values():
+            assert stack.add(frame)
+    clean = np.mean([frame for i, frame in enumerate(frames) if i != 5], axis=0)
+    assert stacks[STACK_MEAN].image[30:32].mean() > clean[30:32].mean() + 5000
+    assert np.abs(stacks[STACK_SIGMA_CLIP].image[30:32] - clean[30:32]).max() < 200
+    assert stacks[STACK_SIGMA_CLIP].frames_stacked == 8
+
+
+def test_drifting_frames_are_registered_to_the_first():
+    stack = LiveStack(proxy_factor=1)
+    resolution = (2 * RESOLUTION[0], 2 * RESOLUTION[1])
+    for i in range(4):
+        assert stack.add(render_star_field(resolution, 11, i, drift_px_per_frame=(2.0, 1.0)))
+    # (dy, dx) that aligns the last frame back to the first one
+    np.testing.assert_allclose(stack.last_shift, (-3.0, -6.0), atol=0.1)
+    assert stack.frames_stacked == 4
+
+
+def test_frame_of_other_shape_is_rejected():
+    stack = LiveStack()
+    stack.add(np.full((64, 96), 5, dtype=np.uint16))
+    assert not stack.add(np.zeros((32, 48), dtype=np.uint16))
+    assert stack.frames_rejected == 1 and stack.frames_stacked == 1
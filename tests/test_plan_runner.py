@@ -0,0 +1,66 @@
+import pytest
+from camera_simulator import CameraSimulator
+from plan_runner import DEFAULT_COOLER, PlanError, estimated_duration_s, run_plan, unit_settings
+
+
+@pytest.mark.parametrize("plan, message", [
+    ({"units": []}, "non-empty list of units"),
+    ({"units": [{"gain": 100}], "frames": {"light": 1}}, "without a name"),
+    ({"units": ["a", {"name": "a"}], "frames": {"light": 1}}, "listed twice"),
+    ({"units": [{"name": "a", "offset": 10}], "frames": {"light": 1}}, "Unknown settings for a: offset"),
+    ({"units": ["a"], "frames": {}}, "frames must map"),
+    ({"units": ["a"], "blocks": []}, "non-empty list"),
+    ({"units": ["a"], "blocks": [{"prefix": "light", "count": 1, "offset": 10}]}, "unknown block settings offset"),
+    ({"units": ["a"], "blocks": [{"count": 1}]}, "without a prefix"),
+    ({"units": ["a"], "frames": {"light": 0}}, "positive integer"),
+    ({"units": ["a"], "frames": {"light": -3}}, "positive integer"),
+    ({"units": ["a"], "frames": {"light": 2.5}}, "positive integer"),
+    ({"units": ["a"], "frames": {"light": 1}, "exposure_s": 0}, "exposure must be positive"),
+])
+def test_invalid_plans_are_rejected(plan, message):
+    with pytest.raises(PlanError, match=message):
+        unit_settings(plan)
+
+
+def test_units_override_shared_settings():
+    plan = {"units": ["a", {"name": "b", "gain": 200, "cooler": -15}], "gain": 120, "exposure_s": 30,
+            "cooler": {"set_temperature": -10, "timeout_s": 60},
+            "blocks": [{"prefix": "light", "count": 10}, {"prefix": "dark", "count": 5, "gain": 0, "download": True}]}
+    settings = unit_settings(plan)
+    assert list(settings) == ["a", "b"]
+    a, b = settings["a"], settings["b"]
+    assert a["gain"] == 120 and b["gain"] == 200
+    assert a["cooler"] == {"set_temperature": -10, "tolerance": DEFAULT_COOLER["tolerance"], "timeout_s": 60}
+    assert b["cooler"] == {**DEFAULT_COOLER, "set_temperature": -15}
+    # blocks take what they do not set themselves from their unit
+    assert [block["gain"] for block in a["blocks"]] == [120, 0]
+    assert [block["gain"] for block in b["blocks"]] == [200, 0]
+    assert [block["download"] for block in b["blocks"]] == [False, True]
+    assert all(block["exposure_s"] == 30 for block in a["blocks"] + b["blocks"])
+    assert estimated_duration_s(a) == 15 * 30
+    assert estimated_duration_s(unit_settings({"units": ["c"], "frames": {"light": 1}})["c"]) is None
+
+
+def test_run_on_simulated_units():
+    with CameraSimulator(2, "127.0.0.165") as simulator:
+        first, second = simulator.unit_names
+        # the last one does not answer
+        plan = {"units": [first, {"name": second, "gain": 200}, "127.0.0.167"], "binning": 4, "gain": 120,
+                "exposure_s": 0.05, "cooler": {"set_temperature": -10, "timeout_s": 0},
+                "frames": {"light": 3, "dark": 2}}
+        report = run_plan(plan)
+    assert not report["ok"]
+    units = report["units"]
+    unreachable = units["127.0.0.167"]
+    assert not unreachable["ok"] and unreachable["error"] == "init camera failed: no response to command"
+    assert unreachable["frames_saved"] == 0
+    for unit_name in (first, second):
+        unit = units[unit_name]
+        assert unit["ok"] and unit["error"] is None
+        assert unit["frames_saved"] == 5
+        assert [block["prefix"] for block in unit["blocks"]] == ["light", "dark"]
+        steps = {step["step"]: step for step in unit["steps"]}
+        assert steps["set temperature"]["ok"]
+        # the setpoint is not reached at once, which does not stop the run
+        assert not steps["reach temperature"]["ok"]
+    assert units[second]["blocks"][0]["settings"]["gain"] == 200
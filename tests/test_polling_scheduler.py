@@ -0,0 +1,86 @@
+import time
+import pytest
+from camera_requester import CameraRequester
+from camera_simulator import CameraSimulator
+from polling_scheduler import PolledMetric, PollingScheduler
+
+
+@pytest.fixture
+def scheduler(app):
+    targets = {"a": 0, "b": 0}
+    scheduler = PollingScheduler(None, lambda: targets, jitter=0.0, max_backoff_s=100)
+    yield scheduler
+    scheduler.stop()
+
+
+def entry(scheduler, metric_name, unit_name):
+    return next(e for e in scheduler.schedule() if e["metric"] == metric_name and e["unit"] == unit_name)
+
+
+def test_schedule_lists_every_metric_of_every_unit(scheduler):
+    scheduler.add_metric(PolledMetric("status", None, None, lambda u: 5))
+    scheduler.add_metric(PolledMetric("cooler", None, None, lambda u: None if u == "b" else 60))
+    schedule = scheduler.schedule()
+    assert {(e["metric"], e["unit"]) for e in schedule} == {("status", "a"), ("status", "b"), ("cooler", "a"),
+                                                            ("cooler", "b")}
+    assert entry(scheduler, "cooler", "b")["interval_s"] is None
+    assert all(e["due_in_s"] == 0 and e["failures"] == 0 and not e["in_flight"] for e in schedule)
+
+
+def test_failures_back_off_up_to_the_maximum(scheduler):
+    scheduler.add_metric(PolledMetric("status", None, lambda results: None, lambda u: 10))
+    scheduler._sweep_finished("status", {"a": None, "b": {"state": "IDLE"}})
+    assert entry(scheduler, "status", "a")["failures"] == 1
+    assert entry(scheduler, "status", "a")["interval_s"] == 20
+    assert entry(scheduler, "status", "a")["due_in_s"] == pytest.approx(20, abs=0.1)
+    assert entry(scheduler, "status", "b")["interval_s"] == 10
+    for _ in range(5):
+        scheduler._sweep_finished("status", {"a": None})
+    assert entry(scheduler, "status", "a")["interval_s"] == 100
+    # a success, or asking for a poll, goes back to the normal cadence
+    scheduler._sweep_finished("status", {"a": {"state": "IDLE"}})
+    assert entry(scheduler, "status", "a")["interval_s"] == 10
+    scheduler._sweep_finished("status", {"b": None})
+    scheduler.poll_soon("b")
+    assert entry(scheduler, "status", "b")["failures"] == 0
+    assert entry(scheduler, "status", "b")["due_in_s"] == 0
+
+
+def test_results_are_applied_without_failures(scheduler):
+    applied = []
+    scheduler.add_metric(PolledMetric("status", None, applied.append, lambda u: 10))
+    scheduler._sweep_finished("status", {"a": None, "b": 1})
+    assert applied == [{"b": 1}]
+
+
+def test_request_budget_counts_requests_of_every_fetch(scheduler):
+    scheduler.add_metric(PolledMetric("status", None, None, lambda u: 5))
+    scheduler.add_metric(PolledMetric("cooler_power", None, None, lambda u: 30, requests_per_fetch=2))
+    scheduler.add_metric(PolledMetric("temperature", None, None, lambda u: None))
+    assert scheduler.request_budget() == pytest.approx(2 * (1 / 5 + 2 / 30))
+
+
+def test_polls_simulated_units(app):
+    with CameraSimulator(2, "127.0.0.251") as simulator:
+        # the last one does not answer
+        targets = {name: 0 for name in simulator.unit_names + ["127.0.0.253"]}
+        scheduler = PollingScheduler(None, lambda: targets)
+        applied = {}
+        scheduler.add_metric(PolledMetric("status", lambda u, i: CameraRequester(u, i).get_status()[1],
+                                          applied.update, lambda u: 60))
+        finished = []
+        scheduler.sweep_finished.connect(finished.append)
+        try:
+            scheduler.start()
+            deadline = time.monotonic() + 10
+            while not finished and time.monotonic() < deadline:
+                app.processEvents()
+                time.sleep(0.01)
+        finally:
+            scheduler.stop()
+    assert finished == ["status"]
+    assert set(applied) == set(simulator.unit_names)
+    assert all(status["state"] == "IDLE" for status in applied.values())
+    assert entry(scheduler, "status", "127.0.0.253")["failures"] == 1
+    assert entry(scheduler, "status", "127.0.0.253")["interval_s"] == 120
+    assert entry(scheduler, "status", simulator.unit_names[0])["due_in_s"] > 50
@@ -0,0 +1,73 @@
+import time
+import pytest
+from camera_simulator import CameraSimulator
+from frame_writer import FrameWriter, read_frame
+from sequencer import ExposureBlock, UnitSequencer
+
+EXPOSURE_S = 0.05
+
+
+@pytest.mark.parametrize("supports_push, address", [(True, "127.0.0.161"), (False, "127.0.0.162")])
+def test_blocks_run_back_to_back_with_only_changed_settings(supports_push, address):
+    with CameraSimulator(1, address, supports_push=supports_push) as simulator:
+        unit_name = simulator.unit_names[0]
+        sequencer = UnitSequencer(unit_name, 0)
+        sequencer.enqueue(ExposureBlock("light", 3, EXPOSURE_S, gain=120, binning=4))
+        sequencer.enqueue(ExposureBlock("dark", 4, EXPOSURE_S, gain=200, binning=4))
+        results = sequencer.run()
+        assert [result.ok for result in results] == [True, True]
+        light, dark = results
+        assert (light.saved, dark.saved) == (3, 4)
+        assert light.settings_applied == ["binning", "gain", "exposure_s"]
+        # worked out while the light block ran, only gain differs
+        assert dark.settings_applied == ["gain"]
+        assert light.idle_gap_s is None
+        assert 0 <= dark.idle_gap_s < 5
+        assert simulator.units[0].cameras[0].get("get_gain") == {"value": 200}
+        report = dark.report()
+        assert report["saved"] == 4 and report["ok"] and report["settings"]["gain"] == 200
+        assert "downloaded" not in report
+        assert sequencer.idle_gap_summary()["gaps"] == 1
+
+
+def test_block_without_setting_changes_ends_without_a_status_change():
+    with CameraSimulator(1, "127.0.0.168") as simulator:
+        sequencer = UnitSequencer(simulator.unit_names[0], 0)
+        sequencer.enqueue(ExposureBlock("light", 3, EXPOSURE_S, gain=120, binning=4))
+        # done before its first status arrives, which is the only one pushed as the unit stays capturing
+        sequencer.enqueue(ExposureBlock("dark", 2, EXPOSURE_S, gain=120, binning=4))
+        started = time.monotonic()
+        light, dark = sequencer.run()
+    assert light.ok and dark.ok
+    assert dark.settings_applied == [] and dark.saved == 2
+    assert time.monotonic() - started < 5
+
+def test_frames_of_download_blocks_are_written_locally(tmp_path):
+    with CameraSimulator(1, "127.0.0.163") as simulator:
+        unit_name = simulator.unit_names[0]
+        writer = FrameWriter(directory=str(tmp_path))
+        sequencer = UnitSequencer(unit_name, 0, writer=writer)
+        sequencer.enqueue(ExposureBlock("flat", 3, EXPOSURE_S, gain=0, binning=4, readout_format="RAW16",
+                                        download=True))
+        result, = sequencer.run()
+        writer.shutdown()
+    assert result.ok
+    # frames finishing while one is still downloading are skipped, and notifications of close frames may merge
+    assert result.downloaded >= 1
+    assert result.downloaded + result.missed_downloads <= result.saved == 3
+    paths = sorted(tmp_path.iterdir())
+    assert len(paths) == result.downloaded
+    frame, metadata = read_frame(str(paths[0]))
+    assert frame.shape == (705, 1036)
+    assert metadata["frame_type"] == "flat" and metadata["gain"] == 0 and metadata["binning"] == 4
+
+
+def test_failed_block_drops_the_rest_of_the_queue():
+    # nothing listens there
+    sequencer = UnitSequencer("127.0.0.164", 0)
+    sequencer.enqueue(ExposureBlock("light", 3, EXPOSURE_S, gain=120))
+    sequencer.enqueue(ExposureBlock("dark", 3, EXPOSURE_S, gain=120))
+    result, = sequencer.run()
+    assert not result.ok
+    assert result.error == "setting gain to 120 failed"
+    assert result.saved == 0
@@ -0,0 +1,53 @@
+import time
+from camera_requester import CameraRequester
+from camera_simulator import CameraSimulator
+from status_stream import FRAME_READY_EVENT, MODE_POLL, MODE_PUSH, STATUS_EVENT, parse_sse_lines
+
+
+def wait_for(condition, timeout_s=5.0):
+    deadline = time.monotonic() + timeout_s
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.02)
+
+
+def test_parse_sse_lines():
+    lines = [": keep-alive", "event: status", "data: {\"value\": 1}", "", "data: a", "data: b", ""]
+    assert list(parse_sse_lines(lines)) == [("status", "{\"value\": 1}"), ("message", "a\nb")]
+
+
+def test_polled_status_tells_new_frames():
+    with CameraSimulator(1, "127.0.0.211", supports_push=False) as simulator:
+        requester = CameraRequester(simulator.unit_names[0], 0)
+        events = []
+        # the caller polls, as the polling scheduler does
+        subscription = requester.subscribe(lambda event_type, value: events.append(event_type),
+                                           fallback_interval_s=None)
+        try:
+            wait_for(lambda: subscription.mode == MODE_POLL)
+            requester.set_exposure(0.05)
+            assert subscription.frame_ready_from_status(requester.get_status()[1]) is None
+            requester.start_saving(1000, "test")
+            time.sleep(0.2)
+            saved_images = subscription.frame_ready_from_status(requester.get_status()[1])
+            assert saved_images is not None and saved_images > 0
+            # the same counter again is no new frame
+            assert subscription.frame_ready_from_status({"state": "SAVE", "saved_images": saved_images}) is None
+            assert events == []
+        finally:
+            subscription.stop()
+
+
+def test_pushed_status_is_not_taken_for_new_frames():
+    with CameraSimulator(1, "127.0.0.212") as simulator:
+        requester = CameraRequester(simulator.unit_names[0], 0)
+        events = []
+        subscription = requester.subscribe(lambda event_type, value: events.append((event_type, value)))
+        try:
+            wait_for(lambda: subscription.mode == MODE_PUSH)
+            wait_for(lambda: any(event_type == STATUS_EVENT for event_type, _ in events))
+            assert subscription.frame_ready_from_status({"state": "SAVE", "saved_images": 1}) is None
+            assert subscription.frame_ready_from_status({"state": "SAVE", "saved_images": 5}) is None
+            assert FRAME_READY_EVENT not in [event_type for event_type, _ in events]
+        finally:
+            subscription.stop()
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from telemetry import STATE_CODES, TelemetrySeries, TelemetryStore, decimate, load
+
+
+def test_ring_keeps_the_last_samples_in_time_order():
+    series = TelemetrySeries(capacity=5, min_interval_s=1.0)
+    for i in range(12):
+        series.record(float(i * 10), temperature=-i)
+    samples = series.samples()
+    assert len(series) == 5
+    assert list(samples["timestamp"]) == [70.0, 80.0, 90.0, 100.0, 110.0]
+    assert list(samples["temperature"]) == [-7.0, -8.0, -9.0, -10.0, -11.0]
+    assert list(series.samples(since=95.0)["timestamp"]) == [100.0, 110.0]
+    assert series.latest()["timestamp"] == 110.0
+
+
+def test_samples_carry_last_known_values():
+    series = TelemetrySeries(capacity=8, min_interval_s=2.0)
+    series.record(0.0, temperature=10, state="SAVE")
+    series.record(5.0, cooler_power=40)
+    # closer than the minimal interval: merged into the newest sample, which keeps its time
+    series.record(6.0, temperature=9, state="something new")
+    samples = series.samples()
+    assert len(samples) == 2
+    assert samples[0]["state"] == STATE_CODES["SAVE"] and np.isnan(samples[0]["cooler_power"])
+    assert samples[1]["timestamp"] == 5.0
+    assert samples[1]["temperature"] == 9 and samples[1]["cooler_power"] == 40 and samples[1]["state"] == 0
+
+
+def test_decimate_keeps_spikes():
+    series = TelemetrySeries(capacity=1000, min_interval_s=0.0)
+    for i in range(1000):
+        series.record(float(i), cooler_power=50.0 if i != 437 else 100.0, temperature=np.nan if i < 500 else -10)
+    samples = series.samples()
+    times, minima, maxima = decimate(samples, "cooler_power", 10)
+    assert len(times) == len(minima) == len(maxima) == 10
+    assert times[0] == 0.0 and times[4] == 400.0
+    assert maxima[4] == 100.0 and minima[4] == 50.0
+    assert set(maxima) == {50.0, 100.0}
+    _, minima, maxima = decimate(samples, "temperature", 10)
+    assert np.isnan(maxima[:5]).all() and (maxima[5:] == -10).all()
+    times, minima, maxima = decimate(samples[:5], "cooler_power", 10)
+    assert len(times) == 5 and (minima == maxima).all()
+
+
+def test_store_dumps_and_loads(tmp_path):
+    store = TelemetryStore(capacity=4, min_interval_s=0.0)
+    for i in range(6):
+        store.record("unit-1", timestamp=float(i), temperature=i)
+    store.record("unit-2", timestamp=1.0, cooler_on=True)
+    with pytest.raises(ValueError):
+        store.record("unit-1", humidity=50)
+    loaded = load(store.dump(str(tmp_path / "telemetry.npz")))
+    assert set(loaded) == {"unit-1", "unit-2"}
+    assert list(loaded["unit-1"]["temperature"]) == [2.0, 3.0, 4.0, 5.0]
+    assert loaded["unit-2"][0]["cooler_on"] == 1.0
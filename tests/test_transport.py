@@ -0,0 +1,105 @@
+import json
+import pytest
+import transport
+from camera_requester import CameraRequester, standalone_get_request
+from camera_simulator import CameraSimulator
+from transport import RecordingTransport, Recording, ReplayTransport, exchange_key
+
+
+class ManualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def restore_transport():
+    yield
+    transport.install(transport.HttpTransport()).close()
+
+
+def exercise(requester):
+    return {
+        "gain": requester.get_gain(),
+        "status": requester.get_status(),
+        "raw": requester.get_last_image(False).content,
+        "jpg": requester.get_last_image(True, quality=50).content,
+        "set_gain": requester.set_gain(150).status_code,
+        "gain_after": requester.get_gain(),
+    }
+
+
+def test_exchange_key_ignores_params_order():
+    assert exchange_key("GET", "u", {"a": 1, "b": "x"}) == exchange_key("GET", "u", {"b": "x", "a": 1})
+    assert exchange_key("GET", "u", {"format": "raw"}) != exchange_key("GET", "u", {"format": "jpg"})
+    assert exchange_key("GET", "u") == exchange_key("GET", "u", {})
+    assert exchange_key("POST", "u", None, {"value": "1"}) != exchange_key("POST", "u", None, {"value": "2"})
+
+
+def test_replay_answers_what_was_recorded(tmp_path, restore_transport):
+    directory = str(tmp_path / "recording")
+    with CameraSimulator(1, "127.0.0.201") as simulator:
+        requester = CameraRequester(simulator.unit_names[0], 0)
+        transport.install(RecordingTransport(directory))
+        recorded = exercise(requester)
+        transport.close_current()
+    assert recorded["gain_after"] == (True, 150)
+
+    # simulator is gone, everything comes from the recording
+    clock = ManualClock()
+    transport.install(ReplayTransport(directory, speed=1000.0, clock=clock))
+    replayed = {"raw": requester.get_last_image(False).content,
+                "jpg": requester.get_last_image(True, quality=50).content,
+                "status": requester.get_status(), "gain": requester.get_gain()}
+    assert replayed == {key: recorded[key] for key in replayed}
+    # the gain was changed during the recording, the answer depends on the time of the replay
+    clock.now = 1.0
+    assert requester.set_gain(150).status_code == recorded["set_gain"]
+    assert requester.get_gain() == recorded["gain_after"]
+    assert transport.current().reachable(simulator.unit_names[0])
+    assert not transport.current().reachable("127.0.0.202")
+
+
+def test_unrecorded_request_is_not_found(tmp_path, restore_transport):
+    directory = str(tmp_path / "recording")
+    with CameraSimulator(1, "127.0.0.203") as simulator:
+        transport.install(RecordingTransport(directory))
+        CameraRequester(simulator.unit_names[0], 0).get_gain()
+        transport.close_current()
+    transport.install(ReplayTransport(directory, speed=1000.0))
+    requester = CameraRequester(simulator.unit_names[0], 0)
+    assert requester.get_offset() == (False, None)
+    assert requester.get_last_image(True, quality=10) is None
+
+
+def test_transport_errors_are_replayed(tmp_path, restore_transport):
+    directory = str(tmp_path / "recording")
+    # nothing listens there
+    url = "http://127.0.0.204:8080/cameras_list"
+    transport.install(RecordingTransport(directory))
+    assert standalone_get_request(url) is None
+    transport.close_current()
+    with open(tmp_path / "recording" / transport.INDEX_FILE) as infile:
+        entries = [json.loads(line) for line in infile]
+    assert entries[-1]["error"] == "ConnectionError"
+
+    transport.install(ReplayTransport(directory, speed=1000.0))
+    with pytest.raises(Exception):
+        transport.current().send("GET", url, 1.0)
+
+
+def test_identical_bodies_are_stored_once(tmp_path, restore_transport):
+    directory = str(tmp_path / "recording")
+    with CameraSimulator(1, "127.0.0.205") as simulator:
+        transport.install(RecordingTransport(directory))
+        requester = CameraRequester(simulator.unit_names[0], 0)
+        for _ in range(3):
+            requester.get_last_image(False)
+        transport.close_current()
+    recording = Recording(directory)
+    references = {tuple(entry["payload"]) for entry in recording.entries}
+    assert len(recording.entries) == 3
+    assert len(references) == 1
+    recording.close()